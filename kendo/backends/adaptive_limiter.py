@@ -0,0 +1,68 @@
+import threading
+from typing import Dict
+
+DEFAULT_MAX_CONCURRENCY = 16
+
+# statements slower than this multiple of the baseline latency of their class
+# (and than the floor, so fast metadata queries don't set a hair trigger) are
+# treated as queued behind the warehouse
+QUEUEING_LATENCY_FACTOR = 4.0
+QUEUEING_LATENCY_FLOOR = 1.0
+LATENCY_SMOOTHING = 0.2
+
+
+class AdaptiveLimiter:
+    # AIMD: the limit grows by one every `limit` fast statements and halves when
+    # a statement is throttled or looks queued
+    limit: float
+    min_limit: int
+    max_limit: int
+    in_flight: int
+    baseline_latency: Dict[str, float]
+
+    def __init__(self, max_limit: int = DEFAULT_MAX_CONCURRENCY, min_limit: int = 1):
+        self.limit = float(max(min_limit, max_limit // 2))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.in_flight = 0
+        # a SHOW and a COPY differ by orders of magnitude, so each statement
+        # class is compared with its own typical latency
+        self.baseline_latency = {}
+        self._condition = threading.Condition()
+
+    def acquire(self) -> int:
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+            return self.in_flight
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+    def on_success(self, latency: float, kind: str = "") -> bool:
+        # returns whether the statement looked queued
+        with self._condition:
+            baseline = self.baseline_latency.setdefault(kind, latency)
+            queued = latency > max(
+                baseline * QUEUEING_LATENCY_FACTOR, QUEUEING_LATENCY_FLOOR
+            )
+            if queued:
+                self._decrease()
+            else:
+                # the baseline tracks typical unqueued latency
+                self.baseline_latency[kind] = baseline + LATENCY_SMOOTHING * (
+                    latency - baseline
+                )
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+            return queued
+
+    def on_throttle(self):
+        with self._condition:
+            self._decrease()
+
+    def _decrease(self):
+        self.limit = max(self.min_limit, self.limit / 2)
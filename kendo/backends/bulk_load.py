@@ -0,0 +1,31 @@
+from datetime import date, datetime
+from typing import Any, Sequence
+
+# unenclosed empty fields load as NULL, enclosed ones ("") as empty strings
+BULK_LOAD_FILE_FORMAT = "TYPE = CSV FIELD_OPTIONALLY_ENCLOSED_BY = '\"' EMPTY_FIELD_AS_NULL = TRUE COMPRESSION = GZIP"
+
+
+def to_csv_value(value):
+    # qmark typed bindings like ("TIMESTAMP_LTZ", value) are loaded by value
+    if isinstance(value, tuple) and len(value) == 2 and isinstance(value[0], str):
+        value = value[1]
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _csv_field(value) -> str:
+    value = to_csv_value(value)
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return str(value)
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def format_csv_row(row: Sequence[Any]) -> str:
+    # csv.QUOTE_NONNUMERIC would enclose None as "", which loads as '' rather
+    # than NULL, so fields are written by hand
+    return ",".join(_csv_field(value) for value in row) + "\n"
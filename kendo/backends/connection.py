@@ -1,9 +1,15 @@
 from abc import ABC, abstractmethod
-from typing import Any
+from typing import Any, List, Sequence
+
+from kendo.backends.crud import IMultiRowInsert
+
+# below this many rows multi-row INSERTs are cheaper than staging a file
+BULK_LOAD_MIN_ROWS = 100000
 
 
 class IBackendConnection(ABC):
     session: Any
+    connection_name: str
 
     @abstractmethod
     def get_session(self):
@@ -19,6 +25,16 @@ class IBackendConnection(ABC):
     ):
         pass
 
+    @abstractmethod
+    def execute_in_batches(
+        self,
+        sql,
+        sql_params=None,
+        batch_size=10000,
+        print_sql=False,
+    ):
+        pass
+
     @abstractmethod
     def execute_many_times(
         self,
@@ -29,6 +45,46 @@ class IBackendConnection(ABC):
     ):
         pass
 
+    @abstractmethod
+    def execute_arrow_batches(
+        self,
+        sql,
+        sql_params=None,
+        print_sql=False,
+    ):
+        pass
+
+    def execute_multi_row_insert(
+        self,
+        insert: IMultiRowInsert,
+        rows: Sequence[Sequence[Any]],
+        print_sql=False,
+    ):
+        for sql, sql_params in insert.generate_statements(rows):
+            self.execute(sql, sql_params, print_sql=print_sql)
+
+    @abstractmethod
+    def execute_bulk_load(
+        self,
+        table: str,
+        columns: List[str],
+        rows: Sequence[Sequence[Any]],
+        print_sql=False,
+    ):
+        pass
+
+    def execute_insert(
+        self,
+        insert: IMultiRowInsert,
+        rows: Sequence[Sequence[Any]],
+        print_sql=False,
+    ):
+        # picks the cheapest way to write rows for their count
+        if len(rows) >= BULK_LOAD_MIN_ROWS:
+            self.execute_bulk_load(insert.table, insert.columns, rows, print_sql=print_sql)
+        else:
+            self.execute_multi_row_insert(insert, rows, print_sql=print_sql)
+
     @abstractmethod
     def execute_multi_stmts(
         self,
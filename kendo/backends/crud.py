@@ -1,27 +1,125 @@
-from typing import List, Optional
-from pydantic import BaseModel, Field
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
 
+# Snowflake accepts at most 16,384 rows in a VALUES clause and as many
+# expressions in a single statement's bind list
+MAX_ROWS_PER_INSERT = 16384
+MAX_BIND_PARAMS = 16384
 
-class ISelect(BaseModel):
-    table: str = Field(min_length=1)
-    columns: Optional[List[str]] = None
-    where: Optional[str] = None
+
+# SQL text is memoised per statement shape, so repeated statements are built
+# once and identical text keeps Snowflake's result cache usable
+
+
+@lru_cache(maxsize=1024)
+def _select_sql(
+    table: str,
+    columns: Optional[Tuple[str, ...]],
+    where: Optional[str],
+    filters: Tuple[Tuple[str, int], ...],
+    include_semicolon: bool,
+) -> str:
+    sql = f"SELECT {', '.join(columns) if columns else '*'} FROM {table}"
+    predicates = [f"({where})"] if where else []
+    for column, size in filters:
+        # size -1 is a single value, otherwise the length of an IN list
+        if size < 0:
+            predicates.append(f"{column} = ?")
+        else:
+            predicates.append(f"{column} IN ({', '.join(['?'] * size)})")
+    if predicates:
+        sql += f" WHERE {' AND '.join(predicates)}"
+    if include_semicolon:
+        sql += ";"
+    return sql
+
+
+@lru_cache(maxsize=1024)
+def _insert_sql(table: str, columns: Tuple[str, ...], row_count: int) -> str:
+    row = f"({', '.join(['?'] * len(columns))})"
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES {', '.join([row] * row_count)}"
+
+
+class ISelect:
+    __slots__ = ("table", "columns", "where", "filters")
+
+    table: str
+    columns: Optional[List[str]]
+    # raw predicate, use '?' placeholders for any value it needs
+    where: Optional[str]
+    # column -> value (or list of values) compared with bind parameters
+    filters: Dict[str, Any]
+
+    def __init__(
+        self,
+        table: str,
+        columns: Optional[List[str]] = None,
+        where: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ):
+        if not table:
+            raise ValueError("table must not be empty")
+        self.table = table
+        self.columns = columns
+        self.where = where
+        self.filters = filters or {}
 
     def generate_statement(self, include_semicolon: bool = True) -> str:
-        sql = (
-            f"SELECT {', '.join(self.columns) if self.columns else '*'} FROM {self.table}"
+        return _select_sql(
+            self.table,
+            tuple(self.columns) if self.columns else None,
+            self.where,
+            tuple(
+                (column, len(value) if isinstance(value, (list, tuple)) else -1)
+                for column, value in self.filters.items()
+            ),
+            include_semicolon,
         )
-        if self.where:
-            sql += f" WHERE {self.where}"
-        if include_semicolon:
-            sql += ";"
-        return sql
+
+    def generate_params(self) -> tuple:
+        # bind parameters of the filters, in statement order
+        params: List[Any] = []
+        for value in self.filters.values():
+            if isinstance(value, (list, tuple)):
+                params.extend(value)
+            else:
+                params.append(value)
+        return tuple(params)
 
 
-class IParameterizedInsert(BaseModel):
-    table: str = Field(min_length=1)
+class IParameterizedInsert:
+    __slots__ = ("table", "columns")
+
+    table: str
     columns: List[str]
 
+    def __init__(self, table: str, columns: List[str]):
+        if not table:
+            raise ValueError("table must not be empty")
+        self.table = table
+        self.columns = columns
+
     def generate_statement(self) -> str:
-        parameterized_sql = f"INSERT INTO {self.table} ({', '.join(self.columns)}) VALUES ({', '.join(['?' for _ in self.columns])})"
-        return parameterized_sql
+        return _insert_sql(self.table, tuple(self.columns), 1)
+
+
+class IMultiRowInsert(IParameterizedInsert):
+    __slots__ = ()
+
+    @property
+    def rows_per_statement(self) -> int:
+        return max(1, min(MAX_ROWS_PER_INSERT, MAX_BIND_PARAMS // len(self.columns)))
+
+    def generate_statements(
+        self, rows: Sequence[Sequence[Any]]
+    ) -> Iterator[Tuple[str, list]]:
+        # one multi-row INSERT per chunk that fits Snowflake's bind limits; full
+        # chunks share the same SQL text
+        chunk_size = self.rows_per_statement
+        columns = tuple(self.columns)
+        for i in range(0, len(rows), chunk_size):
+            chunk = rows[i : i + chunk_size]
+            params: List[Any] = []
+            for row in chunk:
+                params.extend(row)
+            yield _insert_sql(self.table, columns, len(chunk)), params
@@ -0,0 +1,157 @@
+import random
+import threading
+import time
+from typing import Callable, Dict, TypeVar
+
+from snowflake.connector.errors import (
+    DatabaseError,
+    InterfaceError,
+    OperationalError,
+)
+
+from kendo.backends.adaptive_limiter import DEFAULT_MAX_CONCURRENCY, AdaptiveLimiter
+
+T = TypeVar("T")
+
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BASE_DELAY = 0.5
+DEFAULT_MAX_DELAY = 30.0
+
+# 000625: the statement was queued and never ran, so even a write can be sent
+# again; 000630 statement timeout, 000603 internal error and 000604 cancelled
+# may come after the statement (partly) ran
+_NOT_RUN_ERRNOS = {625}
+_TRANSIENT_ERRNOS = {603, 604}
+
+# statements that only read, so running them twice is harmless
+_READ_ONLY_PREFIXES = ("SELECT", "SHOW", "DESC", "DESCRIBE", "WITH", "LIST")
+
+
+def is_read_only(sql: str) -> bool:
+    return sql.lstrip(" \t\r\n(").upper().startswith(_READ_ONLY_PREFIXES)
+
+
+def statement_class(sql: str) -> str:
+    # the leading keyword, statements of one class have comparable latencies
+    words = sql.lstrip(" \t\r\n(").split(None, 1)
+    return words[0].upper() if words else ""
+
+
+def is_retryable(e: Exception, idempotent: bool = False) -> bool:
+    # a write is only sent again when Snowflake proves it never ran; a dropped
+    # connection may come after the server committed it
+    errno = getattr(e, "errno", None) or 0
+    if isinstance(e, DatabaseError) and errno in _NOT_RUN_ERRNOS:
+        return True
+    if not idempotent:
+        return False
+    if isinstance(e, (OperationalError, InterfaceError)):
+        # network failures and dropped connections
+        return True
+    return isinstance(e, DatabaseError) and errno in _TRANSIENT_ERRNOS
+
+
+class ExecutionStats:
+    statements: int
+    retries: int
+    throttled: int
+    failures: int
+    total_latency: float
+    peak_in_flight: int
+
+    def __init__(self):
+        self.statements = 0
+        self.retries = 0
+        self.throttled = 0
+        self.failures = 0
+        self.total_latency = 0.0
+        self.peak_in_flight = 0
+
+    def snapshot(self, limit: float, baseline_latency: Dict[str, float]) -> dict:
+        return {
+            "statements": self.statements,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "failures": self.failures,
+            "avg_latency": (
+                round(self.total_latency / self.statements, 3) if self.statements else None
+            ),
+            "baseline_latency": {
+                kind: round(latency, 3) for kind, latency in baseline_latency.items()
+            },
+            "concurrency_limit": int(limit),
+            "peak_in_flight": self.peak_in_flight,
+        }
+
+
+class ExecutionPolicy:
+    limiter: AdaptiveLimiter
+    stats: ExecutionStats
+    max_attempts: int
+    base_delay: float
+    max_delay: float
+
+    def __init__(
+        self,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        base_delay: float = DEFAULT_BASE_DELAY,
+        max_delay: float = DEFAULT_MAX_DELAY,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    ):
+        self.limiter = AdaptiveLimiter(max_concurrency)
+        self.stats = ExecutionStats()
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._stats_lock = threading.Lock()
+
+    def _backoff(self, attempt: int) -> float:
+        # exponential backoff with full jitter
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    def run(self, fn: Callable[[], T], idempotent: bool = False, kind: str = "") -> T:
+        # pass idempotent=True for reads, which are also retried on dropped
+        # connections and transient errors; kind is the statement class its
+        # latency is compared within
+        attempt = 0
+        while True:
+            in_flight = self.limiter.acquire()
+            started = time.monotonic()
+            try:
+                result = fn()
+            except Exception as e:
+                self.limiter.release()
+                retryable = is_retryable(e, idempotent)
+                retry = retryable and attempt + 1 < self.max_attempts
+                with self._stats_lock:
+                    if retryable:
+                        self.stats.throttled += 1
+                    if retry:
+                        self.stats.retries += 1
+                    else:
+                        self.stats.failures += 1
+                if not retry:
+                    raise
+                self.limiter.on_throttle()
+                time.sleep(self._backoff(attempt))
+                attempt += 1
+                continue
+            latency = time.monotonic() - started
+            self.limiter.release()
+            queued = self.limiter.on_success(latency, kind)
+            with self._stats_lock:
+                self.stats.statements += 1
+                self.stats.total_latency += latency
+                self.stats.peak_in_flight = max(self.stats.peak_in_flight, in_flight)
+                if queued:
+                    self.stats.throttled += 1
+            return result
+
+    def snapshot(self) -> dict:
+        with self._stats_lock:
+            return self.stats.snapshot(
+                self.limiter.limit, dict(self.limiter.baseline_latency)
+            )
+
+
+execution_policy = ExecutionPolicy()
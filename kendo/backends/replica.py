@@ -0,0 +1,228 @@
+import os
+import re
+import sqlite3
+from datetime import date, datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+from kendo.factory import Factory
+
+REPLICA_SCHEMA = "kendo_db.infrastructure"
+
+# tables whose rows scans update in place, reloaded whole on every refresh
+_UPDATED_IN_PLACE_TABLES = frozenset(["user_objs", "warehouse_objs"])
+
+_create_table_pattern = re.compile(
+    r"CREATE TABLE IF NOT EXISTS kendo_db\.infrastructure\.(\w+) \((.*?)\n\);",
+    re.DOTALL | re.IGNORECASE,
+)
+_replica_ref_pattern = re.compile(
+    r"\bkendo_db\.infrastructure\.(\w+)\b", re.IGNORECASE
+)
+_qualified_ref_pattern = re.compile(r"\b(\w+)\.(\w+)\.(\w+)\b")
+_from_target_pattern = re.compile(r"\b(?:from|join)\s+([\w$.\"]+)", re.IGNORECASE)
+_cte_name_pattern = re.compile(r"\b(\w+)\s+as\s*\(", re.IGNORECASE)
+_column_pattern = re.compile(r"(\w+)\s+(\w+(?:\([^)]*\))?)")
+_string_literal_pattern = re.compile(r"'(?:[^']|'')*'")
+_count_star_pattern = re.compile(r"\bcount\s*\(\s*\*\s*\)", re.IGNORECASE)
+_word_pattern = re.compile(r"[a-z_]\w*(?=(\s*\()?)", re.IGNORECASE)
+_number_pattern = re.compile(r"\b\d+(?:\.\d+)?\b")
+_alias_pattern = re.compile(
+    r"\b(?:from|join)\s+[\w.]+\s+(?:as\s+)?(\w+)|\bas\s+(\w+)", re.IGNORECASE
+)
+
+# constructs that behave the same on SQLite and Snowflake; LIKE (case-insensitive
+# in SQLite), casts, division, LIMIT and anything else sends the query to Snowflake
+_SAFE_KEYWORDS = frozenset(
+    """select distinct from where and or not is null in exists join inner left
+    outer cross on as group by order asc desc having with case when then else
+    end union all true false between""".split()
+)
+_SAFE_FUNCTIONS = frozenset(["count", "min", "max", "sum", "coalesce", "length"])
+_SAFE_OPERATOR_CHARS = frozenset("=<>!+-,().|;")
+# SQLite hands these back as text or integers, not as the timestamps and
+# booleans Snowflake returns
+_SAFE_TYPE_PREFIXES = ("INT", "VARCHAR", "NUMBER")
+
+
+def get_replica_tables(backend_DDL: str) -> Dict[str, Dict[str, str]]:
+    # column names and declared types of each infrastructure table, taken from
+    # the backend DDL; SQLite derives Snowflake-like affinities from the types
+    tables = {}
+    for name, body in _create_table_pattern.findall(backend_DDL):
+        columns = {}
+        for line in body.strip().splitlines():
+            line = line.strip()
+            if not line or line.upper().startswith("FOREIGN KEY"):
+                continue
+            column, column_type = _column_pattern.match(line).groups()  # type: ignore
+            columns[column.lower()] = column_type.upper()
+        tables[name.lower()] = columns
+    return tables
+
+
+def _to_sqlite_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+class InventoryReplica:
+    path: str
+    _column_words: Optional[Tuple[Set[str], Set[str]]]
+
+    def __init__(self, path: str):
+        self.path = path
+        self._column_words = None
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def _load_rows(
+        self,
+        conn: sqlite3.Connection,
+        factory: Factory,
+        table: str,
+        columns: List[str],
+        where: Optional[str] = None,
+    ):
+        rows = factory.backend_connection.execute(
+            factory.select(
+                table=f"{REPLICA_SCHEMA}.{table}", columns=columns, where=where
+            ).generate_statement()
+        )
+        assert isinstance(rows, list)
+        conn.executemany(
+            f"INSERT INTO {table} VALUES ({', '.join(['?' for _ in columns])})",
+            [
+                tuple(_to_sqlite_value(row[column.upper()]) for column in columns)
+                for row in rows
+            ],
+        )
+
+    def refresh(self, factory: Factory):
+        # most inventory rows are only ever appended, so those tables fetch just
+        # the rows past their local max id; a table whose columns changed, or whose
+        # row count then differs from the backend's, is reloaded. Everything
+        # happens in one transaction, so readers never see a partial replica
+        conn = sqlite3.connect(self.path, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for table, column_types in get_replica_tables(factory.backend_DDL).items():
+                columns = list(column_types)
+                local_columns = [
+                    (info[1], info[2])
+                    for info in conn.execute(f"PRAGMA table_info({table})")
+                ]
+                if local_columns != list(column_types.items()):
+                    conn.execute(f"DROP TABLE IF EXISTS {table}")
+                    conn.execute(
+                        f"CREATE TABLE {table} ({', '.join(f'{column} {column_type}' for column, column_type in column_types.items())})"
+                    )
+                if "id" not in column_types or table in _UPDATED_IN_PLACE_TABLES:
+                    conn.execute(f"DELETE FROM {table}")
+                    self._load_rows(conn, factory, table, columns)
+                    continue
+                max_id = conn.execute(f"SELECT MAX(id) FROM {table}").fetchone()[0]
+                self._load_rows(
+                    conn,
+                    factory,
+                    table,
+                    columns,
+                    where=None if max_id is None else f"id > {int(max_id)}",
+                )
+                backend_count = factory.backend_connection.execute(
+                    f"SELECT COUNT(*) AS n FROM {REPLICA_SCHEMA}.{table};"
+                )[0]["N"]  # type: ignore
+                if conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] != backend_count:
+                    conn.execute(f"DELETE FROM {table}")
+                    self._load_rows(conn, factory, table, columns)
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        self._column_words = None
+
+    def _load_column_words(self) -> Tuple[Set[str], Set[str]]:
+        # table names with the names of columns whose values compare and come
+        # back the same way on both engines, and the names of all other columns
+        if self._column_words is None:
+            safe_columns = set()
+            unsafe_columns = set()
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            try:
+                tables = [
+                    row[0]
+                    for row in conn.execute(
+                        "SELECT name FROM sqlite_master WHERE type = 'table'"
+                    )
+                ]
+                for table in tables:
+                    for info in conn.execute(f"PRAGMA table_info({table})"):
+                        if info[2].upper().startswith(_SAFE_TYPE_PREFIXES):
+                            safe_columns.add(info[1].lower())
+                        else:
+                            unsafe_columns.add(info[1].lower())
+            finally:
+                conn.close()
+            self._column_words = (
+                set(tables) | (safe_columns - unsafe_columns),
+                unsafe_columns,
+            )
+        return self._column_words
+
+    def can_answer(self, sql: str) -> bool:
+        # only queries whose every referenced object lives in kendo_db.infrastructure
+        # and that stick to constructs with the same semantics on both engines
+        if not self.exists():
+            return False
+        for ref in _qualified_ref_pattern.findall(sql):
+            if ".".join(ref[:2]).lower() != REPLICA_SCHEMA:
+                return False
+        cte_names = {name.lower() for name in _cte_name_pattern.findall(sql)}
+        targets = _from_target_pattern.findall(sql)
+        if not targets:
+            return False
+        for target in targets:
+            target = target.strip('"').lower()
+            if target in cte_names:
+                continue
+            if not _replica_ref_pattern.fullmatch(target):
+                return False
+
+        rest = _string_literal_pattern.sub(" ", sql)
+        if "--" in rest:
+            return False
+        aliases = {
+            (table_alias or alias).lower()
+            for table_alias, alias in _alias_pattern.findall(rest)
+        }
+        rest = _count_star_pattern.sub(" ", _replica_ref_pattern.sub(" ", rest))
+        safe_words, unsafe_columns = self._load_column_words()
+        known_words = (
+            safe_words | cte_names | aliases | _SAFE_KEYWORDS
+        ) - unsafe_columns
+        for word in _word_pattern.finditer(rest):
+            name = word.group(0).lower()
+            if word.group(1) and name not in _SAFE_FUNCTIONS | {"in", "exists", "as"}:
+                # a call of anything but the safe functions
+                return False
+            if not word.group(1) and name not in known_words:
+                return False
+        rest = _number_pattern.sub(" ", _word_pattern.sub(" ", rest))
+        return all(c.isspace() or c in _SAFE_OPERATOR_CHARS for c in rest)
+
+    def execute(self, sql: str, sql_params=None):
+        # rows are returned with upper-cased keys, the way DictCursor returns them
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        try:
+            cur = conn.execute(
+                _replica_ref_pattern.sub(r"\1", sql.strip().rstrip(";")),
+                sql_params or (),
+            )
+            columns = [description[0].upper() for description in cur.description]
+            return [dict(zip(columns, row)) for row in cur.fetchall()]
+        finally:
+            conn.close()
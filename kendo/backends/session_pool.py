@@ -0,0 +1,48 @@
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+MAX_IDLE_SESSIONS = 8
+
+
+class SessionPool:
+    # when enabled, closed connections hand their sessions back here instead of
+    # logging out, so a long-running process reuses warm sessions; sessions are
+    # bound to the role they logged in with, so there is one sub-pool per role
+    enabled: bool
+    idle: Dict[Tuple[str, Optional[str]], List[Any]]
+
+    def __init__(self):
+        self.enabled = False
+        self.idle = {}
+        self._lock = threading.Lock()
+
+    def acquire(
+        self, connection_name: str, role: Optional[str], connect: Callable[[], Any]
+    ) -> Any:
+        if self.enabled:
+            with self._lock:
+                idle = self.idle.get((connection_name, role), [])
+                while idle:
+                    session = idle.pop()
+                    if not session.is_closed():
+                        return session
+        return connect()
+
+    def release(self, connection_name: str, role: Optional[str], session: Any):
+        if self.enabled and not session.is_closed():
+            with self._lock:
+                idle = self.idle.setdefault((connection_name, role), [])
+                if len(idle) < MAX_IDLE_SESSIONS:
+                    idle.append(session)
+                    return
+        session.close()
+
+    def close_all(self):
+        with self._lock:
+            sessions = [session for idle in self.idle.values() for session in idle]
+            self.idle = {}
+        for session in sessions:
+            session.close()
+
+
+session_pool = SessionPool()
@@ -1,26 +1,50 @@
+import gzip
+import os
+import tempfile
+import uuid
+
 import typer
 import snowflake.connector
-from typing import Any
+from typing import Any, List, Optional, Sequence
 from snowflake.connector import connect, DictCursor
 from snowflake.connector.errors import ProgrammingError
 
+from kendo.backends.bulk_load import BULK_LOAD_FILE_FORMAT, format_csv_row
+from kendo.backends.execution_policy import (
+    execution_policy,
+    is_read_only,
+    statement_class,
+)
+from kendo.backends.session_pool import session_pool
 from kendo.schemas.common import ICaughtException
 
 snowflake.connector.paramstyle = "qmark"
 
 from kendo.backends.connection import IBackendConnection
 
+BULK_LOAD_STAGE = "kendo_db.config.kendo_bulk_load_stage"
+
 
 class SnowflakeBackendConnection(IBackendConnection):
     session: Any = None
     connection_name: str
+    # role the session logs in with, None for the connection's default role
+    role: Optional[str]
 
-    def __init__(self, connection_name: str):
+    def __init__(self, connection_name: str, role: Optional[str] = None):
         self.connection_name = connection_name
+        self.role = role
         self.session = self.get_session()
 
     def get_session(self):
-        return self.session or connect(connection_name=self.connection_name)
+        return self.session or session_pool.acquire(
+            self.connection_name, self.role, self._connect
+        )
+
+    def _connect(self):
+        if self.role:
+            return connect(connection_name=self.connection_name, role=self.role)
+        return connect(connection_name=self.connection_name)
 
     def execute(
         self,
@@ -35,7 +59,11 @@ class SnowflakeBackendConnection(IBackendConnection):
                     print("--------------------")
                     print(sql)
                     print("--------------------")
-                res = cur.execute(sql, sql_params).fetchall()
+                res = execution_policy.run(
+                    lambda: cur.execute(sql, sql_params).fetchall(),
+                    idempotent=is_read_only(sql),
+                    kind=statement_class(sql),
+                )
                 # print(json.dumps(res, indent=4, sort_keys=True, default=str))
                 return res
             except ProgrammingError as e:
@@ -45,6 +73,58 @@ class SnowflakeBackendConnection(IBackendConnection):
                 else:
                     return ICaughtException(message=str(e))
 
+    def execute_in_batches(
+        self,
+        sql,
+        sql_params=None,
+        batch_size=10000,
+        print_sql=False,
+    ):
+        # yields lists of rows so large result sets are never fully held in memory
+        with self.session.cursor(DictCursor) as cur:
+            try:
+                if print_sql:
+                    print("--------------------")
+                    print(sql)
+                    print("--------------------")
+                execution_policy.run(
+                    lambda: cur.execute(sql, sql_params),
+                    idempotent=is_read_only(sql),
+                    kind=statement_class(sql),
+                )
+                while True:
+                    batch = cur.fetchmany(batch_size)
+                    if not batch:
+                        break
+                    yield batch
+            except ProgrammingError as e:
+                print(e)
+                raise typer.Abort()
+
+    def execute_arrow_batches(
+        self,
+        sql,
+        sql_params=None,
+        print_sql=False,
+    ):
+        # yields pyarrow Tables, one per result chunk, without building Python
+        # rows; needs pyarrow (snowflake-connector-python[pandas])
+        with self.session.cursor() as cur:
+            try:
+                if print_sql:
+                    print("--------------------")
+                    print(sql)
+                    print("--------------------")
+                execution_policy.run(
+                    lambda: cur.execute(sql, sql_params),
+                    idempotent=is_read_only(sql),
+                    kind=statement_class(sql),
+                )
+                yield from cur.fetch_arrow_batches()
+            except ProgrammingError as e:
+                print(e)
+                raise typer.Abort()
+
     def execute_many_times(
         self,
         sql,
@@ -58,7 +138,10 @@ class SnowflakeBackendConnection(IBackendConnection):
                     print("--------------------")
                     print(sql)
                     print("--------------------")
-                res = cur.executemany(sql, list_of_sql_params).fetchall()
+                res = execution_policy.run(
+                    lambda: cur.executemany(sql, list_of_sql_params).fetchall(),
+                    kind=statement_class(sql),
+                )
                 # print(json.dumps(res, indent=4, sort_keys=True, default=str))
                 return res
             except ProgrammingError as e:
@@ -68,6 +151,38 @@ class SnowflakeBackendConnection(IBackendConnection):
                 else:
                     return ICaughtException(message=str(e))
 
+    def execute_bulk_load(
+        self,
+        table: str,
+        columns: List[str],
+        rows: Sequence[Sequence[Any]],
+        print_sql=False,
+    ):
+        # rows go to a gzipped CSV, are PUT to a session-scoped stage and
+        # loaded with one COPY INTO; NULLs are written as unquoted empty fields
+        file_name = f"kendo_bulk_load_{uuid.uuid4().hex}.csv.gz"
+        file_path = os.path.join(tempfile.gettempdir(), file_name)
+        try:
+            with gzip.open(file_path, "wt", newline="") as f:
+                for row in rows:
+                    f.write(format_csv_row(row))
+            self.execute(
+                f"CREATE TEMPORARY STAGE IF NOT EXISTS {BULK_LOAD_STAGE};",
+                print_sql=print_sql,
+            )
+            self.execute(
+                f"PUT 'file://{file_path}' @{BULK_LOAD_STAGE} AUTO_COMPRESS = FALSE SOURCE_COMPRESSION = GZIP;",
+                print_sql=print_sql,
+            )
+            self.execute(
+                f"COPY INTO {table} ({', '.join(columns)}) FROM @{BULK_LOAD_STAGE} \
+                FILES = ('{file_name}') FILE_FORMAT = ({BULK_LOAD_FILE_FORMAT}) PURGE = TRUE;",
+                print_sql=print_sql,
+            )
+        finally:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
     def execute_multi_stmts(
         self,
         sql,
@@ -89,4 +204,4 @@ class SnowflakeBackendConnection(IBackendConnection):
                 return ICaughtException(message=str(e))
 
     def close_session(self):
-        self.session.close()
+        session_pool.release(self.connection_name, self.role, self.session)
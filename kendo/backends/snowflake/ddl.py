@@ -19,6 +19,19 @@ CREATE TABLE IF NOT EXISTS kendo_db.config.tags_assignments (
     value VARCHAR(500) NOT NULL,
     FOREIGN KEY (tag_id) REFERENCES kendo_db.config.tags(id)
 );
+CREATE TABLE IF NOT EXISTS kendo_db.config.effective_tags (
+    obj_type VARCHAR(255) NOT NULL,
+    object_id INT NOT NULL,
+    database_id INT NULL,
+    tag_id INT NOT NULL,
+    value VARCHAR(500) NOT NULL,
+    source_type VARCHAR(255) NOT NULL,
+    source_id INT NOT NULL,
+    FOREIGN KEY (tag_id) REFERENCES kendo_db.config.tags(id)
+) CLUSTER BY (tag_id, obj_type);
+CREATE TABLE IF NOT EXISTS kendo_db.config.tags_catalog_version (
+    version INT NOT NULL
+);
 CREATE SCHEMA IF NOT EXISTS kendo_db.infrastructure;
 CREATE TABLE IF NOT EXISTS kendo_db.infrastructure.database_objs (
     id INT PRIMARY KEY AUTOINCREMENT,
@@ -117,4 +130,17 @@ CREATE TABLE IF NOT EXISTS kendo_db.infrastructure.warehouse_objs (
     obj_created_on TIMESTAMP_LTZ NULL,
     owner_role_id INT NULL
 );
+CREATE SCHEMA IF NOT EXISTS kendo_db.history;
+CREATE TABLE IF NOT EXISTS kendo_db.history.obj_history (
+    resource VARCHAR(255) NOT NULL,
+    object_id INT NOT NULL,
+    attributes VARIANT NOT NULL,
+    row_hash NUMBER(19, 0) NOT NULL,
+    valid_from TIMESTAMP_LTZ NOT NULL,
+    valid_to TIMESTAMP_LTZ NULL
+) CLUSTER BY (resource, valid_from, valid_to);
+CREATE TABLE IF NOT EXISTS kendo_db.history.pending_missing_objs (
+    resource VARCHAR(255) NOT NULL,
+    object_id INT NULL
+);
 """
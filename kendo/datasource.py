@@ -1,9 +1,17 @@
+from io import StringIO
+
 import typer
 import snowflake.connector
-from typing import Any
+from typing import Any, Optional
 from snowflake.connector import connect, DictCursor
 from snowflake.connector.errors import ProgrammingError
 
+from kendo.backends.execution_policy import (
+    execution_policy,
+    is_read_only,
+    statement_class,
+)
+from kendo.backends.session_pool import session_pool
 from kendo.schemas.common import ICaughtException
 
 snowflake.connector.paramstyle = "qmark"
@@ -12,13 +20,23 @@ snowflake.connector.paramstyle = "qmark"
 class SnowflakeDatasourceConnection:
     session: Any = None
     connection_name: str
+    # role the session logs in with, None for the connection's default role
+    role: Optional[str]
 
-    def __init__(self, connection_name: str):
+    def __init__(self, connection_name: str, role: Optional[str] = None):
         self.connection_name = connection_name
+        self.role = role
         self.session = self.get_session()
 
     def get_session(self):
-        return self.session or connect(connection_name=self.connection_name)
+        return self.session or session_pool.acquire(
+            self.connection_name, self.role, self._connect
+        )
+
+    def _connect(self):
+        if self.role:
+            return connect(connection_name=self.connection_name, role=self.role)
+        return connect(connection_name=self.connection_name)
 
     def execute(
         self,
@@ -33,7 +51,11 @@ class SnowflakeDatasourceConnection:
                     print("--------------------")
                     print(sql)
                     print("--------------------")
-                res = cur.execute(sql, sql_params).fetchall()
+                res = execution_policy.run(
+                    lambda: cur.execute(sql, sql_params).fetchall(),
+                    idempotent=is_read_only(sql),
+                    kind=statement_class(sql),
+                )
                 # print(json.dumps(res, indent=4, sort_keys=True, default=str))
                 return res
             except ProgrammingError as e:
@@ -43,5 +65,50 @@ class SnowflakeDatasourceConnection:
                 else:
                     return ICaughtException(message=str(e))
 
+    def execute_in_batches(
+        self,
+        sql,
+        sql_params=None,
+        batch_size=10000,
+        print_sql=False,
+    ):
+        # yields lists of rows so large result sets are never fully held in memory
+        with self.session.cursor(DictCursor) as cur:
+            try:
+                if print_sql:
+                    print("--------------------")
+                    print(sql)
+                    print("--------------------")
+                execution_policy.run(
+                    lambda: cur.execute(sql, sql_params),
+                    idempotent=is_read_only(sql),
+                    kind=statement_class(sql),
+                )
+                while True:
+                    batch = cur.fetchmany(batch_size)
+                    if not batch:
+                        break
+                    yield batch
+            except ProgrammingError as e:
+                print(e)
+                raise typer.Abort()
+
+    def execute_multi_stmts_in_order(
+        self,
+        sql,
+        print_sql=False,
+    ):
+        # yields one cursor per statement; on the first failure an ICaughtException
+        # is yielded instead and the rest of the script is not executed
+        if print_sql:
+            print("--------------------")
+            print(sql)
+            print("--------------------")
+        try:
+            for cur in self.session.execute_stream(StringIO(sql)):
+                yield cur
+        except ProgrammingError as e:
+            yield ICaughtException(message=str(e))
+
     def close_session(self):
-        self.session.close()
+        session_pool.release(self.connection_name, self.role, self.session)
@@ -1,6 +1,6 @@
-from typing import Type
+from typing import Optional, Type
 from kendo.backends.connection import IBackendConnection
-from kendo.backends.crud import IParameterizedInsert, ISelect
+from kendo.backends.crud import IMultiRowInsert, IParameterizedInsert, ISelect
 from kendo.schemas.enums import BackendProvider
 
 
@@ -9,15 +9,17 @@ class Factory:
     backend_DDL: str
     select: Type[ISelect]
     paramized_insert: Type[IParameterizedInsert]
+    multi_row_insert: Type[IMultiRowInsert]
 
-    def __init__(self, config_doc: dict):
+    def __init__(self, config_doc: dict, role: Optional[str] = None):
         if config_doc["backend"]["provider"] == BackendProvider.snowflake:
             from kendo.backends.snowflake.connection import SnowflakeBackendConnection
             from kendo.backends.snowflake.ddl import SQL
 
             self.backend_connection = SnowflakeBackendConnection(
-                config_doc["datasource"]["connection_name"]
+                config_doc["datasource"]["connection_name"], role=role
             )
             self.backend_DDL = SQL
         self.select = ISelect
         self.paramized_insert = IParameterizedInsert
+        self.multi_row_insert = IMultiRowInsert
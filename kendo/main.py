@@ -1,10 +1,20 @@
+from datetime import datetime
 from pathlib import Path
 import typer
 from typing_extensions import Annotated
 from typing import List, Optional
 from rich import print
 
-from kendo.schemas.enums import BackendProvider, Resources
+from kendo.schemas.enums import (
+    BackendProvider,
+    ExportFormat,
+    OutputFormat,
+    Resources,
+    TagableType,
+)
+from kendo.utils.output import emit_event, output_format
+from kendo.utils.prompt import assume_yes
+from kendo.utils.rich import colored_print
 from .services.security_clearance import (
     show_session_details,
     show_missing_grants as show_missing_grants_service,
@@ -12,13 +22,35 @@ from .services.security_clearance import (
 )
 from .services.configuration import (
     setup_config_database,
+    scan_accounts as scan_accounts_service,
     scan_infra as scan_infra_service,
+    scan_sharded as scan_sharded_service,
 )
 from .services.tags import (
     create_tag as create_tag_service,
     show_tags as show_tags_service,
     set_tag as set_tag_service,
 )
+from .services.policy import (
+    list_policies,
+    run_policies,
+)
+from .services.access import (
+    export_access_matrix,
+    show_object_access,
+    show_user_access,
+)
+from .services.daemon import (
+    forward_to_daemon,
+    notify_daemon_inventory_changed,
+    serve as serve_service,
+    stop_daemon,
+)
+from .services.diff import diff_snapshots
+from .services.effective_tags import show_tagged_objects as show_tagged_objects_service
+from .services.export import export_inventory
+from .services.history import show_history
+from .services.tag_sync import sync_tags as sync_tags_service
 from .services.test import (
     execute_tests,
     list_tests
@@ -29,8 +61,9 @@ app = typer.Typer(pretty_exceptions_show_locals=False)
 
 
 @app.callback()
-def callback():
-    pass
+def callback(ctx: typer.Context):
+    # hand the command to `kendo serve` when it is running
+    forward_to_daemon(ctx.invoked_subcommand)
 
 
 @app.command()
@@ -79,27 +112,180 @@ def show_required_grants():
 
 
 @app.command()
-def scan(object_type: Annotated[Resources, typer.Argument()]):
+def scan(
+    object_type: Annotated[Resources, typer.Argument()],
+    yes: Annotated[bool, typer.Option()] = False,
+    accounts: Annotated[Optional[str], typer.Option()] = None,
+    shard: Annotated[Optional[str], typer.Option()] = None,
+    shards: Annotated[Optional[int], typer.Option()] = None,
+    output: Annotated[OutputFormat, typer.Option()] = OutputFormat.text,
+):
     """
-    Scan Snowflake infrastructure.
+    Scan Snowflake infrastructure; --accounts a,b,c scans several configured accounts, --shard databases|i/N|final and --shards N split one account's databases across workers.
     """
     assert object_type is not None
+    if output == OutputFormat.ndjson and not yes:
+        colored_print(
+            "NDJSON output can't carry prompts, pass --yes with --output ndjson.",
+            level="error",
+        )
+        raise typer.Abort()
+
+    output_token = output_format.set(output)
+    try:
+        if accounts or shard or shards is not None:
+            if not yes:
+                colored_print(
+                    "Workers scan unattended, pass --yes with --accounts, --shard or --shards.",
+                    level="error",
+                )
+                raise typer.Abort()
+            if accounts and (shard or shards is not None):
+                colored_print(
+                    "--accounts can't be combined with --shard or --shards.", level="error"
+                )
+                raise typer.Abort()
+            if accounts:
+                scan_accounts_service(
+                    object_type, [account.strip() for account in accounts.split(",")]
+                )
+            else:
+                assume_yes_token = assume_yes.set(True)
+                try:
+                    scan_sharded_service(object_type, shard, shards)
+                finally:
+                    assume_yes.reset(assume_yes_token)
+            notify_daemon_inventory_changed()
+            return
+
+        assume_yes_token = assume_yes.set(True) if yes else None
+        try:
+            scan_infra_service(object_type)
+        finally:
+            if assume_yes_token is not None:
+                assume_yes.reset(assume_yes_token)
+        notify_daemon_inventory_changed()
+    finally:
+        output_format.reset(output_token)
+
+
+@app.command()
+def history(
+    object_type: Annotated[Resources, typer.Argument()],
+    as_of: Annotated[Optional[datetime], typer.Option()] = None,
+    object_id: Annotated[Optional[int], typer.Option()] = None,
+):
+    """
+    Show scanned objects as they were at a point in time, or every version of one object.
+    """
+    show_history(object_type, as_of, object_id)
+
+
+@app.command()
+def diff(
+    snapshot_a: Annotated[str, typer.Argument()],
+    snapshot_b: Annotated[str, typer.Argument()] = "live",
+    object_type: Annotated[Resources, typer.Option()] = Resources.all,
+    fail_on_drift: Annotated[bool, typer.Option()] = False,
+):
+    """
+    Print objects added, removed and changed between two scan timestamps (or 'live') as NDJSON.
+    """
+    diff_snapshots(snapshot_a, snapshot_b, object_type, fail_on_drift)
 
-    scan_infra_service(object_type)
 
 @app.command()
-def test(cmd_type: Annotated[str, typer.Argument()], datasource_connection_name: Annotated[Optional[str], typer.Option()] = "default"):
+def export(
+    out_dir: Annotated[Path, typer.Argument()] = Path("kendo_export"),
+    format: Annotated[ExportFormat, typer.Option()] = ExportFormat.parquet,
+    types: Annotated[Optional[List[Resources]], typer.Option()] = None,
+):
+    """
+    Export the scanned inventory with resolved names as partitioned Parquet or NDJSON files.
+    """
+    export_inventory(out_dir, format, types)
+
+
+@app.command()
+def serve(
+    port: Annotated[int, typer.Option()] = 0,
+    stop: Annotated[bool, typer.Option()] = False,
+):
+    """
+    Run a local daemon keeping sessions, config and inventory warm; other commands are forwarded to it.
+    """
+    if stop:
+        stop_daemon()
+    else:
+        serve_service(port)
+
+@app.command()
+def test(
+    cmd_type: Annotated[str, typer.Argument()],
+    datasource_connection_name: Annotated[Optional[str], typer.Option()] = "default",
+    output: Annotated[OutputFormat, typer.Option()] = OutputFormat.text,
+):
     """
     Run tests.
     """
-    if cmd_type == 'list':
-        tests = list_tests()
-        for test in tests:
-            print(test)
+    output_token = output_format.set(output)
+    try:
+        if cmd_type == 'list':
+            tests = list_tests()
+            for test in tests:
+                if output == OutputFormat.ndjson:
+                    emit_event("test", **test)
+                else:
+                    print(test)
+
+        if cmd_type == 'run':
+            execute_tests(datasource_connection_name)
+    finally:
+        output_format.reset(output_token)
+
+
+@app.command()
+def policy(
+    cmd_type: Annotated[str, typer.Argument()],
+    file_path: Annotated[Optional[str], typer.Option()] = "sample/kendo.yml",
+    remediate: Annotated[bool, typer.Option()] = False,
+    dry_run: Annotated[bool, typer.Option()] = False,
+    max_concurrency: Annotated[int, typer.Option()] = 4,
+):
+    """
+    List or run policies, optionally executing their remediation actions.
+    """
+    assert file_path is not None
+    if cmd_type == "list":
+        for policy in list_policies(file_path):
+            print(policy.model_dump())
+
+    if cmd_type == "run":
+        run_policies(file_path, remediate, dry_run, max_concurrency)
+
+
+@app.command()
+def access(
+    cmd_type: Annotated[str, typer.Argument()],
+    name: Annotated[Optional[str], typer.Argument()] = None,
+    object_type: Annotated[Optional[str], typer.Option()] = None,
+    privilege: Annotated[Optional[str], typer.Option()] = None,
+    file_path: Annotated[Optional[Path], typer.Option()] = None,
+):
+    """
+    Show what a user can access, who can access an object, or export every user's access.
+    """
+    if cmd_type == "user":
+        assert name is not None
+        show_user_access(name, privilege, object_type)
+
+    if cmd_type == "object":
+        assert name is not None
+        show_object_access(object_type or "table", name, privilege)
+
+    if cmd_type == "export":
+        export_access_matrix(file_path or Path("access.ndjson"))
 
-    if cmd_type == 'run':
-        execute_tests(datasource_connection_name)
-    
 
 @app.command()
 def create_tag(
@@ -115,11 +301,25 @@ def create_tag(
 @app.command()
 def show_tags(
     name_like: Annotated[Optional[str], typer.Option()] = None,
+    limit: Annotated[Optional[int], typer.Option()] = None,
+    offset: Annotated[Optional[int], typer.Option()] = None,
 ):
     """
-    Show Tags.
+    Show Tags, optionally paginated.
     """
-    show_tags_service(name_like)
+    show_tags_service(name_like, limit, offset)
+
+
+@app.command()
+def show_tagged_objects(
+    tag: Annotated[str, typer.Argument()],
+    object_type: Annotated[TagableType, typer.Option()] = TagableType.COLUMN,
+    value: Annotated[Optional[str], typer.Option()] = None,
+):
+    """
+    Show objects carrying a Tag, directly or inherited from a parent object.
+    """
+    show_tagged_objects_service(tag, object_type, value)
 
 
 @app.command()
@@ -130,3 +330,16 @@ def set_tag(
     Set Tag to objects.
     """
     set_tag_service(file_path)
+
+
+@app.command()
+def sync_tags(
+    role: Annotated[Optional[str], typer.Option()] = "SYSADMIN",
+    dry_run: Annotated[bool, typer.Option()] = False,
+    max_concurrency: Annotated[int, typer.Option()] = 4,
+):
+    """
+    Apply kendo Tag assignments to native Snowflake Tags.
+    """
+    assert role is not None
+    sync_tags_service(role, dry_run, max_concurrency)
@@ -4,6 +4,8 @@ from enum import Enum
 class TagableType(Enum):
     USER = "user"
     ROLE = "role"
+    DATABASE = "database"
+    SCHEMA = "schema"
     TABLE = "table"
     COLUMN = "column"
     VIEW = "view"
@@ -28,3 +30,13 @@ class Resources(str, Enum):
     pipes = "pipes"
     views = "views"
     all = "all"
+
+
+class ExportFormat(str, Enum):
+    parquet = "parquet"
+    ndjson = "ndjson"
+
+
+class OutputFormat(str, Enum):
+    text = "text"
+    ndjson = "ndjson"
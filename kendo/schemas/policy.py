@@ -0,0 +1,37 @@
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, Field
+
+
+class IPolicy(BaseModel):
+    name: str = Field(min_length=1)
+    description: Optional[str] = None
+    resource: str = Field(min_length=1)
+    filters: List[Dict[str, Any]] = []
+    actions: List[Dict[str, Any]] = []
+
+
+class IPolicyViolation(BaseModel):
+    id: int
+    full_name: str
+    # database, schema, ... and object name as stored, outermost first
+    name_parts: List[str] = []
+
+
+class IPolicyResult(BaseModel):
+    policy: str
+    resource: str
+    violations: List[IPolicyViolation] = []
+    error: Optional[str] = None
+
+
+class IRemediationStatement(BaseModel):
+    group: str
+    role: str
+    statement: str
+
+
+class IRemediationOutcome(BaseModel):
+    group: str
+    statement: str
+    status: str
+    error: Optional[str] = None
@@ -9,6 +9,13 @@ class ITagableObj(BaseModel):
     path: str = Field(min_length=1)
 
 
+class ITagAssignment(BaseModel):
+    tag: str = Field(min_length=1)
+    value: str = Field(min_length=1)
+    type: TagableType
+    path: str = Field(min_length=1)
+
+
 class ITagAssignmentRequest(BaseModel):
     tag: str = Field(min_length=1)
     value: str = Field(min_length=1)
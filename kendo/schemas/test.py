@@ -0,0 +1,21 @@
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel
+
+
+class IResultsDiff(BaseModel):
+    missing: List[Dict[str, Any]] = []
+    missing_count: int = 0
+    unexpected: List[Dict[str, Any]] = []
+    unexpected_count: int = 0
+
+    @property
+    def matched(self) -> bool:
+        return self.missing_count == 0 and self.unexpected_count == 0
+
+
+class IAssertionOutcome(BaseModel):
+    assertion: str
+    passed: bool
+    actual: Optional[Any] = None
+    diff: Optional[IResultsDiff] = None
+    ran_on: str = "snowflake"
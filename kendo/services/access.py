@@ -0,0 +1,379 @@
+import csv
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import typer
+from rich import print_json
+
+from kendo.factory import Factory
+from kendo.schemas.enums import TagableType
+from kendo.services.common import (
+    get_kendo_config_or_raise_error,
+    get_kendo_local_path,
+)
+from kendo.services.inventory_index import InventoryPathIndex, split_object_path
+from kendo.utils.rich import colored_print
+
+ACCESS_GRAPH_CACHE_FILE = "access_graph_{connection_name}.json"
+ACCESS_GRAPH_BATCH_SIZE = 50000
+
+_INFRA = "kendo_db.infrastructure"
+
+# object types privilege grants are scanned for
+GRANTABLE_TYPES = {
+    "DATABASE": TagableType.DATABASE,
+    "SCHEMA": TagableType.SCHEMA,
+    "TABLE": TagableType.TABLE,
+}
+
+
+def _iter_bits(mask: int) -> Iterator[int]:
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class AccessGraph:
+    # roles and users are numbered by their position in role_ids / user_ids and
+    # sets of them are held as int bitsets:
+    #   role_closure[r]  roles whose privileges role r holds, r included
+    #   user_roles[u]    roles user u holds, directly or inherited
+    #   role_users[r]    users holding role r, directly or inherited
+    role_ids: List[int]
+    role_names: List[str]
+    user_ids: List[int]
+    user_names: List[str]
+    role_closure: List[int]
+    user_roles: List[int]
+    role_users: List[int]
+    # (privilege, granted_on, granted_on_id) granted directly to each role
+    role_privileges: List[List[Tuple[str, str, int]]]
+    # (granted_on, granted_on_id) -> privilege -> roles granted it directly
+    object_privileges: Dict[Tuple[str, int], Dict[str, int]]
+    object_paths: Dict[str, Dict[int, Tuple[str, ...]]]
+    object_ids: Dict[str, Dict[Tuple[str, ...], int]]
+
+    def __init__(
+        self,
+        roles: List[Tuple[int, str]],
+        users: List[Tuple[int, str]],
+        role_closure: List[int],
+        user_roles: List[int],
+        privilege_grants: List[Tuple[int, str, str, int]],
+        object_paths: Dict[str, Dict[int, Tuple[str, ...]]],
+    ):
+        self.role_ids = [role_id for role_id, _ in roles]
+        self.role_names = [name for _, name in roles]
+        self.user_ids = [user_id for user_id, _ in users]
+        self.user_names = [name for _, name in users]
+        self.role_closure = role_closure
+        self.user_roles = user_roles
+        self.object_paths = object_paths
+        self.object_ids = {
+            granted_on: {path: obj_id for obj_id, path in paths.items()}
+            for granted_on, paths in object_paths.items()
+        }
+        self._user_index = {name: i for i, name in enumerate(self.user_names)}
+
+        self.role_users = [0] * len(roles)
+        for u, mask in enumerate(user_roles):
+            for r in _iter_bits(mask):
+                self.role_users[r] |= 1 << u
+
+        role_index = {role_id: i for i, role_id in enumerate(self.role_ids)}
+        self.role_privileges = [[] for _ in roles]
+        self.object_privileges = {}
+        for role_id, privilege, granted_on, granted_on_id in privilege_grants:
+            if role_id not in role_index:
+                continue
+            r = role_index[role_id]
+            self.role_privileges[r].append((privilege, granted_on, granted_on_id))
+            privileges = self.object_privileges.setdefault(
+                (granted_on, granted_on_id), {}
+            )
+            privileges[privilege] = privileges.get(privilege, 0) | 1 << r
+        self._privilege_grants = privilege_grants
+
+    @classmethod
+    def build(cls, factory: Factory) -> "AccessGraph":
+        def fetch(sql: str) -> Iterator[dict]:
+            for batch in factory.backend_connection.execute_in_batches(
+                sql, batch_size=ACCESS_GRAPH_BATCH_SIZE
+            ):
+                yield from batch
+
+        roles = [
+            (row["ID"], row["NAME"])
+            for row in fetch(f"SELECT id, name FROM {_INFRA}.role_objs ORDER BY id")
+        ]
+        users = [
+            (row["ID"], row["LOGIN_NAME"])
+            for row in fetch(
+                f"SELECT id, login_name FROM {_INFRA}.user_objs ORDER BY id"
+            )
+        ]
+        role_index = {role_id: i for i, (role_id, _) in enumerate(roles)}
+        user_index = {user_id: i for i, (user_id, _) in enumerate(users)}
+
+        # a role granted to another role passes its privileges up to it
+        role_closure = [1 << r for r in range(len(roles))]
+        user_direct_roles = [0] * len(users)
+        role_edges: List[Tuple[int, int]] = []
+        for row in fetch(
+            f"SELECT role_id, granted_to, granted_to_id FROM {_INFRA}.grants_role_objs"
+        ):
+            if row["ROLE_ID"] not in role_index:
+                continue
+            child = role_index[row["ROLE_ID"]]
+            if row["GRANTED_TO"] == "ROLE" and row["GRANTED_TO_ID"] in role_index:
+                role_edges.append((role_index[row["GRANTED_TO_ID"]], child))
+            elif row["GRANTED_TO"] == "USER" and row["GRANTED_TO_ID"] in user_index:
+                user_direct_roles[user_index[row["GRANTED_TO_ID"]]] |= 1 << child
+
+        # propagate until stable; also terminates on (unexpected) cycles
+        changed = True
+        while changed:
+            changed = False
+            for parent, child in role_edges:
+                merged = role_closure[parent] | role_closure[child]
+                if merged != role_closure[parent]:
+                    role_closure[parent] = merged
+                    changed = True
+
+        user_roles = []
+        for direct_roles in user_direct_roles:
+            mask = 0
+            for r in _iter_bits(direct_roles):
+                mask |= role_closure[r]
+            user_roles.append(mask)
+
+        privilege_grants = [
+            (
+                row["GRANTED_TO_ID"],
+                row["PRIVILEGE"],
+                row["GRANTED_ON"],
+                row["GRANTED_ON_ID"],
+            )
+            for row in fetch(
+                f"""SELECT granted_to_id, privilege, granted_on, granted_on_id
+                FROM {_INFRA}.grants_privilege_objs WHERE granted_to = 'ROLE'"""
+            )
+        ]
+
+        inventory_index = InventoryPathIndex(factory)
+        object_paths = {
+            granted_on: {
+                obj_id: path
+                for path, obj_id in inventory_index.get_paths(tagable_type).items()
+            }
+            for granted_on, tagable_type in GRANTABLE_TYPES.items()
+        }
+        return cls(
+            roles, users, role_closure, user_roles, privilege_grants, object_paths
+        )
+
+    def to_json(self) -> dict:
+        return {
+            "roles": list(zip(self.role_ids, self.role_names)),
+            "users": list(zip(self.user_ids, self.user_names)),
+            "role_closure": [format(mask, "x") for mask in self.role_closure],
+            "user_roles": [format(mask, "x") for mask in self.user_roles],
+            "privilege_grants": self._privilege_grants,
+            "object_paths": {
+                granted_on: [[obj_id, list(path)] for obj_id, path in paths.items()]
+                for granted_on, paths in self.object_paths.items()
+            },
+        }
+
+    @classmethod
+    def from_json(cls, doc: dict) -> "AccessGraph":
+        return cls(
+            roles=[tuple(role) for role in doc["roles"]],
+            users=[tuple(user) for user in doc["users"]],
+            role_closure=[int(mask, 16) for mask in doc["role_closure"]],
+            user_roles=[int(mask, 16) for mask in doc["user_roles"]],
+            privilege_grants=[tuple(grant) for grant in doc["privilege_grants"]],
+            object_paths={
+                granted_on: {obj_id: tuple(path) for obj_id, path in paths}
+                for granted_on, paths in doc["object_paths"].items()
+            },
+        )
+
+    def _object_name(self, granted_on: str, obj_id: int) -> str:
+        path = self.object_paths.get(granted_on, {}).get(obj_id)
+        return ".".join(path) if path else f"<{granted_on.lower()} {obj_id}>"
+
+    def user_access(
+        self,
+        login_name: str,
+        privilege: Optional[str] = None,
+        granted_on: Optional[str] = None,
+    ) -> Optional[List[dict]]:
+        # None when the user isn't in the inventory
+        if login_name not in self._user_index:
+            return None
+        access = {}
+        for r in _iter_bits(self.user_roles[self._user_index[login_name]]):
+            for grant in self.role_privileges[r]:
+                if privilege and grant[0] != privilege:
+                    continue
+                if granted_on and grant[1] != granted_on:
+                    continue
+                access.setdefault(grant, self.role_names[r])
+        return [
+            {
+                "object_type": obj_type,
+                "object": self._object_name(obj_type, obj_id),
+                "privilege": obj_privilege,
+                "via_role": via_role,
+            }
+            for (obj_privilege, obj_type, obj_id), via_role in sorted(
+                access.items(), key=lambda item: (item[0][1], item[0][2], item[0][0])
+            )
+        ]
+
+    def object_access(
+        self, granted_on: str, path: str, privilege: Optional[str] = None
+    ) -> Optional[List[dict]]:
+        # None when the object isn't in the inventory
+        obj_id = self.object_ids.get(granted_on, {}).get(split_object_path(path))
+        if obj_id is None:
+            return None
+        access = []
+        for obj_privilege, roles in sorted(
+            self.object_privileges.get((granted_on, obj_id), {}).items()
+        ):
+            if privilege and obj_privilege != privilege:
+                continue
+            users = 0
+            for r in _iter_bits(roles):
+                users |= self.role_users[r]
+            access.extend(
+                {"user": self.user_names[u], "privilege": obj_privilege}
+                for u in _iter_bits(users)
+            )
+        return access
+
+    def iter_access_matrix(self) -> Iterator[dict]:
+        # every (user, object, privilege) a user holds, through any role
+        for u, login_name in enumerate(self.user_names):
+            grants = set()
+            for r in _iter_bits(self.user_roles[u]):
+                grants.update(self.role_privileges[r])
+            for obj_privilege, obj_type, obj_id in sorted(
+                grants, key=lambda grant: (grant[1], grant[2], grant[0])
+            ):
+                yield {
+                    "user": login_name,
+                    "object_type": obj_type,
+                    "object": self._object_name(obj_type, obj_id),
+                    "privilege": obj_privilege,
+                }
+
+
+# the last graph loaded or built, with the cache file mtime it matches
+_access_graph: Optional[Tuple[float, AccessGraph]] = None
+
+
+def _cache_path(config_doc: dict) -> str:
+    return get_kendo_local_path(
+        ACCESS_GRAPH_CACHE_FILE.format(
+            connection_name=config_doc["datasource"]["connection_name"]
+        )
+    )
+
+
+def refresh_access_graph(factory: Factory, config_doc: dict) -> AccessGraph:
+    # called at the end of every scan, so queries never touch the backend
+    access_graph = AccessGraph.build(factory)
+    cache_path = _cache_path(config_doc)
+    tmp_path = cache_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(access_graph.to_json(), f)
+    os.replace(tmp_path, cache_path)
+    global _access_graph
+    _access_graph = (os.path.getmtime(cache_path), access_graph)
+    return access_graph
+
+
+def get_access_graph(config_doc: dict) -> AccessGraph:
+    global _access_graph
+    cache_path = _cache_path(config_doc)
+    if os.path.exists(cache_path):
+        mtime = os.path.getmtime(cache_path)
+        if _access_graph is not None and _access_graph[0] == mtime:
+            return _access_graph[1]
+        try:
+            with open(cache_path) as f:
+                _access_graph = (mtime, AccessGraph.from_json(json.load(f)))
+            return _access_graph[1]
+        except (OSError, ValueError, KeyError):
+            # a corrupt cache is simply rebuilt
+            pass
+    factory = Factory(config_doc, role="SYSADMIN")
+    access_graph = refresh_access_graph(factory, config_doc)
+    factory.backend_connection.close_session()
+    return access_graph
+
+
+def _granted_on(object_type: str) -> str:
+    granted_on = object_type.upper()
+    if granted_on not in GRANTABLE_TYPES:
+        colored_print(
+            f"Unsupported object type '{object_type}', use one of {', '.join(t.lower() for t in GRANTABLE_TYPES)}.",
+            level="error",
+        )
+        raise typer.Abort()
+    return granted_on
+
+
+def show_user_access(
+    login_name: str, privilege: Optional[str] = None, object_type: Optional[str] = None
+):
+    access_graph = get_access_graph(get_kendo_config_or_raise_error())
+    access = access_graph.user_access(
+        login_name,
+        privilege.upper() if privilege else None,
+        _granted_on(object_type) if object_type else None,
+    )
+    if access is None:
+        colored_print(f"User '{login_name}' not found in scanned inventory.", level="error")
+        raise typer.Abort()
+    for row in access:
+        print_json(data=row)
+
+
+def show_object_access(object_type: str, path: str, privilege: Optional[str] = None):
+    access_graph = get_access_graph(get_kendo_config_or_raise_error())
+    access = access_graph.object_access(
+        _granted_on(object_type), path, privilege.upper() if privilege else None
+    )
+    if access is None:
+        colored_print(
+            f"{object_type} '{path}' not found in scanned inventory.", level="error"
+        )
+        raise typer.Abort()
+    for row in access:
+        print_json(data=row)
+
+
+def export_access_matrix(file_path: Path):
+    access_graph = get_access_graph(get_kendo_config_or_raise_error())
+    count = 0
+    with open(file_path, "w", newline="") as f:
+        if file_path.suffix.lower() == ".csv":
+            writer = csv.DictWriter(
+                f, fieldnames=["user", "object_type", "object", "privilege"]
+            )
+            writer.writeheader()
+            for row in access_graph.iter_access_matrix():
+                writer.writerow(row)
+                count += 1
+        else:
+            for row in access_graph.iter_access_matrix():
+                f.write(json.dumps(row) + "\n")
+                count += 1
+    colored_print(f"{count} access row(s) written to {file_path}.", level="success")
@@ -1,12 +1,19 @@
 import os
+from typing import Optional, Tuple
 
 import tomli
 import typer
 
+from kendo.backends.replica import InventoryReplica
 from kendo.utils.rich import colored_print
 
 
+# parsed config with the mtime it was read at, reused while the file is unchanged
+_config_doc: Optional[Tuple[float, dict]] = None
+
+
 def get_kendo_config_or_raise_error():
+    global _config_doc
     # check if kendo local config file exists
     kendo_config_dir = os.path.join(os.path.expanduser("~"), ".kendo")
     kendo_config_path = os.path.join(kendo_config_dir, "config.toml")
@@ -18,6 +25,34 @@ def get_kendo_config_or_raise_error():
         )
         raise typer.Abort()
     else:
+        mtime = os.path.getmtime(kendo_config_path)
+        if _config_doc is not None and _config_doc[0] == mtime:
+            return _config_doc[1]
         with open(kendo_config_path, "rb") as f:
             config_doc = tomli.load(f)
+        _config_doc = (mtime, config_doc)
     return config_doc
+
+
+def get_kendo_local_path(filename: str) -> str:
+    kendo_config_dir = os.path.join(os.path.expanduser("~"), ".kendo")
+    return os.path.join(kendo_config_dir, filename)
+
+
+def get_account_config_doc(config_doc: dict, account: str) -> dict:
+    # the backend lives in the datasource's own Snowflake account, so swapping the
+    # datasource gives every account its own kendo_db
+    datasources = config_doc.get("datasources", {})
+    if account not in datasources:
+        colored_print(
+            f"Account '{account}' is not configured, add it under [datasources.{account}] in ~/.kendo/config.toml.",
+            level="error",
+        )
+        raise typer.Abort()
+    return {**config_doc, "datasource": datasources[account]}
+
+
+def get_inventory_replica(connection_name: str) -> InventoryReplica:
+    return InventoryReplica(
+        get_kendo_local_path(f"inventory_replica_{connection_name}.sqlite3")
+    )
@@ -1,5 +1,12 @@
+import functools
+import multiprocessing
 import os
-from typing import Dict, List, Tuple, cast
+import time
+import traceback
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stderr, redirect_stdout
+from typing import Callable, Dict, List, Optional, Set, Tuple, cast
 
 import tomli
 import tomli_w
@@ -7,10 +14,12 @@ import typer
 from rich import print
 from rich.progress import Progress, SpinnerColumn, TextColumn
 
+from kendo.backends.crud import MAX_BIND_PARAMS
+from kendo.backends.execution_policy import execution_policy
 from kendo.datasource import SnowflakeDatasourceConnection
 from kendo.factory import Factory
 from kendo.schemas.common import ICaughtException
-from kendo.schemas.enums import BackendProvider, Resources
+from kendo.schemas.enums import BackendProvider, OutputFormat, Resources
 from kendo.schemas.mapped_objs import (
     ColumnObj,
     DatabaseObj,
@@ -26,8 +35,36 @@ from kendo.schemas.mapped_objs import (
     ViewObj,
     WarehouseObj,
 )
-from kendo.services.common import get_kendo_config_or_raise_error
-from kendo.utils.rich import colored_print
+from kendo.services.access import refresh_access_graph
+from kendo.services.common import (
+    get_account_config_doc,
+    get_inventory_replica,
+    get_kendo_config_or_raise_error,
+    get_kendo_local_path,
+)
+from kendo.services.effective_tags import (
+    record_changed_objs,
+    refresh_changed_effective_tags,
+    refresh_effective_tags,
+)
+from kendo.services.history import (
+    RESOURCE_TABLES,
+    collect_missing_objs,
+    flush_missing_objs,
+    record_history,
+    record_missing_objs,
+)
+from kendo.services.inventory_changes import (
+    MUTABLE_ATTRIBUTES,
+    changed_objs,
+    merge_changed_objs_sql,
+)
+from kendo.services.inventory_index import invalidate_inventory_index
+from kendo.services.security_clearance import ClearanceChecker
+from kendo.services.tags import canonicalize_tag_assignments
+from kendo.utils.prompt import assume_yes, prompt_confirm
+from kendo.utils.output import emit_event, event_phase, is_ndjson, output_format
+from kendo.utils.rich import colored_print, print_objs
 
 exclusion_rules = {
     "databases": ["snowflake", "snowflake_sample_data", "kendo_db"],
@@ -43,28 +80,47 @@ exclusion_rules = {
     ],
 }
 
+# accounts or shards scanned at once, one process each
+MAX_SCAN_WORKERS = 8
+
+# changed attributes of matched objects are staged here before the merge
+CHANGED_OBJS_LOAD_TABLE = "kendo_db.infrastructure.changed_objs_load"
+
+# resources each shard scans for its databases
+SHARD_RESOURCES = [
+    Resources.schemas,
+    Resources.tables,
+    Resources.views,
+    Resources.stages,
+    Resources.columns,
+    Resources.streams,
+    Resources.pipes,
+]
+
+
+def _scan_phase(resource: Resources):
+    # every scanner reports its own start and end, inside whole-scan events
+    def decorate(scan: Callable) -> Callable:
+        @functools.wraps(scan)
+        def run(*args, **kwargs):
+            with event_phase("scan", resource=resource.value):
+                return scan(*args, **kwargs)
+
+        return run
+
+    return decorate
+
 
 def setup_config_database(
     backend_provider: BackendProvider, datasource_connection_name: str
 ):
-    # check if user has SYSADMIN, SECURITYADMIN
+    # check if user has SYSADMIN, SECURITYADMIN, directly or through another role
     snowflake_ds = SnowflakeDatasourceConnection(datasource_connection_name)
-    role_grant_check = snowflake_ds.execute(
-        f"SHOW GRANTS TO USER {snowflake_ds.get_session().user}"
+    missing_roles = ClearanceChecker(snowflake_ds).missing_roles(
+        ["SYSADMIN", "SECURITYADMIN"]
     )
-    ROLE_SYSADMIN = False
-    ROLE_SECURITYADMIN = False
-    if isinstance(role_grant_check, list) and len(role_grant_check) > 0:
-        for i, grant in enumerate(role_grant_check):
-            if grant["role"] == "SYSADMIN":
-                ROLE_SYSADMIN = True
-            if grant["role"] == "SECURITYADMIN":
-                ROLE_SECURITYADMIN = True
-    if not ROLE_SYSADMIN:
-        print("User does not have SYSADMIN role. Aborting...")
-        raise typer.Abort()
-    if not ROLE_SECURITYADMIN:
-        print("User does not have SECURITYADMIN role. Aborting...")
+    if missing_roles:
+        print(f"User does not have {missing_roles[0]} role. Aborting...")
         raise typer.Abort()
     snowflake_ds.close_session()
 
@@ -101,10 +157,9 @@ def setup_config_database(
                 tomli_w.dump(config_doc, f)
 
     # setup backend database
-    factory = Factory(config_doc)
-    if config_doc["backend"]["provider"] == BackendProvider.snowflake:
-        factory.backend_connection.execute("USE ROLE SYSADMIN;")
+    factory = Factory(config_doc, role="SYSADMIN")
     factory.backend_connection.execute_multi_stmts(factory.backend_DDL)
+    canonicalize_tag_assignments(factory)
     colored_print("Config database setup completed successfully.", level="success")
     factory.backend_connection.close_session()
 
@@ -124,17 +179,42 @@ def _get_db_objs_in_kendo_with_id_key_map(
     return dbs_in_kendo, kendo_db_id_key_map
 
 
+def _select_children(
+    factory: Factory, table: str, parent_column: str, parent_ids: Optional[List[int]]
+) -> list:
+    # with parent_ids the parent filter goes into the select, so a shard reads
+    # only its databases' rows; the IN list of each select stays within
+    # Snowflake's bind limit
+    if parent_ids is None:
+        return factory.backend_connection.execute(
+            factory.select(table=table).generate_statement()
+        )
+    rows = []
+    for i in range(0, len(parent_ids), MAX_BIND_PARAMS):
+        i_select = factory.select(
+            table=table, filters={parent_column: parent_ids[i : i + MAX_BIND_PARAMS]}
+        )
+        rows.extend(
+            factory.backend_connection.execute(
+                i_select.generate_statement(), i_select.generate_params()
+            )
+        )
+    return rows
+
+
 def _get_schema_objs_in_kendo_with_id_key_map(
-    factory: Factory, kendo_db_id_key_map=None
+    factory: Factory, kendo_db_id_key_map=None, scoped: bool = False
 ) -> Tuple[List[SchemaObj], Dict[int, SchemaObj]]:
-    if not kendo_db_id_key_map:
+    # scoped reads only the schemas of the databases in kendo_db_id_key_map
+    if kendo_db_id_key_map is None:
         _, kendo_db_id_key_map = _get_db_objs_in_kendo_with_id_key_map(factory)
     schemas_in_kendo = cast(
         List[SchemaObj],
-        factory.backend_connection.execute(
-            factory.select(
-                table="kendo_db.infrastructure.schema_objs"
-            ).generate_statement(),
+        _select_children(
+            factory,
+            "kendo_db.infrastructure.schema_objs",
+            "database_id",
+            list(kendo_db_id_key_map) if scoped else None,
         ),
     )
     for schema in schemas_in_kendo:
@@ -147,16 +227,17 @@ def _get_schema_objs_in_kendo_with_id_key_map(
 
 
 def _get_table_objs_in_kendo_with_id_key_map(
-    factory: Factory, kendo_schema_id_key_map=None
+    factory: Factory, kendo_schema_id_key_map=None, scoped: bool = False
 ) -> Tuple[List[TableObj], Dict[int, TableObj]]:
-    if not kendo_schema_id_key_map:
+    if kendo_schema_id_key_map is None:
         _, kendo_schema_id_key_map = _get_schema_objs_in_kendo_with_id_key_map(factory)
     tables_in_kendo = cast(
         List[TableObj],
-        factory.backend_connection.execute(
-            factory.select(
-                table="kendo_db.infrastructure.table_objs"
-            ).generate_statement()
+        _select_children(
+            factory,
+            "kendo_db.infrastructure.table_objs",
+            "schema_id",
+            list(kendo_schema_id_key_map) if scoped else None,
         ),
     )
     for table in tables_in_kendo:
@@ -175,16 +256,17 @@ def _get_table_objs_in_kendo_with_id_key_map(
 
 
 def _get_view_objs_in_kendo_with_id_key_map(
-    factory: Factory, kendo_schema_id_key_map=None
+    factory: Factory, kendo_schema_id_key_map=None, scoped: bool = False
 ) -> Tuple[List[ViewObj], Dict[int, ViewObj]]:
-    if not kendo_schema_id_key_map:
+    if kendo_schema_id_key_map is None:
         _, kendo_schema_id_key_map = _get_schema_objs_in_kendo_with_id_key_map(factory)
     views_in_kendo = cast(
         List[ViewObj],
-        factory.backend_connection.execute(
-            factory.select(
-                table="kendo_db.infrastructure.view_objs"
-            ).generate_statement()
+        _select_children(
+            factory,
+            "kendo_db.infrastructure.view_objs",
+            "schema_id",
+            list(kendo_schema_id_key_map) if scoped else None,
         ),
     )
     for view in views_in_kendo:
@@ -201,16 +283,17 @@ def _get_view_objs_in_kendo_with_id_key_map(
 
 
 def _get_stage_objs_in_kendo_with_id_key_map(
-    factory: Factory, kendo_schema_id_key_map=None
+    factory: Factory, kendo_schema_id_key_map=None, scoped: bool = False
 ) -> Tuple[List[StageObj], Dict[int, StageObj]]:
-    if not kendo_schema_id_key_map:
+    if kendo_schema_id_key_map is None:
         _, kendo_schema_id_key_map = _get_schema_objs_in_kendo_with_id_key_map(factory)
     stages_in_kendo = cast(
         List[StageObj],
-        factory.backend_connection.execute(
-            factory.select(
-                table="kendo_db.infrastructure.stage_objs"
-            ).generate_statement()
+        _select_children(
+            factory,
+            "kendo_db.infrastructure.stage_objs",
+            "schema_id",
+            list(kendo_schema_id_key_map) if scoped else None,
         ),
     )
     for stage in stages_in_kendo:
@@ -229,16 +312,17 @@ def _get_stage_objs_in_kendo_with_id_key_map(
 
 
 def _get_stream_objs_in_kendo_with_id_key_map(
-    factory: Factory, kendo_schema_id_key_map=None
+    factory: Factory, kendo_schema_id_key_map=None, scoped: bool = False
 ) -> Tuple[List[StreamObj], Dict[int, StreamObj]]:
-    if not kendo_schema_id_key_map:
+    if kendo_schema_id_key_map is None:
         _, kendo_schema_id_key_map = _get_schema_objs_in_kendo_with_id_key_map(factory)
     streams_in_kendo = cast(
         List[StreamObj],
-        factory.backend_connection.execute(
-            factory.select(
-                table="kendo_db.infrastructure.stream_objs"
-            ).generate_statement()
+        _select_children(
+            factory,
+            "kendo_db.infrastructure.stream_objs",
+            "schema_id",
+            list(kendo_schema_id_key_map) if scoped else None,
         ),
     )
     for stream in streams_in_kendo:
@@ -257,16 +341,17 @@ def _get_stream_objs_in_kendo_with_id_key_map(
 
 
 def _get_pipe_objs_in_kendo_with_id_key_map(
-    factory: Factory, kendo_schema_id_key_map=None
+    factory: Factory, kendo_schema_id_key_map=None, scoped: bool = False
 ) -> Tuple[List[PipeObj], Dict[int, PipeObj]]:
-    if not kendo_schema_id_key_map:
+    if kendo_schema_id_key_map is None:
         _, kendo_schema_id_key_map = _get_schema_objs_in_kendo_with_id_key_map(factory)
     pipes_in_kendo = cast(
         List[PipeObj],
-        factory.backend_connection.execute(
-            factory.select(
-                table="kendo_db.infrastructure.pipe_objs"
-            ).generate_statement()
+        _select_children(
+            factory,
+            "kendo_db.infrastructure.pipe_objs",
+            "schema_id",
+            list(kendo_schema_id_key_map) if scoped else None,
         ),
     )
     for pipe in pipes_in_kendo:
@@ -282,17 +367,13 @@ def _get_pipe_objs_in_kendo_with_id_key_map(
     return pipes_in_kendo, kendo_pipes_id_key_map
 
 
-def _get_column_objs_in_kendo_with_id_key_map(
-    factory: Factory, kendo_table_id_key_map=None
-) -> Tuple[List[ColumnObj], Dict[int, ColumnObj]]:
-    if not kendo_table_id_key_map:
-        _, kendo_table_id_key_map = _get_table_objs_in_kendo_with_id_key_map(factory)
+def _get_column_objs_in_kendo_for_tables(
+    factory: Factory, table_ids: List[int], kendo_table_id_key_map: Dict[int, TableObj]
+) -> List[ColumnObj]:
     columns_in_kendo = cast(
         List[ColumnObj],
-        factory.backend_connection.execute(
-            factory.select(
-                table="kendo_db.infrastructure.column_objs"
-            ).generate_statement()
+        _select_children(
+            factory, "kendo_db.infrastructure.column_objs", "table_id", table_ids
         ),
     )
     for column in columns_in_kendo:
@@ -301,11 +382,7 @@ def _get_column_objs_in_kendo_with_id_key_map(
         column["SCHEMA_NAME"] = kendo_table_id_key_map[column["TABLE_ID"]]["SCHEMA_NAME"]  # type: ignore
         column["DATABASE_ID"] = kendo_table_id_key_map[column["TABLE_ID"]]["DATABASE_ID"]  # type: ignore
         column["DATABASE_NAME"] = kendo_table_id_key_map[column["TABLE_ID"]]["DATABASE_NAME"]  # type: ignore
-
-    kendo_column_id_key_map: Dict[int, ColumnObj] = {
-        column["ID"]: column for column in columns_in_kendo
-    }
-    return columns_in_kendo, kendo_column_id_key_map
+    return columns_in_kendo
 
 
 def _get_role_objs_in_kendo_with_key_maps(
@@ -386,6 +463,34 @@ def _get_warehouse_objs_in_kendo_with_key_maps(
     return warehouses_in_kendo, kendo_warehouse_id_key_map, kendo_warehouse_name_key_map
 
 
+def _update_changed_objs(
+    factory: Factory, table: str, key: str, changed: List[dict], timestamps=()
+):
+    # matched objects keep their id, so history sees the new attributes as a
+    # new version of the same object
+    if not changed:
+        return
+    columns = [key, *MUTABLE_ATTRIBUTES[table]]
+    factory.backend_connection.execute(
+        f"CREATE OR REPLACE TEMPORARY TABLE {CHANGED_OBJS_LOAD_TABLE} \
+        LIKE kendo_db.infrastructure.{table};"
+    )
+    factory.backend_connection.execute_insert(
+        factory.multi_row_insert(table=CHANGED_OBJS_LOAD_TABLE, columns=columns),
+        [
+            tuple(
+                ("TIMESTAMP_LTZ", obj[column]) if column in timestamps else obj[column]
+                for column in columns
+            )
+            for obj in changed
+        ],
+    )
+    factory.backend_connection.execute(
+        merge_changed_objs_sql(table, CHANGED_OBJS_LOAD_TABLE, key)
+    )
+
+
+@_scan_phase(Resources.databases)
 def scan_databases(snowflake_ds: SnowflakeDatasourceConnection, factory: Factory):
     colored_print("Scanning databases...", level="info")
     # fetch Databases from SF
@@ -395,7 +500,7 @@ def scan_databases(snowflake_ds: SnowflakeDatasourceConnection, factory: Factory
     # insert the new records
     # select all records and store in memory, id will be needed
     dbs_in_sf = snowflake_ds.execute("show databases")
-    print(dbs_in_sf)
+    print_objs("Databases in Snowflake: ", dbs_in_sf)
     assert isinstance(dbs_in_sf, list)
     dbs_in_sf = [
         {"name": db["name"], "created_on": db["created_on"]}
@@ -409,16 +514,17 @@ def scan_databases(snowflake_ds: SnowflakeDatasourceConnection, factory: Factory
     for db in dbs_in_kendo:
         if db["NAME"] not in temp_list:
             missing_dbs.append(db)
+    record_missing_objs(Resources.databases, missing_dbs)
+    record_changed_objs(missing_dbs, "ID")
     if missing_dbs:
         colored_print(
             f"{len(missing_dbs)} database(s) that were mapped earlier could not be found.",
             level="warning",
         )
-        confirm = typer.confirm("View?")
+        confirm = prompt_confirm("View?")
         if confirm:
-            colored_print("Missing Database mappings: ", level="info")
-            print(missing_dbs)
-        typer.confirm(
+            print_objs("Missing Database mappings: ", missing_dbs)
+        prompt_confirm(
             "Do you want to proceed without fixing these mappings yourself?",
             abort=True,
         )
@@ -428,16 +534,21 @@ def scan_databases(snowflake_ds: SnowflakeDatasourceConnection, factory: Factory
     for db in dbs_in_sf:
         if db["name"] not in temp_list:
             new_dbs.append(db)
+    emit_event(
+        "diff",
+        resource=Resources.databases.value,
+        missing=len(missing_dbs),
+        new=len(new_dbs),
+    )
     if new_dbs:
         colored_print(
             f"{len(new_dbs)} new database(s) detected since last scan.",
             level="info",
         )
-        confirm = typer.confirm("View?")
+        confirm = prompt_confirm("View?")
         if confirm:
-            colored_print("New Databases: ", level="info")
-            print(new_dbs)
-        typer.confirm(
+            print_objs("New Databases: ", new_dbs)
+        prompt_confirm(
             "Are you sure you want these new databases names to be mapped?",
             abort=True,
         )
@@ -445,17 +556,16 @@ def scan_databases(snowflake_ds: SnowflakeDatasourceConnection, factory: Factory
             SpinnerColumn(),
             TextColumn("[progress.description]{task.description}"),
             # transient=True,
+            disable=is_ndjson(),
         ) as progress:
             progress.add_task(description="Mapping new databases...", total=None)
-            i_insert = factory.paramized_insert(
+            i_insert = factory.multi_row_insert(
                 table="kendo_db.infrastructure.database_objs",
                 columns=["obj_created_on", "name"],
             )
             # db["created_on"].strftime("%Y-%m-%d %H:%M:%S.%f")
             data = [(("TIMESTAMP_LTZ", db["created_on"]), db["name"]) for db in new_dbs]
-            factory.backend_connection.execute_many_times(
-                i_insert.generate_statement(), data
-            )
+            factory.backend_connection.execute_insert(i_insert, data)
         colored_print(
             f"{len(new_dbs)} new database(s) mapped successfully.", level="success"
         )
@@ -466,6 +576,7 @@ def scan_databases(snowflake_ds: SnowflakeDatasourceConnection, factory: Factory
     return dbs_in_kendo, kendo_db_id_key_map
 
 
+@_scan_phase(Resources.schemas)
 def scan_schemas(
     snowflake_ds: SnowflakeDatasourceConnection,
     factory: Factory,
@@ -475,7 +586,9 @@ def scan_schemas(
     colored_print("Scanning schemas...", level="info")
     schemas_in_sf = []
     skipped_dbs = []
-    if not dbs_in_kendo or not kendo_db_id_key_map:
+    # parents handed in by a shard scope the kendo reads to them
+    scoped = dbs_in_kendo is not None and kendo_db_id_key_map is not None
+    if dbs_in_kendo is None or kendo_db_id_key_map is None:
         dbs_in_kendo, kendo_db_id_key_map = _get_db_objs_in_kendo_with_id_key_map(
             factory
         )
@@ -508,16 +621,17 @@ def scan_schemas(
             "Schemas could not be scanned from some databases.",
             level="warning",
         )
-        confirm = typer.confirm("View?")
+        confirm = prompt_confirm("View?")
         if confirm:
-            colored_print("Skipped: ", level="info")
-            print(skipped_dbs)
-        typer.confirm(
+            print_objs("Skipped: ", skipped_dbs)
+        prompt_confirm(
             "Do you want to proceed with mapping excluding schemas from these databases?",
             abort=True,
         )
     schemas_in_kendo, kendo_schema_id_key_map = (
-        _get_schema_objs_in_kendo_with_id_key_map(factory, kendo_db_id_key_map)
+        _get_schema_objs_in_kendo_with_id_key_map(
+            factory, kendo_db_id_key_map, scoped=scoped
+        )
     )
 
     missing_schemas = []
@@ -525,16 +639,17 @@ def scan_schemas(
     for schema in schemas_in_kendo:
         if (schema["NAME"], schema["DATABASE_ID"]) not in temp_list:
             missing_schemas.append(schema)
+    record_missing_objs(Resources.schemas, missing_schemas)
+    record_changed_objs(missing_schemas, "DATABASE_ID")
     if missing_schemas:
         colored_print(
             f"{len(missing_schemas)} schema(s) that were mapped earlier could not be found.",
             level="warning",
         )
-        confirm = typer.confirm("View?")
+        confirm = prompt_confirm("View?")
         if confirm:
-            colored_print("Missing Schema mappings: ", level="info")
-            print(missing_schemas)
-        typer.confirm(
+            print_objs("Missing Schema mappings: ", missing_schemas)
+        prompt_confirm(
             "Do you want to proceed without fixing these mappings yourself?",
             abort=True,
         )
@@ -544,15 +659,21 @@ def scan_schemas(
     for schema in schemas_in_sf:
         if (schema["name"], schema["database_id"]) not in temp_list:
             new_schemas.append(schema)
+    emit_event(
+        "diff",
+        resource=Resources.schemas.value,
+        missing=len(missing_schemas),
+        new=len(new_schemas),
+    )
+    record_changed_objs(new_schemas, "database_id")
     if new_schemas:
         colored_print(
             f"{len(new_schemas)} new schema(s) detected since last scan.", level="info"
         )
-        confirm = typer.confirm("View?")
+        confirm = prompt_confirm("View?")
         if confirm:
-            colored_print("New Schemas: ", level="info")
-            print(new_schemas)
-        typer.confirm(
+            print_objs("New Schemas: ", new_schemas)
+        prompt_confirm(
             "Are you sure you want these new schemas names to be mapped?",
             abort=True,
         )
@@ -560,9 +681,10 @@ def scan_schemas(
             SpinnerColumn(),
             TextColumn("[progress.description]{task.description}"),
             # transient=True,
+            disable=is_ndjson(),
         ) as progress:
             progress.add_task(description="Mapping new schemas...", total=None)
-            i_insert = factory.paramized_insert(
+            i_insert = factory.multi_row_insert(
                 table="kendo_db.infrastructure.schema_objs",
                 columns=["obj_created_on", "name", "database_id"],
             )
@@ -574,19 +696,20 @@ def scan_schemas(
                 )
                 for schema in new_schemas
             ]
-            factory.backend_connection.execute_many_times(
-                i_insert.generate_statement(), data
-            )
+            factory.backend_connection.execute_insert(i_insert, data)
         colored_print(
             f"{len(new_schemas)} new schema(s) mapped successfully.", level="success"
         )
         schemas_in_kendo, kendo_schema_id_key_map = (
-            _get_schema_objs_in_kendo_with_id_key_map(factory, kendo_db_id_key_map)
+            _get_schema_objs_in_kendo_with_id_key_map(
+                factory, kendo_db_id_key_map, scoped=scoped
+            )
         )
 
     return schemas_in_kendo, kendo_schema_id_key_map
 
 
+@_scan_phase(Resources.tables)
 def scan_tables(
     snowflake_ds: SnowflakeDatasourceConnection,
     factory: Factory,
@@ -603,7 +726,9 @@ def scan_tables(
     # select all records and store in memory, id will be needed
     tables_in_sf = []
     skipped_schemas = []
-    if not schemas_in_kendo or not kendo_schema_id_key_map:
+    # parents handed in by a shard scope the kendo reads to them
+    scoped = schemas_in_kendo is not None and kendo_schema_id_key_map is not None
+    if schemas_in_kendo is None or kendo_schema_id_key_map is None:
         schemas_in_kendo, kendo_schema_id_key_map = (
             _get_schema_objs_in_kendo_with_id_key_map(factory)
         )
@@ -638,16 +763,15 @@ def scan_tables(
             "Tables could not be scanned from some schemas.",
             level="warning",
         )
-        confirm = typer.confirm("View?")
+        confirm = prompt_confirm("View?")
         if confirm:
-            colored_print("Skipped: ", level="info")
-            print(skipped_schemas)
-        typer.confirm(
+            print_objs("Skipped: ", skipped_schemas)
+        prompt_confirm(
             "Do you want to proceed with mapping excluding tables from these schemas?",
             abort=True,
         )
     tables_in_kendo, kendo_table_id_key_map = _get_table_objs_in_kendo_with_id_key_map(
-        factory, kendo_schema_id_key_map
+        factory, kendo_schema_id_key_map, scoped=scoped
     )
 
     missing_tables = []
@@ -655,16 +779,17 @@ def scan_tables(
     for table in tables_in_kendo:
         if (table["NAME"], table["SCHEMA_ID"]) not in temp_list:
             missing_tables.append(table)
+    record_missing_objs(Resources.tables, missing_tables)
+    record_changed_objs(missing_tables, "DATABASE_ID")
     if missing_tables:
         colored_print(
             f"{len(missing_tables)} table(s) that were mapped earlier could not be found.",
             level="warning",
         )
-        confirm = typer.confirm("View?")
+        confirm = prompt_confirm("View?")
         if confirm:
-            colored_print("Missing Table mappings: ", level="info")
-            print(missing_tables)
-        typer.confirm(
+            print_objs("Missing Table mappings: ", missing_tables)
+        prompt_confirm(
             "Do you want to proceed without fixing these mappings yourself?",
             abort=True,
         )
@@ -674,15 +799,21 @@ def scan_tables(
     for table in tables_in_sf:
         if (table["name"], table["schema_id"]) not in temp_list:
             new_tables.append(table)
+    emit_event(
+        "diff",
+        resource=Resources.tables.value,
+        missing=len(missing_tables),
+        new=len(new_tables),
+    )
+    record_changed_objs(new_tables, "database_id")
     if new_tables:
         colored_print(
             f"{len(new_tables)} new table(s) detected since last scan.", level="info"
         )
-        confirm = typer.confirm("View?")
+        confirm = prompt_confirm("View?")
         if confirm:
-            colored_print("New Tables: ", level="info")
-            print(new_tables)
-        typer.confirm(
+            print_objs("New Tables: ", new_tables)
+        prompt_confirm(
             "Are you sure you want these new tables names to be mapped?",
             abort=True,
         )
@@ -690,9 +821,10 @@ def scan_tables(
             SpinnerColumn(),
             TextColumn("[progress.description]{task.description}"),
             # transient=True,
+            disable=is_ndjson(),
         ) as progress:
             progress.add_task(description="Mapping new tables...", total=None)
-            i_insert = factory.paramized_insert(
+            i_insert = factory.multi_row_insert(
                 table="kendo_db.infrastructure.table_objs",
                 columns=["obj_created_on", "name", "schema_id"],
             )
@@ -704,19 +836,20 @@ def scan_tables(
                 )
                 for table in new_tables
             ]
-            factory.backend_connection.execute_many_times(
-                i_insert.generate_statement(), data
-            )
+            factory.backend_connection.execute_insert(i_insert, data)
         colored_print(
             f"{len(new_tables)} new table(s) mapped successfully.", level="success"
         )
         tables_in_kendo, kendo_table_id_key_map = (
-            _get_table_objs_in_kendo_with_id_key_map(factory, kendo_schema_id_key_map)
+            _get_table_objs_in_kendo_with_id_key_map(
+                factory, kendo_schema_id_key_map, scoped=scoped
+            )
         )
 
     return tables_in_kendo, kendo_table_id_key_map
 
 
+@_scan_phase(Resources.views)
 def scan_views(
     snowflake_ds: SnowflakeDatasourceConnection,
     factory: Factory,
@@ -726,7 +859,9 @@ def scan_views(
     colored_print("Scanning views...", level="info")
     views_in_sf = []
     skipped_schemas = []
-    if not schemas_in_kendo or not kendo_schema_id_key_map:
+    # parents handed in by a shard scope the kendo reads to them
+    scoped = schemas_in_kendo is not None and kendo_schema_id_key_map is not None
+    if schemas_in_kendo is None or kendo_schema_id_key_map is None:
         schemas_in_kendo, kendo_schema_id_key_map = (
             _get_schema_objs_in_kendo_with_id_key_map(factory)
         )
@@ -761,16 +896,15 @@ def scan_views(
             "Views could not be scanned from some schemas.",
             level="warning",
         )
-        confirm = typer.confirm("View?")
+        confirm = prompt_confirm("View?")
         if confirm:
-            colored_print("Skipped: ", level="info")
-            print(skipped_schemas)
-        typer.confirm(
+            print_objs("Skipped: ", skipped_schemas)
+        prompt_confirm(
             "Do you want to proceed with mapping excluding views from these schemas?",
             abort=True,
         )
     views_in_kendo, kendo_view_id_key_map = _get_view_objs_in_kendo_with_id_key_map(
-        factory, kendo_schema_id_key_map
+        factory, kendo_schema_id_key_map, scoped=scoped
     )
 
     missing_views = []
@@ -778,16 +912,17 @@ def scan_views(
     for view in views_in_kendo:
         if (view["NAME"], view["SCHEMA_ID"]) not in temp_list:
             missing_views.append(view)
+    record_missing_objs(Resources.views, missing_views)
+    record_changed_objs(missing_views, "DATABASE_ID")
     if missing_views:
         colored_print(
             f"{len(missing_views)} view(s) that were mapped earlier could not be found.",
             level="warning",
         )
-        confirm = typer.confirm("View?")
+        confirm = prompt_confirm("View?")
         if confirm:
-            colored_print("Missing View mappings: ", level="info")
-            print(missing_views)
-        typer.confirm(
+            print_objs("Missing View mappings: ", missing_views)
+        prompt_confirm(
             "Do you want to proceed without fixing these mappings yourself?",
             abort=True,
         )
@@ -797,15 +932,21 @@ def scan_views(
     for view in views_in_sf:
         if (view["name"], view["schema_id"]) not in temp_list:
             new_views.append(view)
+    emit_event(
+        "diff",
+        resource=Resources.views.value,
+        missing=len(missing_views),
+        new=len(new_views),
+    )
+    record_changed_objs(new_views, "database_id")
     if new_views:
         colored_print(
             f"{len(new_views)} new view(s) detected since last scan.", level="info"
         )
-        confirm = typer.confirm("View?")
+        confirm = prompt_confirm("View?")
         if confirm:
-            colored_print("New Views: ", level="info")
-            print(new_views)
-        typer.confirm(
+            print_objs("New Views: ", new_views)
+        prompt_confirm(
             "Are you sure you want these new views to be mapped?",
             abort=True,
         )
@@ -813,9 +954,10 @@ def scan_views(
             SpinnerColumn(),
             TextColumn("[progress.description]{task.description}"),
             # transient=True,
+            disable=is_ndjson(),
         ) as progress:
             progress.add_task(description="Mapping new views...", total=None)
-            i_insert = factory.paramized_insert(
+            i_insert = factory.multi_row_insert(
                 table="kendo_db.infrastructure.view_objs",
                 columns=["obj_created_on", "name", "schema_id"],
             )
@@ -827,40 +969,32 @@ def scan_views(
                 )
                 for view in new_views
             ]
-            factory.backend_connection.execute_many_times(
-                i_insert.generate_statement(), data
-            )
+            factory.backend_connection.execute_insert(i_insert, data)
         colored_print(
             f"{len(new_views)} new view(s) mapped successfully.", level="success"
         )
         views_in_kendo, kendo_view_id_key_map = _get_view_objs_in_kendo_with_id_key_map(
-            factory, kendo_schema_id_key_map
+            factory, kendo_schema_id_key_map, scoped=scoped
         )
 
     return views_in_kendo, kendo_view_id_key_map
 
 
-def scan_columns(
+def _scan_columns_in_database(
     snowflake_ds: SnowflakeDatasourceConnection,
     factory: Factory,
-    tables_in_kendo: List[TableObj] | None = None,
-    kendo_table_id_key_map: Dict[int, TableObj] | None = None,
+    database_name: str,
+    tables: List[TableObj],
+    kendo_table_id_key_map: Dict[int, TableObj],
+    confirmed: Set[str],
+    totals: Dict[str, int],
 ):
-    colored_print("Scanning columns...", level="info")
-    # fetch Columns from SF
-    # attach kendo's table_id to each Column (match by table_name, table_schema, table_catalog)
-    # fetch Columns from Kendo
-    # show missing and new (match by name and table_id)
-    # prompt to record the new ones
-    # insert the new records
-    # select all records and store in memory, id will be needed
+    # reconciles and persists the columns of one database, so nothing outlives it;
+    # each kind of change is confirmed once, at the first database that has it,
+    # and applies to the remaining databases
     columns_in_sf = []
     skipped_tables = []
-    if not tables_in_kendo or not kendo_table_id_key_map:
-        tables_in_kendo, kendo_table_id_key_map = (
-            _get_table_objs_in_kendo_with_id_key_map(factory)
-        )
-    for table in tables_in_kendo:
+    for table in tables:
         columns_in_this_table = snowflake_ds.execute(
             f"show columns in {table['DATABASE_NAME']}.{table['SCHEMA_NAME']}.{table['NAME']}",  # type: ignore
             abort_on_exception=False,
@@ -888,66 +1022,84 @@ def scan_columns(
             for column in columns_in_this_table
         ]
         columns_in_sf.extend(columns_in_this_table)
-    if skipped_tables:
+    totals["skipped"] += len(skipped_tables)
+    if skipped_tables and "skipped" not in confirmed:
         colored_print(
-            "Columns could not be scanned from some tables.",
+            f"Columns could not be scanned from some tables in {database_name}.",
             level="warning",
         )
-        confirm = typer.confirm("View?")
+        confirm = prompt_confirm("View?")
         if confirm:
-            colored_print("Skipped: ", level="info")
-            print(skipped_tables)
-        typer.confirm(
-            "Do you want to proceed with mapping excluding columns from these tables?",
+            print_objs("Skipped: ", skipped_tables)
+        prompt_confirm(
+            "Do you want to proceed with mapping excluding columns from these tables, here and in the remaining databases?",
             abort=True,
         )
-    columns_in_kendo, kendo_column_id_key_map = (
-        _get_column_objs_in_kendo_with_id_key_map(factory, kendo_table_id_key_map)
+        confirmed.add("skipped")
+    columns_in_kendo = _get_column_objs_in_kendo_for_tables(
+        factory, [table["ID"] for table in tables], kendo_table_id_key_map
     )
 
     missing_columns = []
-    temp_list = [(column["name"], column["table_id"]) for column in columns_in_sf]
+    temp_set = {(column["name"], column["table_id"]) for column in columns_in_sf}
     for column in columns_in_kendo:
-        if (column["NAME"], column["TABLE_ID"]) not in temp_list:
+        if (column["NAME"], column["TABLE_ID"]) not in temp_set:
             missing_columns.append(column)
-    if missing_columns:
+    record_missing_objs(Resources.columns, missing_columns)
+    record_changed_objs(missing_columns, "DATABASE_ID")
+    totals["missing"] += len(missing_columns)
+    if missing_columns and "missing" not in confirmed:
         colored_print(
-            f"{len(missing_columns)} column(s) that were mapped earlier could not be found.",
+            f"{len(missing_columns)} column(s) in {database_name} that were mapped earlier could not be found.",
             level="warning",
         )
-        confirm = typer.confirm("View?")
+        confirm = prompt_confirm("View?")
         if confirm:
-            colored_print("Missing Column mappings: ", level="info")
-            print(missing_columns)
-        typer.confirm(
-            "Do you want to proceed without fixing these mappings yourself?",
+            print_objs("Missing Column mappings: ", missing_columns)
+        prompt_confirm(
+            "Do you want to proceed without fixing these mappings yourself, here and in the remaining databases?",
             abort=True,
         )
+        confirmed.add("missing")
 
     new_columns = []
-    temp_list = [(column["NAME"], column["TABLE_ID"]) for column in columns_in_kendo]
+    temp_set = {(column["NAME"], column["TABLE_ID"]) for column in columns_in_kendo}
     for column in columns_in_sf:
-        if (column["name"], column["table_id"]) not in temp_list:
+        if (column["name"], column["table_id"]) not in temp_set:
             new_columns.append(column)
+    emit_event(
+        "diff",
+        resource=Resources.columns.value,
+        missing=len(missing_columns),
+        new=len(new_columns),
+        database=database_name,
+    )
+    record_changed_objs(new_columns, "database_id")
+    totals["new"] += len(new_columns)
     if new_columns:
-        colored_print(
-            f"{len(new_columns)} new column(s) detected since last scan.", level="info"
-        )
-        confirm = typer.confirm("View?")
-        if confirm:
-            colored_print("New Columns: ", level="info")
-            print(new_columns)
-        typer.confirm(
-            "Are you sure you want these new columns names to be mapped?",
-            abort=True,
-        )
+        if "new" not in confirmed:
+            colored_print(
+                f"{len(new_columns)} new column(s) detected in {database_name} since last scan.",
+                level="info",
+            )
+            confirm = prompt_confirm("View?")
+            if confirm:
+                print_objs("New Columns: ", new_columns)
+            prompt_confirm(
+                "Are you sure you want these new columns names, and those of the remaining databases, to be mapped?",
+                abort=True,
+            )
+            confirmed.add("new")
         with Progress(
             SpinnerColumn(),
             TextColumn("[progress.description]{task.description}"),
             # transient=True,
+            disable=is_ndjson(),
         ) as progress:
-            progress.add_task(description="Mapping new columns...", total=None)
-            i_insert = factory.paramized_insert(
+            progress.add_task(
+                description=f"Mapping new columns in {database_name}...", total=None
+            )
+            i_insert = factory.multi_row_insert(
                 table="kendo_db.infrastructure.column_objs",
                 columns=["name", "table_id"],
             )
@@ -958,19 +1110,57 @@ def scan_columns(
                 )
                 for column in new_columns
             ]
-            factory.backend_connection.execute_many_times(
-                i_insert.generate_statement(), data
-            )
+            factory.backend_connection.execute_insert(i_insert, data)
         colored_print(
-            f"{len(new_columns)} new column(s) mapped successfully.", level="success"
-        )
-        columns_in_kendo, kendo_column_id_key_map = (
-            _get_column_objs_in_kendo_with_id_key_map(factory, kendo_table_id_key_map)
+            f"{len(new_columns)} new column(s) in {database_name} mapped successfully.",
+            level="success",
         )
 
-    return columns_in_kendo, kendo_column_id_key_map
 
+@_scan_phase(Resources.columns)
+def scan_columns(
+    snowflake_ds: SnowflakeDatasourceConnection,
+    factory: Factory,
+    tables_in_kendo: List[TableObj] | None = None,
+    kendo_table_id_key_map: Dict[int, TableObj] | None = None,
+):
+    colored_print("Scanning columns...", level="info")
+    # for one database at a time:
+    # fetch Columns from SF
+    # attach kendo's table_id to each Column (match by table_name, table_schema, table_catalog)
+    # fetch that database's Columns from Kendo
+    # show missing and new (match by name and table_id)
+    # prompt to record the new ones
+    # insert the new records
+    # only one database's columns are ever held, so memory follows the largest
+    # database rather than the account
+    if tables_in_kendo is None or kendo_table_id_key_map is None:
+        tables_in_kendo, kendo_table_id_key_map = (
+            _get_table_objs_in_kendo_with_id_key_map(factory)
+        )
+    tables_by_database: Dict[str, List[TableObj]] = {}
+    for table in tables_in_kendo:
+        tables_by_database.setdefault(table["DATABASE_NAME"], []).append(table)  # type: ignore
+    confirmed: Set[str] = set()
+    totals = {"skipped": 0, "missing": 0, "new": 0}
+    for database_name, tables in tables_by_database.items():
+        _scan_columns_in_database(
+            snowflake_ds,
+            factory,
+            database_name,
+            tables,
+            kendo_table_id_key_map,
+            confirmed,
+            totals,
+        )
+    if any(totals.values()):
+        colored_print(
+            f"Columns in {len(tables_by_database)} database(s): {totals['new']} new mapped, {totals['missing']} missing, {totals['skipped']} table(s) skipped.",
+            level="info",
+        )
 
+
+@_scan_phase(Resources.roles)
 def scan_roles(snowflake_ds: SnowflakeDatasourceConnection, factory: Factory):
     colored_print("Scanning roles...", level="info")
     # fetch Roles from SF
@@ -992,16 +1182,17 @@ def scan_roles(snowflake_ds: SnowflakeDatasourceConnection, factory: Factory):
     for role in roles_in_kendo:
         if role["NAME"] not in temp_list:
             missing_roles.append(role)
+    record_missing_objs(Resources.roles, missing_roles)
+    record_changed_objs(missing_roles, None)
     if missing_roles:
         colored_print(
             f"{len(missing_roles)} roles names that were mapped earlier could not be found.",
             level="warning",
         )
-        confirm = typer.confirm("View?")
+        confirm = prompt_confirm("View?")
         if confirm:
-            colored_print("Missing Role mappings: ", level="info")
-            print(missing_roles)
-        typer.confirm(
+            print_objs("Missing Role mappings: ", missing_roles)
+        prompt_confirm(
             "Do you want to proceed without fixing these mappings yourself?",
             abort=True,
         )
@@ -1011,15 +1202,21 @@ def scan_roles(snowflake_ds: SnowflakeDatasourceConnection, factory: Factory):
     for role in roles_in_sf:
         if role["name"] not in temp_list:
             new_roles.append(role)
+    emit_event(
+        "diff",
+        resource=Resources.roles.value,
+        missing=len(missing_roles),
+        new=len(new_roles),
+    )
+    record_changed_objs(new_roles, None)
     if new_roles:
         colored_print(
             f"{len(new_roles)} new roles detected since last scan.", level="info"
         )
-        confirm = typer.confirm("View?")
+        confirm = prompt_confirm("View?")
         if confirm:
-            colored_print("New Roles: ", level="info")
-            print(new_roles)
-        typer.confirm(
+            print_objs("New Roles: ", new_roles)
+        prompt_confirm(
             "Are you sure you want these new roles names to be mapped?",
             abort=True,
         )
@@ -1027,9 +1224,10 @@ def scan_roles(snowflake_ds: SnowflakeDatasourceConnection, factory: Factory):
             SpinnerColumn(),
             TextColumn("[progress.description]{task.description}"),
             # transient=True,
+            disable=is_ndjson(),
         ) as progress:
             progress.add_task(description="Mapping new roles...", total=None)
-            i_insert = factory.paramized_insert(
+            i_insert = factory.multi_row_insert(
                 table="kendo_db.infrastructure.role_objs",
                 columns=["obj_created_on", "name"],
             )
@@ -1040,9 +1238,7 @@ def scan_roles(snowflake_ds: SnowflakeDatasourceConnection, factory: Factory):
                 )
                 for role in new_roles
             ]
-            factory.backend_connection.execute_many_times(
-                i_insert.generate_statement(), data
-            )
+            factory.backend_connection.execute_insert(i_insert, data)
         colored_print(
             f"{len(new_roles)} new roles mapped successfully.", level="success"
         )
@@ -1053,6 +1249,7 @@ def scan_roles(snowflake_ds: SnowflakeDatasourceConnection, factory: Factory):
     return roles_in_kendo, kendo_role_id_key_map, kendo_role_name_key_map
 
 
+@_scan_phase(Resources.users)
 def scan_users(
     snowflake_ds: SnowflakeDatasourceConnection,
     factory: Factory,
@@ -1064,10 +1261,12 @@ def scan_users(
     # fetch Users from Kendo
     # show missing and new (match by name)
     # prompt to record the new ones
-    snowflake_ds.execute("USE ROLE SECURITYADMIN;")
-    users_in_sf = snowflake_ds.execute("show users")
-    # switch back to SYSADMIN role
-    snowflake_ds.execute("USE ROLE SYSADMIN;")
+    # listing users needs SECURITYADMIN, which gets its own session
+    securityadmin_ds = SnowflakeDatasourceConnection(
+        snowflake_ds.connection_name, role="SECURITYADMIN"
+    )
+    users_in_sf = securityadmin_ds.execute("show users")
+    securityadmin_ds.close_session()
     if not kendo_role_id_key_map or not kendo_role_name_key_map:
         _, kendo_role_id_key_map, kendo_role_name_key_map = (
             _get_role_objs_in_kendo_with_key_maps(factory)
@@ -1106,16 +1305,17 @@ def scan_users(
     for user in users_in_kendo:
         if user["LOGIN_NAME"] not in temp_list:
             missing_users.append(user)
+    record_missing_objs(Resources.users, missing_users)
+    record_changed_objs(missing_users, None)
     if missing_users:
         colored_print(
             f"{len(missing_users)} users names that were mapped earlier could not be found.",
             level="warning",
         )
-        confirm = typer.confirm("View?")
+        confirm = prompt_confirm("View?")
         if confirm:
-            colored_print("Missing User mappings: ", level="info")
-            print(missing_users)
-        typer.confirm(
+            print_objs("Missing User mappings: ", missing_users)
+        prompt_confirm(
             "Do you want to proceed without fixing these mappings yourself?",
             abort=True,
         )
@@ -1125,15 +1325,40 @@ def scan_users(
     for user in users_in_sf:
         if user["login_name"] not in temp_list:
             new_users.append(user)
+    changed_users = changed_objs(
+        users_in_sf, kendo_user_login_name_key_map, "login_name", "user_objs"
+    )
+    emit_event(
+        "diff",
+        resource=Resources.users.value,
+        missing=len(missing_users),
+        new=len(new_users),
+        changed=len(changed_users),
+    )
+    if changed_users:
+        _update_changed_objs(
+            factory,
+            "user_objs",
+            "login_name",
+            changed_users,
+            timestamps=["last_success_login"],
+        )
+        colored_print(
+            f"{len(changed_users)} users changed since last scan were updated.",
+            level="info",
+        )
+        users_in_kendo, kendo_user_id_key_map, kendo_user_login_name_key_map = (
+            _get_user_objs_in_kendo_with_key_maps(factory, kendo_role_id_key_map)
+        )
+    record_changed_objs(new_users, None)
     if new_users:
         colored_print(
             f"{len(new_users)} new users detected since last scan.", level="info"
         )
-        confirm = typer.confirm("View?")
+        confirm = prompt_confirm("View?")
         if confirm:
-            colored_print("New Users: ", level="info")
-            print(new_users)
-        typer.confirm(
+            print_objs("New Users: ", new_users)
+        prompt_confirm(
             "Are you sure you want these new users names to be mapped?",
             abort=True,
         )
@@ -1141,9 +1366,10 @@ def scan_users(
             SpinnerColumn(),
             TextColumn("[progress.description]{task.description}"),
             # transient=True,
+            disable=is_ndjson(),
         ) as progress:
             progress.add_task(description="Mapping new users...", total=None)
-            i_insert = factory.paramized_insert(
+            i_insert = factory.multi_row_insert(
                 table="kendo_db.infrastructure.user_objs",
                 columns=[
                     "obj_created_on",
@@ -1169,9 +1395,7 @@ def scan_users(
                 )
                 for user in new_users
             ]
-            factory.backend_connection.execute_many_times(
-                i_insert.generate_statement(), data
-            )
+            factory.backend_connection.execute_insert(i_insert, data)
         colored_print(
             f"{len(new_users)} new users mapped successfully.", level="success"
         )
@@ -1182,6 +1406,7 @@ def scan_users(
     return users_in_kendo, kendo_user_id_key_map, kendo_user_login_name_key_map
 
 
+@_scan_phase(Resources.warehouses)
 def scan_warehouses(
     snowflake_ds: SnowflakeDatasourceConnection,
     factory: Factory,
@@ -1218,16 +1443,16 @@ def scan_warehouses(
     for warehouse in warehouses_in_kendo:
         if warehouse["NAME"] not in temp_list:
             missing_warehouses.append(warehouse)
+    record_missing_objs(Resources.warehouses, missing_warehouses)
     if missing_warehouses:
         colored_print(
             f"{len(missing_warehouses)} warehouses that were mapped earlier could not be found.",
             level="warning",
         )
-        confirm = typer.confirm("View?")
+        confirm = prompt_confirm("View?")
         if confirm:
-            colored_print("Missing Warehouse mappings: ", level="info")
-            print(missing_warehouses)
-        typer.confirm(
+            print_objs("Missing Warehouse mappings: ", missing_warehouses)
+        prompt_confirm(
             "Do you want to proceed without fixing these mappings yourself?",
             abort=True,
         )
@@ -1237,16 +1462,36 @@ def scan_warehouses(
     for warehouse in warehouses_in_sf:
         if warehouse["name"] not in temp_list:
             new_warehouses.append(warehouse)
+    changed_warehouses = changed_objs(
+        warehouses_in_sf, kendo_warehouse_name_key_map, "name", "warehouse_objs"
+    )
+    emit_event(
+        "diff",
+        resource=Resources.warehouses.value,
+        missing=len(missing_warehouses),
+        new=len(new_warehouses),
+        changed=len(changed_warehouses),
+    )
+    if changed_warehouses:
+        _update_changed_objs(factory, "warehouse_objs", "name", changed_warehouses)
+        colored_print(
+            f"{len(changed_warehouses)} warehouses changed since last scan were updated.",
+            level="info",
+        )
+        (
+            warehouses_in_kendo,
+            kendo_warehouse_id_key_map,
+            kendo_warehouse_name_key_map,
+        ) = _get_warehouse_objs_in_kendo_with_key_maps(factory, kendo_role_id_key_map)
     if new_warehouses:
         colored_print(
             f"{len(new_warehouses)} new warehouses detected since last scan.",
             level="info",
         )
-        confirm = typer.confirm("View?")
+        confirm = prompt_confirm("View?")
         if confirm:
-            colored_print("New Warehouses: ", level="info")
-            print(new_warehouses)
-        typer.confirm(
+            print_objs("New Warehouses: ", new_warehouses)
+        prompt_confirm(
             "Are you sure you want these new warehouses to be mapped?",
             abort=True,
         )
@@ -1254,9 +1499,10 @@ def scan_warehouses(
             SpinnerColumn(),
             TextColumn("[progress.description]{task.description}"),
             # transient=True,
+            disable=is_ndjson(),
         ) as progress:
             progress.add_task(description="Mapping new warehouses...", total=None)
-            i_insert = factory.paramized_insert(
+            i_insert = factory.multi_row_insert(
                 table="kendo_db.infrastructure.warehouse_objs",
                 columns=[
                     "obj_created_on",
@@ -1276,9 +1522,7 @@ def scan_warehouses(
                 )
                 for warehouse in new_warehouses
             ]
-            factory.backend_connection.execute_many_times(
-                i_insert.generate_statement(), data
-            )
+            factory.backend_connection.execute_insert(i_insert, data)
         colored_print(
             f"{len(new_warehouses)} new warehouses mapped successfully.",
             level="success",
@@ -1292,6 +1536,7 @@ def scan_warehouses(
     return warehouses_in_kendo, kendo_warehouse_id_key_map, kendo_warehouse_name_key_map
 
 
+@_scan_phase(Resources.grants_to_roles)
 def scan_grants_to_roles(
     snowflake_ds: SnowflakeDatasourceConnection,
     factory: Factory,
@@ -1402,7 +1647,7 @@ def scan_grants_to_roles(
             "Privilege grants on the following types of objects were skipped.",
             level="warning",
         )
-        print(skipped_privilege_grants_on)
+        print_objs("Skipped object types: ", sorted(skipped_privilege_grants_on))
     privilege_grants_in_kendo = cast(
         List[PrivilegeGrantObj],
         factory.backend_connection.execute(
@@ -1437,16 +1682,16 @@ def scan_grants_to_roles(
             grant["GRANTED_TO_ID"],
         ) not in temp_list:
             missing_grants.append(grant)
+    record_missing_objs(Resources.grants_to_roles, missing_grants)
     if missing_grants:
         colored_print(
             f"{len(missing_grants)} privilege grant(s) that were mapped earlier could not be found.",
             level="warning",
         )
-        confirm = typer.confirm("View?")
+        confirm = prompt_confirm("View?")
         if confirm:
-            colored_print("Missing Privilege Grant mappings: ", level="info")
-            print(missing_grants)
-        typer.confirm(
+            print_objs("Missing Privilege Grant mappings: ", missing_grants)
+        prompt_confirm(
             "Do you want to proceed without fixing these mappings yourself?",
             abort=True,
         )
@@ -1471,16 +1716,21 @@ def scan_grants_to_roles(
             grant["granted_to_id"],
         ) not in temp_list:
             new_grants.append(grant)
+    emit_event(
+        "diff",
+        resource=Resources.grants_to_roles.value,
+        missing=len(missing_grants),
+        new=len(new_grants),
+    )
     if new_grants:
         colored_print(
             f"{len(new_grants)} new privilege grant(s) detected since last scan.",
             level="info",
         )
-        confirm = typer.confirm("View?")
+        confirm = prompt_confirm("View?")
         if confirm:
-            colored_print("New Grants: ", level="info")
-            print(new_grants)
-        typer.confirm(
+            print_objs("New Grants: ", new_grants)
+        prompt_confirm(
             "Are you sure you want these new privilege grants to be mapped?",
             abort=True,
         )
@@ -1488,9 +1738,10 @@ def scan_grants_to_roles(
             SpinnerColumn(),
             TextColumn("[progress.description]{task.description}"),
             # transient=True,
+            disable=is_ndjson(),
         ) as progress:
             progress.add_task(description="Mapping new privilege grants...", total=None)
-            i_insert = factory.paramized_insert(
+            i_insert = factory.multi_row_insert(
                 table="kendo_db.infrastructure.grants_privilege_objs",
                 columns=[
                     "obj_created_on",
@@ -1514,9 +1765,7 @@ def scan_grants_to_roles(
                 )
                 for grant in new_grants
             ]
-            factory.backend_connection.execute_many_times(
-                i_insert.generate_statement(), data
-            )
+            factory.backend_connection.execute_insert(i_insert, data)
         colored_print(
             f"{len(new_grants)} new privilege grant(s) mapped successfully.",
             level="success",
@@ -1524,6 +1773,7 @@ def scan_grants_to_roles(
     return
 
 
+@_scan_phase(Resources.role_grants)
 def scan_role_grants(
     snowflake_ds: SnowflakeDatasourceConnection,
     factory: Factory,
@@ -1614,16 +1864,16 @@ def scan_role_grants(
             grant["GRANTED_TO_ID"],
         ) not in temp_list:
             missing_role_grants.append(grant)
+    record_missing_objs(Resources.role_grants, missing_role_grants)
     if missing_role_grants:
         colored_print(
             f"{len(missing_role_grants)} role grant(s) that were mapped earlier could not be found.",
             level="warning",
         )
-        confirm = typer.confirm("View?")
+        confirm = prompt_confirm("View?")
         if confirm:
-            colored_print("Missing Role Grant mappings: ", level="info")
-            print(missing_role_grants)
-        typer.confirm(
+            print_objs("Missing Role Grant mappings: ", missing_role_grants)
+        prompt_confirm(
             "Do you want to proceed without fixing these mappings yourself?",
             abort=True,
         )
@@ -1644,16 +1894,21 @@ def scan_role_grants(
             grant["granted_to_id"],
         ) not in temp_list:
             new_role_grants.append(grant)
+    emit_event(
+        "diff",
+        resource=Resources.role_grants.value,
+        missing=len(missing_role_grants),
+        new=len(new_role_grants),
+    )
     if new_role_grants:
         colored_print(
             f"{len(new_role_grants)} new role grant(s) detected since last scan.",
             level="info",
         )
-        confirm = typer.confirm("View?")
+        confirm = prompt_confirm("View?")
         if confirm:
-            colored_print("New Role Grants: ", level="info")
-            print(new_role_grants)
-        typer.confirm(
+            print_objs("New Role Grants: ", new_role_grants)
+        prompt_confirm(
             "Are you sure you want these new role grants to be mapped?",
             abort=True,
         )
@@ -1661,9 +1916,10 @@ def scan_role_grants(
             SpinnerColumn(),
             TextColumn("[progress.description]{task.description}"),
             # transient=True,
+            disable=is_ndjson(),
         ) as progress:
             progress.add_task(description="Mapping new role grants...", total=None)
-            i_insert = factory.paramized_insert(
+            i_insert = factory.multi_row_insert(
                 table="kendo_db.infrastructure.grants_role_objs",
                 columns=[
                     "obj_created_on",
@@ -1683,15 +1939,14 @@ def scan_role_grants(
                 )
                 for grant in new_role_grants
             ]
-            factory.backend_connection.execute_many_times(
-                i_insert.generate_statement(), data
-            )
+            factory.backend_connection.execute_insert(i_insert, data)
         colored_print(
             f"{len(new_role_grants)} new role grant(s) mapped successfully.",
             level="success",
         )
 
 
+@_scan_phase(Resources.stages)
 def scan_stages(
     snowflake_ds: SnowflakeDatasourceConnection,
     factory: Factory,
@@ -1701,7 +1956,9 @@ def scan_stages(
     colored_print("Scanning stages...", level="info")
     stages_in_sf = []
     skipped_schemas = []
-    if not schemas_in_kendo or not kendo_schema_id_key_map:
+    # parents handed in by a shard scope the kendo reads to them
+    scoped = schemas_in_kendo is not None and kendo_schema_id_key_map is not None
+    if schemas_in_kendo is None or kendo_schema_id_key_map is None:
         schemas_in_kendo, kendo_schema_id_key_map = (
             _get_schema_objs_in_kendo_with_id_key_map(factory)
         )
@@ -1736,17 +1993,16 @@ def scan_stages(
             "Stages could not be scanned from some schemas.",
             level="warning",
         )
-        confirm = typer.confirm("View?")
+        confirm = prompt_confirm("View?")
         if confirm:
-            colored_print("Skipped: ", level="info")
-            print(skipped_schemas)
-        typer.confirm(
+            print_objs("Skipped: ", skipped_schemas)
+        prompt_confirm(
             "Do you want to proceed with mapping excluding stages from these schemas?",
             abort=True,
         )
 
     stages_in_kendo, kendo_stage_id_key_map = _get_stage_objs_in_kendo_with_id_key_map(
-        factory, kendo_schema_id_key_map
+        factory, kendo_schema_id_key_map, scoped=scoped
     )
 
     missing_stages = []
@@ -1754,16 +2010,16 @@ def scan_stages(
     for stage in stages_in_kendo:
         if (stage["NAME"], stage["SCHEMA_ID"]) not in temp_list:
             missing_stages.append(stage)
+    record_missing_objs(Resources.stages, missing_stages)
     if missing_stages:
         colored_print(
             f"{len(missing_stages)} stage(s) that were mapped earlier could not be found.",
             level="warning",
         )
-        confirm = typer.confirm("View?")
+        confirm = prompt_confirm("View?")
         if confirm:
-            colored_print("Missing Stage mappings: ", level="info")
-            print(missing_stages)
-        typer.confirm(
+            print_objs("Missing Stage mappings: ", missing_stages)
+        prompt_confirm(
             "Do you want to proceed without fixing these mappings yourself?",
             abort=True,
         )
@@ -1773,15 +2029,20 @@ def scan_stages(
     for stage in stages_in_sf:
         if (stage["name"], stage["schema_id"]) not in temp_list:
             new_stages.append(stage)
+    emit_event(
+        "diff",
+        resource=Resources.stages.value,
+        missing=len(missing_stages),
+        new=len(new_stages),
+    )
     if new_stages:
         colored_print(
             f"{len(new_stages)} new stage(s) detected since last scan.", level="info"
         )
-        confirm = typer.confirm("View?")
+        confirm = prompt_confirm("View?")
         if confirm:
-            colored_print("New Stages: ", level="info")
-            print(new_stages)
-        typer.confirm(
+            print_objs("New Stages: ", new_stages)
+        prompt_confirm(
             "Are you sure you want these new stages to be mapped?",
             abort=True,
         )
@@ -1789,9 +2050,10 @@ def scan_stages(
             SpinnerColumn(),
             TextColumn("[progress.description]{task.description}"),
             # transient=True,
+            disable=is_ndjson(),
         ) as progress:
             progress.add_task(description="Mapping new stages...", total=None)
-            i_insert = factory.paramized_insert(
+            i_insert = factory.multi_row_insert(
                 table="kendo_db.infrastructure.stage_objs",
                 columns=["obj_created_on", "name", "schema_id"],
             )
@@ -1803,19 +2065,20 @@ def scan_stages(
                 )
                 for stage in new_stages
             ]
-            factory.backend_connection.execute_many_times(
-                i_insert.generate_statement(), data
-            )
+            factory.backend_connection.execute_insert(i_insert, data)
         colored_print(
             f"{len(new_stages)} new stage(s) mapped successfully.", level="success"
         )
         stages_in_kendo, kendo_stage_id_key_map = (
-            _get_stage_objs_in_kendo_with_id_key_map(factory, kendo_schema_id_key_map)
+            _get_stage_objs_in_kendo_with_id_key_map(
+                factory, kendo_schema_id_key_map, scoped=scoped
+            )
         )
 
     return stages_in_kendo, kendo_stage_id_key_map
 
 
+@_scan_phase(Resources.streams)
 def scan_streams(
     snowflake_ds: SnowflakeDatasourceConnection,
     factory: Factory,
@@ -1825,7 +2088,9 @@ def scan_streams(
     colored_print("Scanning streams...", level="info")
     streams_in_sf = []
     skipped_schemas = []
-    if not schemas_in_kendo or not kendo_schema_id_key_map:
+    # parents handed in by a shard scope the kendo reads to them
+    scoped = schemas_in_kendo is not None and kendo_schema_id_key_map is not None
+    if schemas_in_kendo is None or kendo_schema_id_key_map is None:
         schemas_in_kendo, kendo_schema_id_key_map = (
             _get_schema_objs_in_kendo_with_id_key_map(factory)
         )
@@ -1861,17 +2126,18 @@ def scan_streams(
             "Streams could not be scanned from some schemas.",
             level="warning",
         )
-        confirm = typer.confirm("View?")
+        confirm = prompt_confirm("View?")
         if confirm:
-            colored_print("Skipped: ", level="info")
-            print(skipped_schemas)
-        typer.confirm(
+            print_objs("Skipped: ", skipped_schemas)
+        prompt_confirm(
             "Do you want to proceed with mapping excluding streams from these schemas?",
             abort=True,
         )
 
     streams_in_kendo, kendo_stream_id_key_map = (
-        _get_stream_objs_in_kendo_with_id_key_map(factory, kendo_schema_id_key_map)
+        _get_stream_objs_in_kendo_with_id_key_map(
+            factory, kendo_schema_id_key_map, scoped=scoped
+        )
     )
 
     missing_streams = []
@@ -1879,16 +2145,16 @@ def scan_streams(
     for stream in streams_in_kendo:
         if (stream["NAME"], stream["SCHEMA_ID"]) not in temp_list:
             missing_streams.append(stream)
+    record_missing_objs(Resources.streams, missing_streams)
     if missing_streams:
         colored_print(
             f"{len(missing_streams)} stream(s) that were mapped earlier could not be found.",
             level="warning",
         )
-        confirm = typer.confirm("View?")
+        confirm = prompt_confirm("View?")
         if confirm:
-            colored_print("Missing Stream mappings: ", level="info")
-            print(missing_streams)
-        typer.confirm(
+            print_objs("Missing Stream mappings: ", missing_streams)
+        prompt_confirm(
             "Do you want to proceed without fixing these mappings yourself?",
             abort=True,
         )
@@ -1898,15 +2164,20 @@ def scan_streams(
     for stream in streams_in_sf:
         if (stream["name"], stream["schema_id"]) not in temp_list:
             new_streams.append(stream)
+    emit_event(
+        "diff",
+        resource=Resources.streams.value,
+        missing=len(missing_streams),
+        new=len(new_streams),
+    )
     if new_streams:
         colored_print(
             f"{len(new_streams)} new stream(s) detected since last scan.", level="info"
         )
-        confirm = typer.confirm("View?")
+        confirm = prompt_confirm("View?")
         if confirm:
-            colored_print("New Streams: ", level="info")
-            print(new_streams)
-        typer.confirm(
+            print_objs("New Streams: ", new_streams)
+        prompt_confirm(
             "Are you sure you want these new streams to be mapped?",
             abort=True,
         )
@@ -1914,9 +2185,10 @@ def scan_streams(
             SpinnerColumn(),
             TextColumn("[progress.description]{task.description}"),
             # transient=True,
+            disable=is_ndjson(),
         ) as progress:
             progress.add_task(description="Mapping new streams...", total=None)
-            i_insert = factory.paramized_insert(
+            i_insert = factory.multi_row_insert(
                 table="kendo_db.infrastructure.stream_objs",
                 columns=["obj_created_on", "name", "table_name", "schema_id"],
             )
@@ -1929,19 +2201,20 @@ def scan_streams(
                 )
                 for stream in new_streams
             ]
-            factory.backend_connection.execute_many_times(
-                i_insert.generate_statement(), data
-            )
+            factory.backend_connection.execute_insert(i_insert, data)
         colored_print(
             f"{len(new_streams)} new stream(s) mapped successfully.", level="success"
         )
         streams_in_kendo, kendo_stream_id_key_map = (
-            _get_stream_objs_in_kendo_with_id_key_map(factory, kendo_schema_id_key_map)
+            _get_stream_objs_in_kendo_with_id_key_map(
+                factory, kendo_schema_id_key_map, scoped=scoped
+            )
         )
 
     return streams_in_kendo, kendo_stream_id_key_map
 
 
+@_scan_phase(Resources.pipes)
 def scan_pipes(
     snowflake_ds: SnowflakeDatasourceConnection,
     factory: Factory,
@@ -1951,7 +2224,9 @@ def scan_pipes(
     colored_print("Scanning pipes...", level="info")
     pipes_in_sf = []
     skipped_schemas = []
-    if not schemas_in_kendo or not kendo_schema_id_key_map:
+    # parents handed in by a shard scope the kendo reads to them
+    scoped = schemas_in_kendo is not None and kendo_schema_id_key_map is not None
+    if schemas_in_kendo is None or kendo_schema_id_key_map is None:
         schemas_in_kendo, kendo_schema_id_key_map = (
             _get_schema_objs_in_kendo_with_id_key_map(factory)
         )
@@ -1986,17 +2261,16 @@ def scan_pipes(
             "Pipes could not be scanned from some schemas.",
             level="warning",
         )
-        confirm = typer.confirm("View?")
+        confirm = prompt_confirm("View?")
         if confirm:
-            colored_print("Skipped: ", level="info")
-            print(skipped_schemas)
-        typer.confirm(
+            print_objs("Skipped: ", skipped_schemas)
+        prompt_confirm(
             "Do you want to proceed with mapping excluding pipes from these schemas?",
             abort=True,
         )
 
     pipes_in_kendo, kendo_pipe_id_key_map = _get_pipe_objs_in_kendo_with_id_key_map(
-        factory, kendo_schema_id_key_map
+        factory, kendo_schema_id_key_map, scoped=scoped
     )
 
     missing_pipes = []
@@ -2004,16 +2278,16 @@ def scan_pipes(
     for pipe in pipes_in_kendo:
         if (pipe["NAME"], pipe["SCHEMA_ID"]) not in temp_list:
             missing_pipes.append(pipe)
+    record_missing_objs(Resources.pipes, missing_pipes)
     if missing_pipes:
         colored_print(
             f"{len(missing_pipes)} pipe(s) that were mapped earlier could not be found.",
             level="warning",
         )
-        confirm = typer.confirm("View?")
+        confirm = prompt_confirm("View?")
         if confirm:
-            colored_print("Missing Pipe mappings: ", level="info")
-            print(missing_pipes)
-        typer.confirm(
+            print_objs("Missing Pipe mappings: ", missing_pipes)
+        prompt_confirm(
             "Do you want to proceed without fixing these mappings yourself?",
             abort=True,
         )
@@ -2023,15 +2297,20 @@ def scan_pipes(
     for pipe in pipes_in_sf:
         if (pipe["name"], pipe["schema_id"]) not in temp_list:
             new_pipes.append(pipe)
+    emit_event(
+        "diff",
+        resource=Resources.pipes.value,
+        missing=len(missing_pipes),
+        new=len(new_pipes),
+    )
     if new_pipes:
         colored_print(
             f"{len(new_pipes)} new pipe(s) detected since last scan.", level="info"
         )
-        confirm = typer.confirm("View?")
+        confirm = prompt_confirm("View?")
         if confirm:
-            colored_print("New Pipes: ", level="info")
-            print(new_pipes)
-        typer.confirm(
+            print_objs("New Pipes: ", new_pipes)
+        prompt_confirm(
             "Are you sure you want these new pipes to be mapped?",
             abort=True,
         )
@@ -2039,9 +2318,10 @@ def scan_pipes(
             SpinnerColumn(),
             TextColumn("[progress.description]{task.description}"),
             # transient=True,
+            disable=is_ndjson(),
         ) as progress:
             progress.add_task(description="Mapping new pipes...", total=None)
-            i_insert = factory.paramized_insert(
+            i_insert = factory.multi_row_insert(
                 table="kendo_db.infrastructure.pipe_objs",
                 columns=["obj_created_on", "name", "schema_id"],
             )
@@ -2053,29 +2333,29 @@ def scan_pipes(
                 )
                 for pipe in new_pipes
             ]
-            factory.backend_connection.execute_many_times(
-                i_insert.generate_statement(), data
-            )
+            factory.backend_connection.execute_insert(i_insert, data)
         colored_print(
             f"{len(new_pipes)} new pipe(s) mapped successfully.", level="success"
         )
         pipes_in_kendo, kendo_pipe_id_key_map = _get_pipe_objs_in_kendo_with_id_key_map(
-            factory, kendo_schema_id_key_map
+            factory, kendo_schema_id_key_map, scoped=scoped
         )
 
     return pipes_in_kendo, kendo_pipe_id_key_map
 
 
-def scan_infra(object_type: Resources):
-    config_doc = get_kendo_config_or_raise_error()
-    factory = Factory(config_doc)
+def scan_infra(object_type: Resources, config_doc: Optional[dict] = None):
+    if config_doc is None:
+        config_doc = get_kendo_config_or_raise_error()
+    factory = Factory(config_doc, role="SYSADMIN")
     datasource_connection_name = config_doc["datasource"]["connection_name"]
-    if config_doc["backend"]["provider"] == BackendProvider.snowflake:
-        factory.backend_connection.execute("USE ROLE SYSADMIN;")
-    snowflake_ds = SnowflakeDatasourceConnection(datasource_connection_name)
-    snowflake_ds.execute("USE ROLE SYSADMIN;")
+    snowflake_ds = SnowflakeDatasourceConnection(
+        datasource_connection_name, role="SYSADMIN"
+    )
 
     colored_print("Scanning Snowflake infrastructure...", level="info")
+    started = time.monotonic()
+    emit_event("scan_start", resource=object_type.value)
 
     if object_type == Resources.databases:
         scan_databases(snowflake_ds, factory)
@@ -2131,5 +2411,338 @@ def scan_infra(object_type: Resources):
         scan_streams(snowflake_ds, factory)
         scan_pipes(snowflake_ds, factory)
 
+    scanned_resources = (
+        list(RESOURCE_TABLES) if object_type == Resources.all else [object_type]
+    )
+    _finish_scan(snowflake_ds, factory, config_doc, scanned_resources)
+    emit_event(
+        "scan_end",
+        resource=object_type.value,
+        seconds=round(time.monotonic() - started, 3),
+        stats=execution_policy.snapshot(),
+    )
+
+
+def _finish_scan(
+    snowflake_ds: SnowflakeDatasourceConnection,
+    factory: Factory,
+    config_doc: dict,
+    scanned_resources: List[Resources],
+    refresh_all_tags: bool = False,
+):
+    record_history(factory, scanned_resources)
+    invalidate_inventory_index()
+    # inventory changes can move inherited tags, in the databases whose objects
+    # the scanners added or lost
+    if refresh_all_tags:
+        refresh_effective_tags(factory)
+    else:
+        refresh_changed_effective_tags(factory)
+    # role graph closure, so access queries are answered locally
+    refresh_access_graph(factory, config_doc)
+
+    # keep the local replica in step with the backend so kendo_db tests run offline
+    with Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        disable=is_ndjson(),
+    ) as progress:
+        progress.add_task(description="Refreshing local inventory replica...", total=None)
+        get_inventory_replica(config_doc["datasource"]["connection_name"]).refresh(
+            factory
+        )
+
     snowflake_ds.close_session()
     factory.backend_connection.close_session()
+
+    stats = execution_policy.snapshot()
+    if stats["retries"] or stats["throttled"]:
+        colored_print(
+            f"Snowflake throttled {stats['throttled']} statement(s), {stats['retries']} retried; concurrency limit settled at {stats['concurrency_limit']}.",
+            level="warning",
+        )
+
+
+def _database_shard(database_name: str, shard_count: int) -> int:
+    # crc32 rather than hash(), which is salted per process, so every worker
+    # and machine agrees on the partition
+    return zlib.crc32(database_name.encode()) % shard_count
+
+
+def scan_shard(shard: int, shard_count: int, config_doc: Optional[dict] = None):
+    # scans the database-scoped objects of one shard's databases (1-based shard);
+    # databases are mapped beforehand by scan_shard_databases and the final step
+    # scans account-level
+    # objects and records history for every shard. Shards never share a parent,
+    # so their inserts can't collide and ids come from the backend sequences
+    if config_doc is None:
+        config_doc = get_kendo_config_or_raise_error()
+    factory = Factory(config_doc, role="SYSADMIN")
+    snowflake_ds = SnowflakeDatasourceConnection(
+        config_doc["datasource"]["connection_name"], role="SYSADMIN"
+    )
+
+    dbs_in_kendo, _ = _get_db_objs_in_kendo_with_id_key_map(factory)
+    dbs_in_kendo = [
+        db for db in dbs_in_kendo if _database_shard(db["NAME"], shard_count) == shard - 1
+    ]
+    colored_print(
+        f"Scanning shard {shard}/{shard_count}: {len(dbs_in_kendo)} database(s)...",
+        level="info",
+    )
+    started = time.monotonic()
+    emit_event("scan_start", shard=f"{shard}/{shard_count}", databases=len(dbs_in_kendo))
+    kendo_db_id_key_map = {db["ID"]: db for db in dbs_in_kendo}
+    schemas_in_kendo, kendo_schema_id_key_map = scan_schemas(
+        snowflake_ds, factory, dbs_in_kendo, kendo_db_id_key_map
+    )
+    tables_in_kendo, kendo_table_id_key_map = scan_tables(
+        snowflake_ds, factory, schemas_in_kendo, kendo_schema_id_key_map
+    )
+    scan_views(snowflake_ds, factory, schemas_in_kendo, kendo_schema_id_key_map)
+    scan_stages(snowflake_ds, factory, schemas_in_kendo, kendo_schema_id_key_map)
+    scan_columns(snowflake_ds, factory, tables_in_kendo, kendo_table_id_key_map)
+    scan_streams(snowflake_ds, factory, schemas_in_kendo, kendo_schema_id_key_map)
+    scan_pipes(snowflake_ds, factory, schemas_in_kendo, kendo_schema_id_key_map)
+    flush_missing_objs(factory, SHARD_RESOURCES)
+
+    snowflake_ds.close_session()
+    factory.backend_connection.close_session()
+    emit_event(
+        "scan_end",
+        shard=f"{shard}/{shard_count}",
+        seconds=round(time.monotonic() - started, 3),
+        stats=execution_policy.snapshot(),
+    )
+
+
+def scan_shard_databases(config_doc: Optional[dict] = None):
+    # maps databases before the shards start, and hands the ones that went
+    # missing to the final step like a shard does
+    if config_doc is None:
+        config_doc = get_kendo_config_or_raise_error()
+    factory = Factory(config_doc, role="SYSADMIN")
+    snowflake_ds = SnowflakeDatasourceConnection(
+        config_doc["datasource"]["connection_name"], role="SYSADMIN"
+    )
+
+    started = time.monotonic()
+    emit_event("scan_start", shard="databases")
+    scan_databases(snowflake_ds, factory)
+    flush_missing_objs(factory, [Resources.databases])
+
+    snowflake_ds.close_session()
+    factory.backend_connection.close_session()
+    emit_event(
+        "scan_end",
+        shard="databases",
+        seconds=round(time.monotonic() - started, 3),
+        stats=execution_policy.snapshot(),
+    )
+
+
+def finish_sharded_scan(config_doc: Optional[dict] = None):
+    # runs once every shard is done
+    if config_doc is None:
+        config_doc = get_kendo_config_or_raise_error()
+    factory = Factory(config_doc, role="SYSADMIN")
+    snowflake_ds = SnowflakeDatasourceConnection(
+        config_doc["datasource"]["connection_name"], role="SYSADMIN"
+    )
+
+    colored_print("Scanning account-level objects...", level="info")
+    started = time.monotonic()
+    emit_event("scan_start", shard="final")
+    scan_roles(snowflake_ds, factory)
+    scan_users(snowflake_ds, factory)
+    scan_grants_to_roles(snowflake_ds, factory)
+    scan_role_grants(snowflake_ds, factory)
+    scan_warehouses(snowflake_ds, factory)
+
+    # history of a resource no step scanned is left as is, its missing
+    # objects are unknown and recording it would reopen dropped ones
+    scanned = collect_missing_objs(factory) | {
+        Resources.roles,
+        Resources.users,
+        Resources.grants_to_roles,
+        Resources.role_grants,
+        Resources.warehouses,
+    }
+    skipped = [resource.value for resource in RESOURCE_TABLES if resource not in scanned]
+    if skipped:
+        colored_print(
+            f"History of {', '.join(skipped)} was not recorded, no --shard step scanned them since the last final step.",
+            level="warning",
+        )
+    _finish_scan(
+        snowflake_ds,
+        factory,
+        config_doc,
+        [resource for resource in RESOURCE_TABLES if resource in scanned],
+        # the shards' changes were recorded in their own processes
+        refresh_all_tags=True,
+    )
+    emit_event(
+        "scan_end",
+        shard="final",
+        seconds=round(time.monotonic() - started, 3),
+        stats=execution_policy.snapshot(),
+    )
+
+
+def _run_scan_worker(
+    log_path: str, scan: Callable, args: tuple, output: OutputFormat
+) -> dict:
+    # runs in a worker process with its own sessions; output goes to a log so
+    # concurrent scans don't interleave. Spawned processes start with default
+    # context variables, so the output format is handed over explicitly
+    started = time.monotonic()
+    error = None
+    assume_yes.set(True)
+    output_format.set(output)
+    with open(log_path, "w") as log, redirect_stdout(log), redirect_stderr(log):
+        try:
+            scan(*args)
+        except typer.Abort:
+            error = "aborted"
+        except Exception as e:
+            traceback.print_exc()
+            error = f"{type(e).__name__}: {e}"
+    return {
+        "seconds": time.monotonic() - started,
+        "error": error,
+        "stats": execution_policy.snapshot(),
+    }
+
+
+def _run_scan_workers(jobs: List[Tuple[str, str, Callable, tuple]]) -> List[str]:
+    # jobs are (label, log name, scan function, args); returns the failed labels
+    started = time.monotonic()
+    failed = []
+    # spawned workers don't inherit the parent's sessions or locks
+    with ProcessPoolExecutor(
+        max_workers=min(MAX_SCAN_WORKERS, len(jobs)),
+        mp_context=multiprocessing.get_context("spawn"),
+    ) as executor:
+        futures = {
+            executor.submit(
+                _run_scan_worker,
+                get_kendo_local_path(log_name),
+                scan,
+                args,
+                output_format.get(),
+            ): (label, log_name)
+            for label, log_name, scan, args in jobs
+        }
+        for future in as_completed(futures):
+            label, log_name = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # the worker process itself died
+                result = {"seconds": None, "error": str(e), "stats": None}
+            emit_event(
+                "worker_end",
+                worker=label,
+                log=get_kendo_local_path(log_name),
+                **result,
+            )
+            if result["error"]:
+                failed.append(label)
+                colored_print(
+                    f"{label}: failed ({result['error']}), see {get_kendo_local_path(log_name)}",
+                    level="error",
+                )
+            else:
+                colored_print(
+                    f"{label}: scanned in {result['seconds']:.1f}s, {result['stats']['statements']} statement(s), {result['stats']['retries']} retried",
+                    level="success",
+                )
+
+    colored_print(
+        f"Finished {len(jobs) - len(failed)}/{len(jobs)} scan(s) in {time.monotonic() - started:.1f}s.",
+        level="error" if failed else "success",
+    )
+    if failed:
+        colored_print(f"Failed: {', '.join(sorted(failed))}", level="error")
+    return failed
+
+
+def _scan_account(account: str, object_type: Resources):
+    scan_infra(
+        object_type,
+        get_account_config_doc(get_kendo_config_or_raise_error(), account),
+    )
+
+
+def scan_accounts(object_type: Resources, accounts: List[str]):
+    config_doc = get_kendo_config_or_raise_error()
+    for account in accounts:
+        get_account_config_doc(config_doc, account)
+
+    colored_print(f"Scanning {len(accounts)} account(s) concurrently...", level="info")
+    failed = _run_scan_workers(
+        [
+            (account, f"scan_{account}.log", _scan_account, (account, object_type))
+            for account in accounts
+        ]
+    )
+    if failed:
+        raise typer.Exit(1)
+
+
+def scan_sharded(object_type: Resources, shard: Optional[str], shards: Optional[int]):
+    # `--shards N` runs every step locally; `--shard databases`, `--shard i/N`
+    # and `--shard final` run one step, so shards can be spread across machines
+    if object_type != Resources.all:
+        colored_print(
+            "Sharded scans cover all resources, use `kendo scan all`.", level="error"
+        )
+        raise typer.Abort()
+
+    if shards is not None:
+        if shards < 1:
+            colored_print("--shards must be at least 1.", level="error")
+            raise typer.Abort()
+        config_doc = get_kendo_config_or_raise_error()
+        scan_shard_databases(config_doc)
+
+        colored_print(f"Scanning {shards} shard(s) concurrently...", level="info")
+        failed = _run_scan_workers(
+            [
+                (
+                    f"shard {i}/{shards}",
+                    f"scan_shard_{i}_of_{shards}.log",
+                    scan_shard,
+                    (i, shards),
+                )
+                for i in range(1, shards + 1)
+            ]
+        )
+        if failed:
+            colored_print(
+                "The final step was skipped, rerun the failed shard(s) with --shard and then `kendo scan all --yes --shard final`.",
+                level="error",
+            )
+            raise typer.Exit(1)
+        finish_sharded_scan(config_doc)
+        return
+
+    assert shard is not None
+    if shard == "databases":
+        scan_shard_databases()
+        return
+    if shard == "final":
+        finish_sharded_scan()
+        return
+    try:
+        shard_index, shard_count = (int(part) for part in shard.split("/"))
+    except ValueError:
+        shard_index, shard_count = 0, 0
+    if not 1 <= shard_index <= shard_count:
+        colored_print(
+            f"--shard takes 'databases', i/N with 1 <= i <= N, or 'final'; got '{shard}'.",
+            level="error",
+        )
+        raise typer.Abort()
+    scan_shard(shard_index, shard_count)
@@ -0,0 +1,270 @@
+import io
+import json
+import os
+import secrets
+import sys
+import threading
+import traceback
+from contextlib import redirect_stderr, redirect_stdout
+from contextvars import ContextVar
+from http.client import HTTPConnection
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+import click
+import typer
+
+from kendo.backends.execution_policy import execution_policy
+from kendo.backends.session_pool import session_pool
+from kendo.factory import Factory
+from kendo.schemas.enums import TagableType
+from kendo.services.common import (
+    get_kendo_config_or_raise_error,
+    get_kendo_local_path,
+)
+from kendo.services.inventory_index import (
+    InventoryPathIndex,
+    invalidate_inventory_index,
+    keep_inventory_index_warm,
+)
+from kendo.utils.prompt import assume_yes
+from kendo.utils.rich import colored_print
+
+DAEMON_INFO_FILE = "daemon.json"
+DAEMON_HOST = "127.0.0.1"
+DAEMON_REQUEST_TIMEOUT = 3600
+
+# commands that always run in the calling process
+LOCAL_COMMANDS = ["init", "serve"]
+
+# set while the daemon runs a command, so it is never forwarded again
+in_daemon: ContextVar[bool] = ContextVar("in_daemon", default=False)
+
+
+def _read_daemon_info() -> Optional[dict]:
+    info_path = get_kendo_local_path(DAEMON_INFO_FILE)
+    if not os.path.exists(info_path):
+        return None
+    try:
+        with open(info_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _request(info: dict, method: str, path: str, body: Optional[dict] = None) -> dict:
+    conn = HTTPConnection(DAEMON_HOST, info["port"], timeout=DAEMON_REQUEST_TIMEOUT)
+    try:
+        conn.request(
+            method,
+            path,
+            body=json.dumps(body or {}),
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {info['token']}",
+            },
+        )
+        response = conn.getresponse()
+        return json.loads(response.read() or b"{}")
+    finally:
+        conn.close()
+
+
+class _DaemonState:
+    # commands share stdout, stdin and the working directory, so they run one at a time
+    lock: threading.Lock
+    token: str
+
+    def __init__(self, token: str):
+        self.lock = threading.Lock()
+        self.token = token
+
+
+def _run_command(argv: List[str], cwd: str) -> dict:
+    from kendo.main import app
+
+    output = io.StringIO()
+    exit_code = 0
+    previous_cwd = os.getcwd()
+    in_daemon_token = in_daemon.set(True)
+    assume_yes_token = assume_yes.set(True)
+    try:
+        os.chdir(cwd)
+        with redirect_stdout(output), redirect_stderr(output):
+            try:
+                result = app(argv, prog_name="kendo", standalone_mode=False)
+                exit_code = result if isinstance(result, int) else 0
+            except click.exceptions.Abort:
+                output.write("Aborted!\n")
+                exit_code = 1
+            except click.exceptions.ClickException as e:
+                e.show(file=output)
+                exit_code = e.exit_code
+            except SystemExit as e:
+                exit_code = e.code if isinstance(e.code, int) else 1
+            except Exception:
+                traceback.print_exc(file=output)
+                exit_code = 1
+    finally:
+        os.chdir(previous_cwd)
+        assume_yes.reset(assume_yes_token)
+        in_daemon.reset(in_daemon_token)
+    return {"exit_code": exit_code, "output": output.getvalue()}
+
+
+def _lookup_inventory(obj_type: str, path: str) -> dict:
+    config_doc = get_kendo_config_or_raise_error()
+    factory = Factory(config_doc, role="SYSADMIN")
+    obj_id = InventoryPathIndex(factory).get_id(TagableType(obj_type), path)
+    factory.backend_connection.close_session()
+    return {"type": obj_type, "path": path, "id": obj_id}
+
+
+def _make_handler(state: _DaemonState, server_ref: List[ThreadingHTTPServer]):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _reply(self, status: int, body: dict):
+            data = json.dumps(body, default=str).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _read_body(self) -> Optional[dict]:
+            if self.headers.get("Authorization") != f"Bearer {state.token}":
+                self._reply(401, {"error": "unauthorized"})
+                return None
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                return json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                self._reply(400, {"error": "invalid JSON body"})
+                return None
+
+        def do_POST(self):
+            body = self._read_body()
+            if body is None:
+                return
+            if self.path == "/health":
+                self._reply(200, {"status": "ok", "pid": os.getpid()})
+            elif self.path == "/run":
+                with state.lock:
+                    result = _run_command(body.get("argv", []), body.get("cwd", "."))
+                self._reply(200, result)
+            elif self.path == "/inventory":
+                try:
+                    with state.lock:
+                        result = _lookup_inventory(body["type"], body["path"])
+                except (KeyError, ValueError, click.exceptions.Abort) as e:
+                    self._reply(400, {"error": f"invalid lookup: {e}"})
+                    return
+                self._reply(200, result)
+            elif self.path == "/stats":
+                self._reply(200, execution_policy.snapshot())
+            elif self.path == "/invalidate":
+                invalidate_inventory_index()
+                self._reply(200, {"status": "ok"})
+            elif self.path == "/shutdown":
+                self._reply(200, {"status": "stopping"})
+                threading.Thread(target=server_ref[0].shutdown, daemon=True).start()
+            else:
+                self._reply(404, {"error": f"unknown endpoint {self.path}"})
+
+    return Handler
+
+
+def serve(port: int = 0):
+    if is_daemon_running():
+        colored_print("kendo serve is already running.", level="warning")
+        raise typer.Abort()
+
+    # warm state: pooled sessions, parsed config and inventory paths
+    session_pool.enabled = True
+    keep_inventory_index_warm()
+    get_kendo_config_or_raise_error()
+
+    state = _DaemonState(secrets.token_hex(16))
+    server_ref: List[ThreadingHTTPServer] = []
+    server = ThreadingHTTPServer((DAEMON_HOST, port), _make_handler(state, server_ref))
+    server_ref.append(server)
+
+    # the token keeps other local users from driving the daemon
+    info_path = get_kendo_local_path(DAEMON_INFO_FILE)
+    fd = os.open(info_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        json.dump(
+            {"port": server.server_address[1], "pid": os.getpid(), "token": state.token},
+            f,
+        )
+    colored_print(
+        f"kendo serve listening on {DAEMON_HOST}:{server.server_address[1]}",
+        level="success",
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(info_path):
+            os.remove(info_path)
+        session_pool.close_all()
+        colored_print("kendo serve stopped.", level="info")
+
+
+def is_daemon_running() -> bool:
+    info = _read_daemon_info()
+    if info is None:
+        return False
+    try:
+        return _request(info, "POST", "/health").get("status") == "ok"
+    except (OSError, ValueError):
+        return False
+
+
+def stop_daemon():
+    info = _read_daemon_info()
+    if info is None or not is_daemon_running():
+        colored_print("kendo serve is not running.", level="warning")
+        return
+    _request(info, "POST", "/shutdown")
+    colored_print("kendo serve is stopping.", level="success")
+
+
+def notify_daemon_inventory_changed():
+    # a scan run outside the daemon leaves its warm inventory stale
+    info = _read_daemon_info()
+    if info is None or in_daemon.get():
+        return
+    try:
+        _request(info, "POST", "/invalidate")
+    except (OSError, ValueError):
+        pass
+
+
+def forward_to_daemon(command: Optional[str]):
+    # runs the command in `kendo serve` when it is up; raises typer.Exit with its
+    # exit code once the output has been printed, otherwise returns to run locally
+    if command is None or command in LOCAL_COMMANDS or in_daemon.get():
+        return
+    if os.environ.get("KENDO_NO_DAEMON"):
+        return
+    argv = sys.argv[1:]
+    # scans prompt for confirmation, only non-interactive ones are forwarded
+    if command == "scan" and "--yes" not in argv:
+        return
+    info = _read_daemon_info()
+    if info is None:
+        return
+    try:
+        result = _request(info, "POST", "/run", {"argv": argv, "cwd": os.getcwd()})
+    except (OSError, ValueError):
+        # stale daemon file, run locally
+        return
+    if "output" not in result:
+        return
+    sys.stdout.write(result["output"])
+    raise typer.Exit(result["exit_code"])
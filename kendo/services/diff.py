@@ -0,0 +1,126 @@
+import json
+import sys
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import typer
+
+from kendo.factory import Factory
+from kendo.schemas.enums import Resources
+from kendo.services.common import get_kendo_config_or_raise_error
+from kendo.services.history import (
+    HISTORY_BATCH_SIZE,
+    OBJ_HISTORY_TABLE,
+    RESOURCE_TABLES,
+)
+from kendo.utils.rich import colored_print
+
+LIVE_SNAPSHOT = "live"
+
+# only users and warehouses are updated in place by scans, so only they can
+# be changed; other objects are added or removed
+CHANGE_TYPES = ["added", "removed", "changed"]
+
+
+def _parse_snapshot(snapshot: str) -> Optional[datetime]:
+    # None stands for the live inventory
+    if snapshot.lower() == LIVE_SNAPSHOT:
+        return None
+    try:
+        as_of = datetime.fromisoformat(snapshot)
+    except ValueError:
+        colored_print(
+            f"Snapshot '{snapshot}' is neither a timestamp nor '{LIVE_SNAPSHOT}'.",
+            level="error",
+        )
+        raise typer.Abort()
+    return as_of if as_of.tzinfo else as_of.astimezone()
+
+
+def _snapshot_sql(
+    as_of: Optional[datetime], resources: List[Resources]
+) -> Tuple[str, list]:
+    # live is the open versions, which leave out the objects scans found
+    # dropped, unlike the *_objs tables that keep every mapped row
+    placeholders = ", ".join(["?"] * len(resources))
+    sql = f"""SELECT resource, object_id, attributes, row_hash FROM {OBJ_HISTORY_TABLE}
+        WHERE resource IN ({placeholders})"""
+    params: list = [resource.value for resource in resources]
+    if as_of is None:
+        return sql + " AND valid_to IS NULL", params
+    return (
+        sql + " AND valid_from <= ? AND (valid_to IS NULL OR valid_to > ?)",
+        params + [("TIMESTAMP_LTZ", as_of), ("TIMESTAMP_LTZ", as_of)],
+    )
+
+
+def _changed_fields(before: dict, after: dict) -> Dict[str, dict]:
+    return {
+        field: {"before": before.get(field), "after": after.get(field)}
+        for field in sorted(before.keys() | after.keys())
+        if before.get(field) != after.get(field)
+    }
+
+
+def diff_snapshots(
+    snapshot_a: str,
+    snapshot_b: str,
+    object_type: Resources = Resources.all,
+    fail_on_drift: bool = False,
+):
+    # objects keep their kendo id across scans (scanners match them on their
+    # natural keys), so both snapshots are joined on (resource, object_id) and
+    # only pairs whose row hashes differ leave Snowflake
+    as_of_a = _parse_snapshot(snapshot_a)
+    as_of_b = _parse_snapshot(snapshot_b)
+    resources = (
+        list(RESOURCE_TABLES) if object_type == Resources.all else [object_type]
+    )
+    sql_a, params_a = _snapshot_sql(as_of_a, resources)
+    sql_b, params_b = _snapshot_sql(as_of_b, resources)
+
+    config_doc = get_kendo_config_or_raise_error()
+    factory = Factory(config_doc, role="SYSADMIN")
+    counts = {change: 0 for change in CHANGE_TYPES}
+    for batch in factory.backend_connection.execute_in_batches(
+        f"""WITH a AS ({sql_a}),
+b AS ({sql_b})
+SELECT COALESCE(a.resource, b.resource) AS resource,
+COALESCE(a.object_id, b.object_id) AS object_id,
+a.attributes AS before, b.attributes AS after
+FROM a FULL OUTER JOIN b ON a.resource = b.resource AND a.object_id = b.object_id
+WHERE a.row_hash IS DISTINCT FROM b.row_hash
+ORDER BY resource, object_id""",
+        tuple(params_a + params_b),
+        batch_size=HISTORY_BATCH_SIZE,
+    ):
+        for row in batch:
+            before = json.loads(row["BEFORE"]) if row["BEFORE"] else None
+            after = json.loads(row["AFTER"]) if row["AFTER"] else None
+            record = {"resource": row["RESOURCE"], "object_id": row["OBJECT_ID"]}
+            if before is None:
+                record["change"] = "added"
+                record["after"] = after
+            elif after is None:
+                record["change"] = "removed"
+                record["before"] = before
+            else:
+                record["change"] = "changed"
+                record["fields"] = _changed_fields(before, after)
+            counts[record["change"]] += 1
+            sys.stdout.write(json.dumps(record, default=str) + "\n")
+    factory.backend_connection.close_session()
+
+    sys.stdout.write(
+        json.dumps(
+            {
+                "summary": counts,
+                "from": snapshot_a if as_of_a is None else as_of_a,
+                "to": snapshot_b if as_of_b is None else as_of_b,
+            },
+            default=str,
+        )
+        + "\n"
+    )
+    if fail_on_drift and any(counts.values()):
+        raise typer.Exit(1)
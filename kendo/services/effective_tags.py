@@ -0,0 +1,271 @@
+from typing import Dict, List, Optional, Set, Tuple
+
+from rich import print_json
+
+from kendo.backends.crud import MAX_BIND_PARAMS
+from kendo.factory import Factory
+from kendo.schemas.common import ICaughtException
+from kendo.schemas.enums import TagableType
+from kendo.services.common import get_kendo_config_or_raise_error
+from kendo.services.inventory_index import InventoryPathIndex, split_object_path
+from kendo.services.policy import RESOURCE_RELATIONS
+from kendo.utils.rich import colored_print
+from kendo.utils.sql import quote_identifier
+
+EFFECTIVE_TAGS_TABLE = "kendo_db.config.effective_tags"
+DIRECT_TAGS_LOAD_TABLE = "kendo_db.config.direct_tags_load"
+EFFECTIVE_TAGS_BATCH_SIZE = 10000
+
+_INFRA = "kendo_db.infrastructure"
+
+# objects under a database; tags set on users and roles only apply to themselves
+DATABASE_SCOPED_TYPES = [
+    TagableType.DATABASE,
+    TagableType.SCHEMA,
+    TagableType.TABLE,
+    TagableType.VIEW,
+    TagableType.COLUMN,
+]
+
+# for every object type: its FROM clause, its database id, and the (source type,
+# source id, depth) of itself and each ancestor it inherits tags from
+_HIERARCHY = {
+    "database": (
+        f"{_INFRA}.database_objs o",
+        "o.id",
+        [("database", "o.id", 0)],
+    ),
+    "schema": (
+        f"{_INFRA}.schema_objs o",
+        "o.database_id",
+        [("database", "o.database_id", 0), ("schema", "o.id", 1)],
+    ),
+    "table": (
+        f"{_INFRA}.table_objs o JOIN {_INFRA}.schema_objs s ON o.schema_id = s.id",
+        "s.database_id",
+        [("database", "s.database_id", 0), ("schema", "s.id", 1), ("table", "o.id", 2)],
+    ),
+    "view": (
+        f"{_INFRA}.view_objs o JOIN {_INFRA}.schema_objs s ON o.schema_id = s.id",
+        "s.database_id",
+        [("database", "s.database_id", 0), ("schema", "s.id", 1), ("view", "o.id", 2)],
+    ),
+    "column": (
+        f"""{_INFRA}.column_objs o JOIN {_INFRA}.table_objs t ON o.table_id = t.id
+        JOIN {_INFRA}.schema_objs s ON t.schema_id = s.id""",
+        "s.database_id",
+        [
+            ("database", "s.database_id", 0),
+            ("schema", "s.id", 1),
+            ("table", "t.id", 2),
+            ("column", "o.id", 3),
+        ],
+    ),
+    "user": (f"{_INFRA}.user_objs o", "NULL", [("user", "o.id", 0)]),
+    "role": (f"{_INFRA}.role_objs o", "NULL", [("role", "o.id", 0)]),
+}
+
+# databases whose objects scans added or lost; None stands for users and roles
+_changed_scopes: Set[Optional[int]] = set()
+
+
+def _ancestry_relation() -> str:
+    selects = []
+    for obj_type, (from_clause, database_id, sources) in _HIERARCHY.items():
+        for source_type, source_id, depth in sources:
+            selects.append(
+                f"SELECT '{obj_type}' AS obj_type, o.id AS object_id, {database_id} AS database_id, "
+                f"'{source_type}' AS source_type, {source_id} AS source_id, {depth} AS depth FROM {from_clause}"
+            )
+    return "\nUNION ALL\n".join(selects)
+
+
+def _scope_predicate(
+    database_ids: Optional[List[int]], include_account: bool, alias: str = ""
+) -> str:
+    if database_ids is None:
+        return "TRUE"
+    predicates = []
+    if database_ids:
+        predicates.append(
+            f"{alias}database_id IN ({', '.join(str(int(i)) for i in database_ids)})"
+        )
+    if include_account:
+        predicates.append(f"{alias}database_id IS NULL")
+    return f"({' OR '.join(predicates)})" if predicates else "FALSE"
+
+
+def record_changed_objs(objs: List[dict], database_id_key: Optional[str]):
+    # called by scanners with the objects they added or lost, so the refresh
+    # after the scan only covers their databases; users and roles have no
+    # database_id_key
+    for obj in objs:
+        _changed_scopes.add(obj[database_id_key] if database_id_key else None)
+
+
+def refresh_changed_effective_tags(factory: Factory):
+    # refreshes the scopes recorded by the scanners since the last refresh
+    database_ids = {scope for scope in _changed_scopes if scope is not None}
+    include_account = None in _changed_scopes
+    _changed_scopes.clear()
+    if database_ids or include_account:
+        refresh_effective_tags(
+            factory, include_account=include_account, database_ids=database_ids
+        )
+
+
+def _resolve_databases(
+    factory: Factory,
+    database_names: Optional[Set[str]],
+    database_ids: Optional[Set[int]],
+) -> Tuple[Set[str], List[int]]:
+    # names and ids of the databases in scope, whichever of the two was given
+    filters: Dict[str, list] = {}
+    if database_ids is not None:
+        filters["id"] = sorted(database_ids)
+    if database_names is not None:
+        filters["name"] = sorted(database_names)
+    names: Set[str] = set()
+    ids: List[int] = []
+    for column, values in filters.items():
+        for i in range(0, len(values), MAX_BIND_PARAMS):
+            i_select = factory.select(
+                table=f"{_INFRA}.database_objs",
+                columns=["id", "name"],
+                filters={column: values[i : i + MAX_BIND_PARAMS]},
+            )
+            for row in factory.backend_connection.execute(
+                i_select.generate_statement(), i_select.generate_params()
+            ):
+                names.add(row["NAME"])
+                ids.append(row["ID"])
+    return names, sorted(set(ids))
+
+
+def _assignments_sql(
+    database_names: Optional[Set[str]], include_account: bool
+) -> Tuple[str, Optional[tuple]]:
+    # a superset of the assignments in scope: paths are stored canonically, so
+    # the quoted database name is a prefix of every path under it
+    sql = "SELECT obj_type, obj_path, tag_id, value FROM kendo_db.config.tags_assignments"
+    scoped_types = [obj_type.value for obj_type in DATABASE_SCOPED_TYPES]
+    if (
+        database_names is None
+        or len(database_names) + 2 * len(scoped_types) > MAX_BIND_PARAMS
+    ):
+        return sql, None
+    type_list = ", ".join(["?"] * len(scoped_types))
+    predicates = []
+    params: List[str] = []
+    if database_names:
+        prefixes = " OR ".join(["STARTSWITH(obj_path, ?)"] * len(database_names))
+        predicates.append(f"(obj_type IN ({type_list}) AND ({prefixes}))")
+        params = scoped_types + [
+            quote_identifier(name) for name in sorted(database_names)
+        ]
+    if include_account:
+        predicates.append(f"obj_type NOT IN ({type_list})")
+        params += scoped_types
+    if not predicates:
+        predicates.append("FALSE")
+    return f"{sql} WHERE {' OR '.join(predicates)}", tuple(params)
+
+
+def refresh_effective_tags(
+    factory: Factory,
+    database_names: Optional[Set[str]] = None,
+    include_account: bool = True,
+    database_ids: Optional[Set[int]] = None,
+):
+    # with no databases every effective tag is rebuilt, otherwise only the
+    # objects under those databases (and users/roles if include_account is set)
+    scope_ids = None
+    if database_names is not None or database_ids is not None:
+        database_names, scope_ids = _resolve_databases(
+            factory, database_names, database_ids
+        )
+    inventory_index = InventoryPathIndex(factory, database_names)
+
+    # direct assignments resolved to inventory ids
+    direct_tags: Dict[Tuple[str, int, int], str] = {}
+    sql, sql_params = _assignments_sql(database_names, include_account)
+    for batch in factory.backend_connection.execute_in_batches(
+        sql, sql_params, batch_size=EFFECTIVE_TAGS_BATCH_SIZE
+    ):
+        for row in batch:
+            obj_type = TagableType(row["OBJ_TYPE"])
+            if database_names is not None:
+                in_scope = (
+                    split_object_path(row["OBJ_PATH"])[0] in database_names
+                    if obj_type in DATABASE_SCOPED_TYPES
+                    else include_account
+                )
+                if not in_scope:
+                    continue
+            object_id = inventory_index.get_id(obj_type, row["OBJ_PATH"])
+            if object_id is None:
+                # object no longer in the inventory
+                continue
+            direct_tags[(obj_type.value, object_id, row["TAG_ID"])] = row["VALUE"]
+
+    res = factory.backend_connection.execute(
+        f"CREATE OR REPLACE TEMPORARY TABLE {DIRECT_TAGS_LOAD_TABLE} \
+        (obj_type VARCHAR(255), object_id INT, tag_id INT, value VARCHAR(500));",
+        abort_on_exception=False,
+    )
+    if isinstance(res, ICaughtException):
+        colored_print(
+            f"Effective tags could not be refreshed, run `kendo init` to update the config database. {res.message}",
+            level="warning",
+        )
+        return
+    factory.backend_connection.execute_multi_row_insert(
+        factory.multi_row_insert(
+            table=DIRECT_TAGS_LOAD_TABLE,
+            columns=["obj_type", "object_id", "tag_id", "value"],
+        ),
+        [(*key, value) for key, value in direct_tags.items()],
+    )
+
+    # the nearest source wins: column over table over schema over database
+    res = factory.backend_connection.execute_multi_stmts(
+        f"""BEGIN;
+DELETE FROM {EFFECTIVE_TAGS_TABLE} WHERE {_scope_predicate(scope_ids, include_account)};
+INSERT INTO {EFFECTIVE_TAGS_TABLE} (obj_type, object_id, database_id, tag_id, value, source_type, source_id)
+SELECT a.obj_type, a.object_id, a.database_id, d.tag_id, d.value, a.source_type, a.source_id
+FROM ({_ancestry_relation()}) a
+JOIN {DIRECT_TAGS_LOAD_TABLE} d ON d.obj_type = a.source_type AND d.object_id = a.source_id
+WHERE {_scope_predicate(scope_ids, include_account, alias="a.")}
+QUALIFY ROW_NUMBER() OVER (PARTITION BY a.obj_type, a.object_id, d.tag_id ORDER BY a.depth DESC) = 1;
+COMMIT;""",
+        abort_on_exception=False,
+    )
+    if isinstance(res, ICaughtException):
+        factory.backend_connection.execute("ROLLBACK;", abort_on_exception=False)
+        colored_print(
+            f"Effective tags could not be refreshed. {res.message}", level="warning"
+        )
+
+
+def show_tagged_objects(
+    tag: str, obj_type: TagableType, value: Optional[str] = None
+):
+    config_doc = get_kendo_config_or_raise_error()
+    factory = Factory(config_doc, role="SYSADMIN")
+
+    sql = f"""SELECT r.full_name, e.value, e.source_type
+    FROM {EFFECTIVE_TAGS_TABLE} e
+    JOIN kendo_db.config.tags t ON e.tag_id = t.id
+    JOIN ({RESOURCE_RELATIONS[f"snowflake.{obj_type.value}"]}) r ON r.id = e.object_id
+    WHERE t.name = ? AND e.obj_type = ?"""
+    sql_params: List[str] = [tag, obj_type.value]
+    if value is not None:
+        sql += " AND e.value = ?"
+        sql_params.append(value)
+    sql += " ORDER BY r.full_name"
+    for batch in factory.backend_connection.execute_in_batches(
+        sql, tuple(sql_params), batch_size=EFFECTIVE_TAGS_BATCH_SIZE
+    ):
+        for row in batch:
+            print_json(data=row)
+    factory.backend_connection.close_session()
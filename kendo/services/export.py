@@ -0,0 +1,165 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import typer
+
+from kendo.factory import Factory
+from kendo.schemas.enums import ExportFormat, Resources
+from kendo.services.common import get_kendo_config_or_raise_error
+from kendo.services.history import OBJ_HISTORY_TABLE
+from kendo.utils.rich import colored_print
+
+EXPORT_MAX_WORKERS = 4
+
+_INFRA = "kendo_db.infrastructure"
+
+_SCHEMA_PARENTS = f"""JOIN {_INFRA}.schema_objs s ON s.id = o.schema_id
+JOIN {_INFRA}.database_objs d ON d.id = s.database_id"""
+
+
+def _schema_object_sql(table: str) -> str:
+    return f"""SELECT o.*, s.name AS schema_name, d.name AS database_name
+FROM {_INFRA}.{table} o
+{_SCHEMA_PARENTS}"""
+
+
+# one query per resource, with ids of parent objects resolved to their names
+EXPORT_QUERIES = {
+    Resources.databases: f"SELECT o.* FROM {_INFRA}.database_objs o",
+    Resources.schemas: f"""SELECT o.*, d.name AS database_name
+FROM {_INFRA}.schema_objs o
+JOIN {_INFRA}.database_objs d ON d.id = o.database_id""",
+    Resources.tables: _schema_object_sql("table_objs"),
+    Resources.views: _schema_object_sql("view_objs"),
+    Resources.stages: _schema_object_sql("stage_objs"),
+    Resources.streams: _schema_object_sql("stream_objs"),
+    Resources.pipes: _schema_object_sql("pipe_objs"),
+    Resources.columns: f"""SELECT o.*, t.name AS table_name, s.name AS schema_name, d.name AS database_name
+FROM {_INFRA}.column_objs o
+JOIN {_INFRA}.table_objs t ON t.id = o.table_id
+JOIN {_INFRA}.schema_objs s ON s.id = t.schema_id
+JOIN {_INFRA}.database_objs d ON d.id = s.database_id""",
+    Resources.users: f"""SELECT o.*, owner.name AS owner_role_name, dflt.name AS default_role_name
+FROM {_INFRA}.user_objs o
+LEFT JOIN {_INFRA}.role_objs owner ON owner.id = o.owner_role_id
+LEFT JOIN {_INFRA}.role_objs dflt ON dflt.id = o.default_role_id""",
+    Resources.roles: f"SELECT o.* FROM {_INFRA}.role_objs o",
+    Resources.warehouses: f"""SELECT o.*, owner.name AS owner_role_name
+FROM {_INFRA}.warehouse_objs o
+LEFT JOIN {_INFRA}.role_objs owner ON owner.id = o.owner_role_id""",
+    Resources.grants_to_roles: f"""SELECT o.*,
+CASE o.granted_on
+    WHEN 'DATABASE' THEN d.name
+    WHEN 'SCHEMA' THEN sd.name || '.' || s.name
+    WHEN 'TABLE' THEN td.name || '.' || ts.name || '.' || t.name
+END AS granted_on_name,
+r.name AS granted_to_name
+FROM {_INFRA}.grants_privilege_objs o
+LEFT JOIN {_INFRA}.database_objs d ON o.granted_on = 'DATABASE' AND d.id = o.granted_on_id
+LEFT JOIN {_INFRA}.schema_objs s ON o.granted_on = 'SCHEMA' AND s.id = o.granted_on_id
+LEFT JOIN {_INFRA}.database_objs sd ON sd.id = s.database_id
+LEFT JOIN {_INFRA}.table_objs t ON o.granted_on = 'TABLE' AND t.id = o.granted_on_id
+LEFT JOIN {_INFRA}.schema_objs ts ON ts.id = t.schema_id
+LEFT JOIN {_INFRA}.database_objs td ON td.id = ts.database_id
+LEFT JOIN {_INFRA}.role_objs r ON r.id = o.granted_to_id""",
+    Resources.role_grants: f"""SELECT o.*, r.name AS role_name,
+CASE o.granted_to
+    WHEN 'ROLE' THEN gr.name
+    WHEN 'USER' THEN gu.login_name
+END AS granted_to_name,
+gb.name AS granted_by_role_name
+FROM {_INFRA}.grants_role_objs o
+LEFT JOIN {_INFRA}.role_objs r ON r.id = o.role_id
+LEFT JOIN {_INFRA}.role_objs gr ON o.granted_to = 'ROLE' AND gr.id = o.granted_to_id
+LEFT JOIN {_INFRA}.user_objs gu ON o.granted_to = 'USER' AND gu.id = o.granted_to_id
+LEFT JOIN {_INFRA}.role_objs gb ON gb.id = o.granted_by_role_id""",
+}
+
+
+
+def _export_sql(resource: Resources) -> str:
+    # scanners keep the rows of dropped objects, history tells them apart: an
+    # object is dropped once none of its versions is open
+    return f"""SELECT q.*, dropped.object_id IS NOT NULL AS is_dropped
+FROM ({EXPORT_QUERIES[resource]}) q
+LEFT JOIN (
+    SELECT object_id FROM {OBJ_HISTORY_TABLE} WHERE resource = '{resource.value}'
+    GROUP BY object_id HAVING COUNT_IF(valid_to IS NULL) = 0
+) dropped ON dropped.object_id = q.id"""
+
+
+def _prepare_dir(resource_dir: Path, export_format: ExportFormat):
+    # stale parts of an earlier export would be read as part of this one
+    resource_dir.mkdir(parents=True, exist_ok=True)
+    for path in resource_dir.glob(f"part-*.{export_format.value}"):
+        os.remove(path)
+
+
+def _export_resource(
+    config_doc: dict, resource: Resources, out_dir: Path, export_format: ExportFormat
+) -> Tuple[Resources, int, int]:
+    # every Arrow chunk Snowflake returns becomes one part file, so memory stays
+    # at a chunk whatever the table size
+    import pyarrow.parquet as pq
+
+    resource_dir = out_dir / resource.value
+    _prepare_dir(resource_dir, export_format)
+    factory = Factory(config_doc, role="SYSADMIN")
+    files = 0
+    rows = 0
+    for batch in factory.backend_connection.execute_arrow_batches(
+        _export_sql(resource)
+    ):
+        if batch.num_rows == 0:
+            continue
+        batch = batch.rename_columns([name.lower() for name in batch.column_names])
+        path = resource_dir / f"part-{files:05d}.{export_format.value}"
+        if export_format == ExportFormat.parquet:
+            pq.write_table(batch, path)
+        else:
+            with open(path, "w") as f:
+                for row in batch.to_pylist():
+                    f.write(json.dumps(row, default=str) + "\n")
+        files += 1
+        rows += batch.num_rows
+    factory.backend_connection.close_session()
+    return resource, files, rows
+
+
+def export_inventory(
+    out_dir: Path,
+    export_format: ExportFormat = ExportFormat.parquet,
+    resources: Optional[List[Resources]] = None,
+):
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        colored_print(
+            "Export needs pyarrow, install it with `pip install 'snowflake-connector-python[pandas]'`.",
+            level="error",
+        )
+        raise typer.Abort()
+    if not resources or Resources.all in resources:
+        resources = list(EXPORT_QUERIES)
+
+    config_doc = get_kendo_config_or_raise_error()
+    # each object type streams on its own session
+    with ThreadPoolExecutor(
+        max_workers=min(EXPORT_MAX_WORKERS, len(resources))
+    ) as executor:
+        results = list(
+            executor.map(
+                lambda resource: _export_resource(
+                    config_doc, resource, out_dir, export_format
+                ),
+                resources,
+            )
+        )
+    for resource, files, rows in results:
+        colored_print(
+            f"Exported {rows} {resource.value} to {files} file(s) in {out_dir / resource.value}",
+            level="success",
+        )
@@ -0,0 +1,224 @@
+import json
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Set
+
+import typer
+from rich import print_json
+
+from kendo.factory import Factory
+from kendo.schemas.common import ICaughtException
+from kendo.schemas.enums import Resources
+from kendo.services.common import get_kendo_config_or_raise_error
+from kendo.utils.rich import colored_print
+
+OBJ_HISTORY_TABLE = "kendo_db.history.obj_history"
+SCAN_SNAPSHOT_TABLE = "kendo_db.history.scan_snapshot"
+MISSING_OBJS_LOAD_TABLE = "kendo_db.history.missing_objs_load"
+PENDING_MISSING_OBJS_TABLE = "kendo_db.history.pending_missing_objs"
+HISTORY_BATCH_SIZE = 10000
+
+_INFRA = "kendo_db.infrastructure"
+
+# inventory table behind each scanned resource
+RESOURCE_TABLES = {
+    Resources.databases: "database_objs",
+    Resources.schemas: "schema_objs",
+    Resources.tables: "table_objs",
+    Resources.views: "view_objs",
+    Resources.columns: "column_objs",
+    Resources.users: "user_objs",
+    Resources.roles: "role_objs",
+    Resources.grants_to_roles: "grants_privilege_objs",
+    Resources.role_grants: "grants_role_objs",
+    Resources.warehouses: "warehouse_objs",
+    Resources.stages: "stage_objs",
+    Resources.streams: "stream_objs",
+    Resources.pipes: "pipe_objs",
+}
+
+# columns scans refresh on every run, left out of versions so that a login
+# does not open a new version of its user
+VOLATILE_COLUMNS = {
+    Resources.users: ["last_success_login"],
+}
+
+# ids of mapped objects a scan could no longer find in Snowflake, per resource
+_missing_objs: Dict[Resources, Set[int]] = {}
+
+
+def record_missing_objs(resource: Resources, objs: List[dict]):
+    # called by scanners, missing objects are closed in history as dropped
+    _missing_objs.setdefault(resource, set()).update(obj["ID"] for obj in objs)
+
+
+def flush_missing_objs(factory: Factory, resources: List[Resources]):
+    # shard workers hand the objects they could not find to the final step,
+    # which records history once every shard is done; a row without an
+    # object_id marks its resource as scanned, even when nothing went missing
+    rows = [(resource.value, None) for resource in resources] + [
+        (resource.value, obj_id)
+        for resource in resources
+        for obj_id in sorted(_missing_objs.pop(resource, set()))
+    ]
+    factory.backend_connection.execute_insert(
+        factory.multi_row_insert(
+            table=PENDING_MISSING_OBJS_TABLE, columns=["resource", "object_id"]
+        ),
+        rows,
+    )
+
+
+def collect_missing_objs(factory: Factory) -> Set[Resources]:
+    # returns the resources the shard steps scanned
+    rows = factory.backend_connection.execute(
+        factory.select(table=PENDING_MISSING_OBJS_TABLE).generate_statement()
+    )
+    scanned = set()
+    for row in rows:
+        resource = Resources(row["RESOURCE"])
+        scanned.add(resource)
+        if row["OBJECT_ID"] is None:
+            continue
+        _missing_objs.setdefault(resource, set()).add(row["OBJECT_ID"])
+    factory.backend_connection.execute(f"DELETE FROM {PENDING_MISSING_OBJS_TABLE};")
+    return scanned
+
+
+def _versioned_table_sql(resource: Resources) -> str:
+    table = f"{_INFRA}.{RESOURCE_TABLES[resource]}"
+    if resource not in VOLATILE_COLUMNS:
+        return table
+    return f"(SELECT * EXCLUDE ({', '.join(VOLATILE_COLUMNS[resource])}) FROM {table})"
+
+
+def _live_snapshot_sql(
+    resources: List[Resources], where: Optional[Callable[[Resources], str]] = None
+) -> str:
+    # the inventory tables as they are now, in the shape of obj_history
+    return "\nUNION ALL\n".join(
+        f"""SELECT '{resource.value}' AS resource, id AS object_id,
+        OBJECT_CONSTRUCT(*) AS attributes, HASH(*) AS row_hash
+        FROM {_versioned_table_sql(resource)}"""
+        + (f"\n        WHERE {where(resource)}" if where else "")
+        for resource in resources
+    )
+
+
+def record_history(factory: Factory, resources: List[Resources]):
+    # one snapshot of the scanned resources is diffed against the open versions:
+    # changed and dropped objects get valid_to, new and changed ones a new version
+    missing_rows = [
+        (resource.value, obj_id)
+        for resource in resources
+        for obj_id in sorted(_missing_objs.pop(resource, set()))
+    ]
+    res = factory.backend_connection.execute(
+        f"CREATE OR REPLACE TEMPORARY TABLE {MISSING_OBJS_LOAD_TABLE} \
+        (resource VARCHAR(255), object_id INT);",
+        abort_on_exception=False,
+    )
+    if isinstance(res, ICaughtException):
+        colored_print(
+            f"Inventory history could not be recorded, run `kendo init` to update the config database. {res.message}",
+            level="warning",
+        )
+        return
+    factory.backend_connection.execute_insert(
+        factory.multi_row_insert(
+            table=MISSING_OBJS_LOAD_TABLE, columns=["resource", "object_id"]
+        ),
+        missing_rows,
+    )
+
+    snapshot = _live_snapshot_sql(
+        resources,
+        where=lambda resource: f"id NOT IN (SELECT object_id FROM {MISSING_OBJS_LOAD_TABLE} WHERE resource = '{resource.value}')",
+    )
+    scanned = ", ".join(f"'{resource.value}'" for resource in resources)
+    res = factory.backend_connection.execute_multi_stmts(
+        f"""SET kendo_scan_ts = CURRENT_TIMESTAMP()::TIMESTAMP_LTZ;
+CREATE OR REPLACE TEMPORARY TABLE {SCAN_SNAPSHOT_TABLE} AS
+{snapshot};
+BEGIN;
+UPDATE {OBJ_HISTORY_TABLE} h SET valid_to = $kendo_scan_ts
+WHERE h.valid_to IS NULL AND h.resource IN ({scanned})
+AND NOT EXISTS (
+    SELECT 1 FROM {SCAN_SNAPSHOT_TABLE} s
+    WHERE s.resource = h.resource AND s.object_id = h.object_id AND s.row_hash = h.row_hash
+);
+INSERT INTO {OBJ_HISTORY_TABLE} (resource, object_id, attributes, row_hash, valid_from, valid_to)
+SELECT s.resource, s.object_id, s.attributes, s.row_hash, $kendo_scan_ts, NULL
+FROM {SCAN_SNAPSHOT_TABLE} s
+WHERE NOT EXISTS (
+    SELECT 1 FROM {OBJ_HISTORY_TABLE} h
+    WHERE h.valid_to IS NULL AND h.resource = s.resource
+    AND h.object_id = s.object_id AND h.row_hash = s.row_hash
+);
+COMMIT;""",
+        abort_on_exception=False,
+    )
+    if isinstance(res, ICaughtException):
+        factory.backend_connection.execute("ROLLBACK;", abort_on_exception=False)
+        colored_print(
+            f"Inventory history could not be recorded. {res.message}", level="warning"
+        )
+
+
+def _print_versions(factory: Factory, sql: str, sql_params: tuple):
+    for batch in factory.backend_connection.execute_in_batches(
+        sql, sql_params, batch_size=HISTORY_BATCH_SIZE
+    ):
+        for row in batch:
+            print_json(
+                data={
+                    "object_id": row["OBJECT_ID"],
+                    "valid_from": row["VALID_FROM"],
+                    "valid_to": row["VALID_TO"],
+                    "attributes": json.loads(row["ATTRIBUTES"]),
+                },
+                default=str,
+            )
+
+
+def show_inventory_as_of(resource: Resources, as_of: datetime):
+    # valid_from is the leading validity clustering column, so the range
+    # predicate prunes every micro-partition of versions created after as_of
+    config_doc = get_kendo_config_or_raise_error()
+    factory = Factory(config_doc, role="SYSADMIN")
+    _print_versions(
+        factory,
+        f"""SELECT object_id, attributes, valid_from, valid_to FROM {OBJ_HISTORY_TABLE}
+        WHERE resource = ? AND valid_from <= ? AND (valid_to IS NULL OR valid_to > ?)
+        ORDER BY object_id""",
+        (
+            resource.value,
+            ("TIMESTAMP_LTZ", as_of),
+            ("TIMESTAMP_LTZ", as_of),
+        ),
+    )
+    factory.backend_connection.close_session()
+
+
+def show_object_history(resource: Resources, object_id: int):
+    config_doc = get_kendo_config_or_raise_error()
+    factory = Factory(config_doc, role="SYSADMIN")
+    _print_versions(
+        factory,
+        f"""SELECT object_id, attributes, valid_from, valid_to FROM {OBJ_HISTORY_TABLE}
+        WHERE resource = ? AND object_id = ?
+        ORDER BY valid_from""",
+        (resource.value, object_id),
+    )
+    factory.backend_connection.close_session()
+
+
+def show_history(
+    resource: Resources, as_of: Optional[datetime] = None, object_id: Optional[int] = None
+):
+    if resource == Resources.all:
+        colored_print("History is queried one resource type at a time.", level="error")
+        raise typer.Abort()
+    if object_id is not None:
+        show_object_history(resource, object_id)
+    else:
+        show_inventory_as_of(resource, as_of or datetime.now().astimezone())
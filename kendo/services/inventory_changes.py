@@ -0,0 +1,41 @@
+from typing import Dict, List, Sequence
+
+# attributes Snowflake can change on an object without renaming it, per
+# inventory table; the natural key is what scanners match objects by
+MUTABLE_ATTRIBUTES: Dict[str, Sequence[str]] = {
+    "user_objs": [
+        "last_success_login",
+        "email",
+        "owner_role_id",
+        "default_role_id",
+        "ext_authn_uid",
+        "is_ext_authn_duo",
+    ],
+    "warehouse_objs": ["type", "size", "owner_role_id"],
+}
+
+
+def changed_objs(
+    objs_in_sf: List[dict], objs_in_kendo_by_key: Dict[str, dict], key: str, table: str
+) -> List[dict]:
+    # scanned objects have lower-case keys, rows read back from kendo upper-case ones
+    attributes = MUTABLE_ATTRIBUTES[table]
+    return [
+        obj
+        for obj in objs_in_sf
+        if obj[key] in objs_in_kendo_by_key
+        and any(
+            obj[attribute] != objs_in_kendo_by_key[obj[key]][attribute.upper()]
+            for attribute in attributes
+        )
+    ]
+
+
+def merge_changed_objs_sql(table: str, load_table: str, key: str) -> str:
+    # rows are updated in place, history then closes the old version by hash
+    assignments = ", ".join(
+        f"{attribute} = s.{attribute}" for attribute in MUTABLE_ATTRIBUTES[table]
+    )
+    return f"""MERGE INTO kendo_db.infrastructure.{table} t
+USING {load_table} s ON t.{key} = s.{key}
+WHEN MATCHED THEN UPDATE SET {assignments};"""
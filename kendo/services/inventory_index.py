@@ -0,0 +1,154 @@
+from typing import Dict, Optional, Set, Tuple
+
+from kendo.factory import Factory
+from kendo.schemas.enums import TagableType
+from kendo.utils.sql import quote_identifier
+
+INVENTORY_INDEX_BATCH_SIZE = 50000
+
+_INFRA = "kendo_db.infrastructure"
+
+# fully resolved name parts of every scanned object, one query per tagable type
+_PATH_QUERIES = {
+    TagableType.USER: f"SELECT id, login_name AS p1 FROM {_INFRA}.user_objs",
+    TagableType.ROLE: f"SELECT id, name AS p1 FROM {_INFRA}.role_objs",
+    TagableType.DATABASE: f"SELECT id, name AS p1 FROM {_INFRA}.database_objs",
+    TagableType.SCHEMA: f"""SELECT o.id, d.name AS p1, o.name AS p2
+    FROM {_INFRA}.schema_objs o
+    JOIN {_INFRA}.database_objs d ON o.database_id = d.id""",
+    TagableType.TABLE: f"""SELECT o.id, d.name AS p1, s.name AS p2, o.name AS p3
+    FROM {_INFRA}.table_objs o
+    JOIN {_INFRA}.schema_objs s ON o.schema_id = s.id
+    JOIN {_INFRA}.database_objs d ON s.database_id = d.id""",
+    TagableType.VIEW: f"""SELECT o.id, d.name AS p1, s.name AS p2, o.name AS p3
+    FROM {_INFRA}.view_objs o
+    JOIN {_INFRA}.schema_objs s ON o.schema_id = s.id
+    JOIN {_INFRA}.database_objs d ON s.database_id = d.id""",
+    TagableType.COLUMN: f"""SELECT o.id, d.name AS p1, s.name AS p2, t.name AS p3, o.name AS p4
+    FROM {_INFRA}.column_objs o
+    JOIN {_INFRA}.table_objs t ON o.table_id = t.id
+    JOIN {_INFRA}.schema_objs s ON t.schema_id = s.id
+    JOIN {_INFRA}.database_objs d ON s.database_id = d.id""",
+}
+# name of the database each path lies in, for indexes scoped to some databases
+_PATH_DATABASE_COLUMNS = {
+    TagableType.DATABASE: "name",
+    TagableType.SCHEMA: "d.name",
+    TagableType.TABLE: "d.name",
+    TagableType.VIEW: "d.name",
+    TagableType.COLUMN: "d.name",
+}
+_PATH_LENGTHS = {
+    TagableType.USER: 1,
+    TagableType.ROLE: 1,
+    TagableType.DATABASE: 1,
+    TagableType.SCHEMA: 2,
+    TagableType.TABLE: 3,
+    TagableType.VIEW: 3,
+    TagableType.COLUMN: 4,
+}
+
+# only kept by long-running processes (`kendo serve`), keyed by connection name
+_warm_paths: Dict[str, Dict[TagableType, Dict[Tuple[str, ...], int]]] = {}
+_keep_warm = False
+
+
+def keep_inventory_index_warm():
+    global _keep_warm
+    _keep_warm = True
+
+
+def invalidate_inventory_index():
+    # called after scans, which can add, rename or remove objects
+    _warm_paths.clear()
+
+
+def split_object_path(path: str) -> Tuple[str, ...]:
+    # resolve a path the way Snowflake resolves identifiers: unquoted parts are
+    # upper-cased, quoted parts are kept as-is with "" unescaped
+    parts = []
+    current = []
+    quoted = False
+    was_quoted = False
+    i = 0
+    while i < len(path):
+        c = path[i]
+        if quoted:
+            if c == '"':
+                if i + 1 < len(path) and path[i + 1] == '"':
+                    current.append('"')
+                    i += 1
+                else:
+                    quoted = False
+            else:
+                current.append(c)
+        elif c == '"':
+            quoted = True
+            was_quoted = True
+        elif c == ".":
+            part = "".join(current)
+            parts.append(part if was_quoted else part.strip().upper())
+            current = []
+            was_quoted = False
+        else:
+            current.append(c)
+        i += 1
+    part = "".join(current)
+    parts.append(part if was_quoted else part.strip().upper())
+    return tuple(parts)
+
+
+def canonical_object_path(path: str) -> str:
+    # the form tag assignments are stored in, every resolved part quoted
+    return ".".join(quote_identifier(part) for part in split_object_path(path))
+
+
+class InventoryPathIndex:
+    factory: Factory
+    database_names: Optional[Set[str]]
+    paths: Dict[TagableType, Dict[Tuple[str, ...], int]]
+
+    def __init__(self, factory: Factory, database_names: Optional[Set[str]] = None):
+        # with database_names, objects under other databases are left out;
+        # users and roles are always indexed
+        self.factory = factory
+        self.database_names = database_names
+        self.paths = (
+            _warm_paths.setdefault(factory.backend_connection.connection_name, {})
+            if _keep_warm and database_names is None
+            else {}
+        )
+
+    def _load(self, obj_type: TagableType) -> Dict[Tuple[str, ...], int]:
+        # each type is loaded once, the first time a path of that type is checked
+        if obj_type not in self.paths:
+            columns = [f"P{i + 1}" for i in range(_PATH_LENGTHS[obj_type])]
+            sql = _PATH_QUERIES[obj_type]
+            sql_params = None
+            database_column = _PATH_DATABASE_COLUMNS.get(obj_type)
+            if self.database_names is not None and database_column:
+                if not self.database_names:
+                    self.paths[obj_type] = {}
+                    return self.paths[obj_type]
+                sql += f" WHERE {database_column} IN ({', '.join(['?'] * len(self.database_names))})"
+                sql_params = tuple(sorted(self.database_names))
+            paths = {}
+            for batch in self.factory.backend_connection.execute_in_batches(
+                sql, sql_params, batch_size=INVENTORY_INDEX_BATCH_SIZE
+            ):
+                paths.update(
+                    (tuple(row[column] for column in columns), row["ID"])
+                    for row in batch
+                )
+            self.paths[obj_type] = paths
+        return self.paths[obj_type]
+
+    def get_paths(self, obj_type: TagableType) -> Dict[Tuple[str, ...], int]:
+        return self._load(obj_type)
+
+    def get_id(self, obj_type: TagableType, path: str) -> Optional[int]:
+        return self._load(obj_type).get(split_object_path(path))
+
+    def exists(self, obj_type: TagableType, path: str) -> bool:
+        return split_object_path(path) in self._load(obj_type)
+
@@ -0,0 +1,310 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+import typer
+from rich import print
+
+from kendo.factory import Factory
+from kendo.schemas.common import ICaughtException
+from kendo.schemas.enums import TagableType
+from kendo.schemas.policy import IPolicy, IPolicyResult, IPolicyViolation
+from kendo.services.common import get_kendo_config_or_raise_error
+from kendo.services.policy_actions import (
+    DEFAULT_MAX_CONCURRENT_SCRIPTS,
+    execute_remediation,
+    generate_remediation_statements,
+    print_remediation_summary,
+)
+from kendo.services.test import load_yml_file
+from kendo.utils.rich import colored_print
+
+MAX_CONCURRENT_POLICIES = 8
+
+_INFRA = "kendo_db.infrastructure"
+
+# each resource type is exposed as one relation with an ID and a FULL_NAME, so
+# a policy's filters become a single WHERE clause over every object of that type
+_SCHEMA_CHILD_RELATION = f"""SELECT o.id, o.name, d.name || '.' || s.name || '.' || o.name AS full_name,
+    o.obj_created_on, s.name AS schema_name, d.name AS database_name
+    FROM {_INFRA}.{{table}} o
+    JOIN {_INFRA}.schema_objs s ON o.schema_id = s.id
+    JOIN {_INFRA}.database_objs d ON s.database_id = d.id"""
+
+RESOURCE_RELATIONS: Dict[str, str] = {
+    "snowflake.database": f"""SELECT o.id, o.name, o.name AS full_name, o.obj_created_on
+    FROM {_INFRA}.database_objs o""",
+    "snowflake.schema": f"""SELECT o.id, o.name, d.name || '.' || o.name AS full_name,
+    o.obj_created_on, d.name AS database_name
+    FROM {_INFRA}.schema_objs o
+    JOIN {_INFRA}.database_objs d ON o.database_id = d.id""",
+    "snowflake.table": _SCHEMA_CHILD_RELATION.format(table="table_objs"),
+    "snowflake.view": _SCHEMA_CHILD_RELATION.format(table="view_objs"),
+    "snowflake.stage": _SCHEMA_CHILD_RELATION.format(table="stage_objs"),
+    "snowflake.stream": _SCHEMA_CHILD_RELATION.format(table="stream_objs"),
+    "snowflake.pipe": _SCHEMA_CHILD_RELATION.format(table="pipe_objs"),
+    "snowflake.column": f"""SELECT o.id, o.name,
+    d.name || '.' || s.name || '.' || t.name || '.' || o.name AS full_name,
+    o.obj_created_on, t.name AS table_name, s.name AS schema_name, d.name AS database_name
+    FROM {_INFRA}.column_objs o
+    JOIN {_INFRA}.table_objs t ON o.table_id = t.id
+    JOIN {_INFRA}.schema_objs s ON t.schema_id = s.id
+    JOIN {_INFRA}.database_objs d ON s.database_id = d.id""",
+    "snowflake.role": f"""SELECT o.id, o.name, o.name AS full_name, o.obj_created_on
+    FROM {_INFRA}.role_objs o""",
+    "snowflake.user": f"""SELECT o.id, o.login_name AS name, o.login_name AS full_name,
+    o.obj_created_on, o.last_success_login, o.email, o.ext_authn_uid, o.is_ext_authn_duo,
+    owner.name AS owner, default_role.name AS default_role
+    FROM {_INFRA}.user_objs o
+    LEFT JOIN {_INFRA}.role_objs owner ON o.owner_role_id = owner.id
+    LEFT JOIN {_INFRA}.role_objs default_role ON o.default_role_id = default_role.id""",
+    "snowflake.warehouse": f"""SELECT o.id, o.name, o.name AS full_name, o.obj_created_on,
+    o.type, o.size, owner.name AS owner
+    FROM {_INFRA}.warehouse_objs o
+    LEFT JOIN {_INFRA}.role_objs owner ON o.owner_role_id = owner.id""",
+}
+
+# columns of each relation holding the name parts of full_name, outermost first;
+# names can contain dots, so full_name can't be split back into them
+NAME_PART_COLUMNS: Dict[str, List[str]] = {
+    "snowflake.database": ["name"],
+    "snowflake.schema": ["database_name", "name"],
+    "snowflake.table": ["database_name", "schema_name", "name"],
+    "snowflake.view": ["database_name", "schema_name", "name"],
+    "snowflake.stage": ["database_name", "schema_name", "name"],
+    "snowflake.stream": ["database_name", "schema_name", "name"],
+    "snowflake.pipe": ["database_name", "schema_name", "name"],
+    "snowflake.column": ["database_name", "schema_name", "table_name", "name"],
+    "snowflake.role": ["name"],
+    "snowflake.user": ["name"],
+    "snowflake.warehouse": ["name"],
+}
+
+_COMPARISON_OPS = {
+    "eq": "=",
+    "ne": "<>",
+    "gt": ">",
+    "ge": ">=",
+    "lt": "<",
+    "le": "<=",
+    "like": "LIKE",
+    "not-like": "NOT LIKE",
+    "ilike": "ILIKE",
+    "not-ilike": "NOT ILIKE",
+}
+_identifier_pattern = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+_TAGABLE_RESOURCES = [tagable_type.value for tagable_type in TagableType]
+
+
+def _filter_error(policy: IPolicy, message: str):
+    colored_print(f"Policy '{policy.name}': {message}", level="error")
+    raise typer.Abort()
+
+
+def _compile_tag_filter(
+    policy: IPolicy, policy_filter: Dict[str, Any], params: List[Any]
+) -> str:
+    # matches on effective tags, so tags inherited from parent objects count too
+    obj_type = policy.resource.split(".", 1)[-1]
+    if obj_type not in _TAGABLE_RESOURCES:
+        _filter_error(policy, f"tag filters are not supported on '{policy.resource}'")
+    if not policy_filter.get("tag"):
+        _filter_error(policy, "tag filters need a 'tag'")
+    op = policy_filter.get("op", "eq" if "value" in policy_filter else "present")
+    params.extend([obj_type, policy_filter["tag"]])
+    subquery = """SELECT 1 FROM kendo_db.config.effective_tags e
+        JOIN kendo_db.config.tags t ON e.tag_id = t.id
+        WHERE e.obj_type = ? AND e.object_id = r.id AND t.name = ?"""
+    if op in ("eq", "ne"):
+        params.append(policy_filter.get("value"))
+        subquery += f" AND e.value {_COMPARISON_OPS[op]} ?"
+    elif op not in ("present", "absent"):
+        _filter_error(policy, f"unsupported tag filter op '{op}'")
+    negate = "NOT " if op == "absent" else ""
+    return f"{negate}EXISTS ({subquery})"
+
+
+def _compile_filter(
+    policy: IPolicy, policy_filter: Dict[str, Any], params: List[Any]
+) -> str:
+    # boolean blocks
+    for block, joiner in (("and", " AND "), ("or", " OR ")):
+        if block in policy_filter:
+            return (
+                "("
+                + joiner.join(
+                    _compile_filter(policy, f, params) for f in policy_filter[block]
+                )
+                + ")"
+            )
+    if "not" in policy_filter:
+        return (
+            "NOT ("
+            + " AND ".join(
+                _compile_filter(policy, f, params) for f in policy_filter["not"]
+            )
+            + ")"
+        )
+
+    filter_type = policy_filter.get("type", "value")
+    if filter_type == "sql":
+        if "where" in policy_filter:
+            return f"({policy_filter['where']})"
+        if "query" in policy_filter:
+            # objects named in the first column of the query are violations
+            key = policy_filter.get("key", "name")
+            if not _identifier_pattern.match(key):
+                _filter_error(policy, f"invalid filter key '{key}'")
+            query = policy_filter["query"].strip().rstrip(";")
+            return f"UPPER(r.{key}) IN (SELECT UPPER($1) FROM ({query}))"
+        _filter_error(policy, "sql filters need either 'where' or 'query'")
+
+    if filter_type == "tag":
+        return _compile_tag_filter(policy, policy_filter, params)
+
+    if filter_type != "value":
+        _filter_error(policy, f"unsupported filter type '{filter_type}'")
+
+    key = policy_filter.get("key")
+    if not key or not _identifier_pattern.match(key):
+        _filter_error(policy, f"invalid filter key '{key}'")
+    op = policy_filter.get("op", "eq")
+    value = policy_filter.get("value")
+    column = f"r.{key}"
+    if op == "absent":
+        return f"{column} IS NULL"
+    if op == "present":
+        return f"{column} IS NOT NULL"
+    if op in ("in", "not-in"):
+        if not isinstance(value, list) or not value:
+            _filter_error(policy, f"'{op}' filters need a non-empty list value")
+        params.extend(value)
+        negate = "NOT " if op == "not-in" else ""
+        return f"{column} {negate}IN ({', '.join(['?' for _ in value])})"
+    if op in ("regex", "not-regex"):
+        params.append(value)
+        negate = "NOT " if op == "not-regex" else ""
+        return f"{negate}REGEXP_LIKE({column}, ?)"
+    if op not in _COMPARISON_OPS:
+        _filter_error(policy, f"unsupported filter op '{op}'")
+    params.append(value)
+    return f"{column} {_COMPARISON_OPS[op]} ?"
+
+
+def compile_policy(policy: IPolicy) -> Tuple[str, tuple]:
+    if policy.resource not in RESOURCE_RELATIONS:
+        _filter_error(policy, f"unsupported resource '{policy.resource}'")
+    params: List[Any] = []
+    predicates = [_compile_filter(policy, f, params) for f in policy.filters]
+    name_parts = ", ".join(
+        f"r.{column} AS part_{i}"
+        for i, column in enumerate(NAME_PART_COLUMNS[policy.resource])
+    )
+    sql = f"SELECT r.id, r.full_name, {name_parts} FROM ({RESOURCE_RELATIONS[policy.resource]}) r"
+    if predicates:
+        sql += f" WHERE {' AND '.join(predicates)}"
+    sql += " ORDER BY r.full_name"
+    return sql, tuple(params)
+
+
+def evaluate_policy(factory: Factory, policy: IPolicy) -> IPolicyResult:
+    sql, params = compile_policy(policy)
+    res = factory.backend_connection.execute(
+        sql, params or None, abort_on_exception=False
+    )
+    if isinstance(res, ICaughtException):
+        return IPolicyResult(
+            policy=policy.name, resource=policy.resource, error=res.message
+        )
+    assert isinstance(res, list)
+    return IPolicyResult(
+        policy=policy.name,
+        resource=policy.resource,
+        violations=[
+            IPolicyViolation(
+                id=row["ID"],
+                full_name=row["FULL_NAME"],
+                name_parts=[
+                    row[f"PART_{i}"]
+                    for i in range(len(NAME_PART_COLUMNS[policy.resource]))
+                ],
+            )
+            for row in res
+        ],
+    )
+
+
+def _run_alert_actions(policy: IPolicy, result: IPolicyResult):
+    for action in policy.actions:
+        if action.get("type") == "alert" and result.violations:
+            message = action.get("message", "Policy violations detected: {{result}}")
+            colored_print(
+                message.replace(
+                    "{{result}}", ", ".join(v.full_name for v in result.violations)
+                ),
+                level="warning",
+            )
+
+
+def list_policies(file_path: str = "sample/kendo.yml") -> List[IPolicy]:
+    config = load_yml_file(file_path)
+    return [IPolicy.model_validate(policy) for policy in config.get("policies", [])]
+
+
+def run_policies(
+    file_path: str = "sample/kendo.yml",
+    remediate: bool = False,
+    dry_run: bool = False,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENT_SCRIPTS,
+):
+    policies = list_policies(file_path)
+    # compile everything up front so a bad policy aborts before any query runs
+    for policy in policies:
+        compile_policy(policy)
+
+    config_doc = get_kendo_config_or_raise_error()
+    factory = Factory(config_doc, role="SYSADMIN")
+
+    with ThreadPoolExecutor(
+        max_workers=max(1, min(len(policies), MAX_CONCURRENT_POLICIES))
+    ) as executor:
+        results = list(
+            executor.map(lambda policy: evaluate_policy(factory, policy), policies)
+        )
+
+    for policy, result in zip(policies, results):
+        colored_print("----------------------------------------------------------------")
+        if result.error:
+            colored_print(f"Policy error: {policy.name} ", level="error")
+            colored_print(result.error, level="error")
+        elif result.violations:
+            colored_print(
+                f"Policy violated: {policy.name} ({len(result.violations)} {policy.resource} object(s))",
+                level="error",
+            )
+            for violation in result.violations:
+                print(f"  {violation.full_name}")
+            _run_alert_actions(policy, result)
+        else:
+            colored_print(f"Policy passed: {policy.name} ", level="success")
+    colored_print("----------------------------------------------------------------")
+    factory.backend_connection.close_session()
+
+    if remediate or dry_run:
+        statements = [
+            statement
+            for policy, result in zip(policies, results)
+            for statement in generate_remediation_statements(policy, result)
+        ]
+        if not statements:
+            colored_print("No remediation actions to run.", level="info")
+        else:
+            outcomes = execute_remediation(
+                config_doc["datasource"]["connection_name"],
+                statements,
+                dry_run=dry_run,
+                max_concurrency=max_concurrency,
+            )
+            if not dry_run:
+                print_remediation_summary(outcomes)
+    return results
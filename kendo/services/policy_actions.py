@@ -0,0 +1,238 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+import typer
+from rich import print
+from snowflake.connector.errors import DatabaseError
+
+from kendo.datasource import SnowflakeDatasourceConnection
+from kendo.schemas.common import ICaughtException
+from kendo.schemas.policy import (
+    IPolicy,
+    IPolicyResult,
+    IRemediationOutcome,
+    IRemediationStatement,
+)
+from kendo.utils.rich import colored_print
+from kendo.utils.sql import quote_identifier, quote_literal
+
+DEFAULT_MAX_CONCURRENT_SCRIPTS = 4
+ACCOUNT_GROUP = "<account>"
+# kendo tags are mirrored as native tags in this schema
+NATIVE_TAG_DATABASE = "KENDO_DB"
+NATIVE_TAG_SCHEMA = "TAGS"
+
+_RESOURCE_OBJECT_TYPES = {
+    "snowflake.database": "DATABASE",
+    "snowflake.schema": "SCHEMA",
+    "snowflake.table": "TABLE",
+    "snowflake.view": "VIEW",
+    "snowflake.stage": "STAGE",
+    "snowflake.stream": "STREAM",
+    "snowflake.pipe": "PIPE",
+    "snowflake.role": "ROLE",
+    "snowflake.user": "USER",
+    "snowflake.warehouse": "WAREHOUSE",
+}
+_DATABASE_SCOPED_RESOURCES = [
+    "snowflake.database",
+    "snowflake.schema",
+    "snowflake.table",
+    "snowflake.view",
+    "snowflake.stage",
+    "snowflake.stream",
+    "snowflake.pipe",
+    "snowflake.column",
+]
+
+
+def _quote_name(name_parts: List[str]) -> str:
+    return ".".join(quote_identifier(part) for part in name_parts)
+
+
+def native_tag_name(tag: str) -> str:
+    return f"{NATIVE_TAG_DATABASE}.{NATIVE_TAG_SCHEMA}.{quote_identifier(tag)}"
+
+
+def _action_error(policy: IPolicy, message: str):
+    colored_print(f"Policy '{policy.name}': {message}", level="error")
+    raise typer.Abort()
+
+
+def _statement_for(
+    policy: IPolicy, action: dict, name_parts: List[str]
+) -> str | None:
+    action_type = action.get("type")
+    if action_type == "set-tag":
+        if "tag" not in action or "value" not in action:
+            _action_error(policy, "set-tag actions need 'tag' and 'value'")
+        tag = f"{native_tag_name(action['tag'])} = {quote_literal(action['value'])}"
+        if policy.resource == "snowflake.column":
+            return f"ALTER TABLE {_quote_name(name_parts[:-1])} MODIFY COLUMN {quote_identifier(name_parts[-1])} SET TAG {tag}"
+        return f"ALTER {_RESOURCE_OBJECT_TYPES[policy.resource]} {_quote_name(name_parts)} SET TAG {tag}"
+    if action_type == "revoke":
+        if "privilege" not in action or "from_role" not in action:
+            _action_error(policy, "revoke actions need 'privilege' and 'from_role'")
+        if policy.resource not in _RESOURCE_OBJECT_TYPES:
+            _action_error(policy, f"revoke is not supported on '{policy.resource}'")
+        return f"REVOKE {action['privilege']} ON {_RESOURCE_OBJECT_TYPES[policy.resource]} {_quote_name(name_parts)} FROM ROLE {quote_identifier(action['from_role'])}"
+    if action_type == "set-auto-suspend":
+        if policy.resource != "snowflake.warehouse":
+            _action_error(policy, "set-auto-suspend only applies to warehouses")
+        return f"ALTER WAREHOUSE {_quote_name(name_parts)} SET AUTO_SUSPEND = {int(action.get('seconds', 60))}"
+    # alerts and unknown actions don't produce statements
+    return None
+
+
+def generate_remediation_statements(
+    policy: IPolicy, result: IPolicyResult
+) -> List[IRemediationStatement]:
+    statements = []
+    for action in policy.actions:
+        role = action.get("role", "SYSADMIN")
+        for violation in result.violations:
+            statement = _statement_for(policy, action, violation.name_parts)
+            if statement is None:
+                break
+            group = (
+                violation.name_parts[0]
+                if policy.resource in _DATABASE_SCOPED_RESOURCES
+                else ACCOUNT_GROUP
+            )
+            statements.append(
+                IRemediationStatement(group=group, role=role, statement=statement)
+            )
+    return statements
+
+
+def group_statements(
+    statements: List[IRemediationStatement],
+) -> Dict[Tuple[str, str], List[str]]:
+    # one script per database (and role), in the order the statements were generated
+    groups: Dict[Tuple[str, str], List[str]] = {}
+    for statement in statements:
+        groups.setdefault((statement.group, statement.role), []).append(
+            statement.statement
+        )
+    return groups
+
+
+def _failed_outcomes(
+    group: str, statements: List[str], error: str
+) -> List[IRemediationOutcome]:
+    return [
+        IRemediationOutcome(group=group, statement=statement, status="failed", error=error)
+        for statement in statements
+    ]
+
+
+def _run_script(
+    snowflake_ds: SnowflakeDatasourceConnection,
+    group: str,
+    statements: List[str],
+) -> List[IRemediationOutcome]:
+    outcomes = []
+    pending = statements
+    while pending:
+        script = ";\n".join(pending) + ";"
+        done = 0
+        failure = None
+        for cur in snowflake_ds.execute_multi_stmts_in_order(script):
+            if isinstance(cur, ICaughtException):
+                failure = cur
+                break
+            done += 1
+        outcomes.extend(
+            IRemediationOutcome(group=group, statement=statement, status="success")
+            for statement in pending[:done]
+        )
+        if failure is None:
+            break
+        outcomes.append(
+            IRemediationOutcome(
+                group=group,
+                statement=pending[done],
+                status="failed",
+                error=failure.message,
+            )
+        )
+        # resume with the statements after the failed one
+        pending = pending[done + 1 :]
+    return outcomes
+
+
+def execute_remediation(
+    datasource_connection_name: str,
+    statements: List[IRemediationStatement],
+    dry_run: bool = False,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENT_SCRIPTS,
+) -> List[IRemediationOutcome]:
+    groups = group_statements(statements)
+    if dry_run:
+        outcomes = []
+        for (group, role), group_stmts in groups.items():
+            print(f"-- {group} (as {role})")
+            for statement in group_stmts:
+                print(f"{statement};")
+                outcomes.append(
+                    IRemediationOutcome(
+                        group=group, statement=statement, status="dry-run"
+                    )
+                )
+        return outcomes
+
+    # every worker thread keeps one session per role, logged in with that role
+    local = threading.local()
+    sessions: List[SnowflakeDatasourceConnection] = []
+    sessions_lock = threading.Lock()
+
+    def get_thread_session(role: str) -> SnowflakeDatasourceConnection:
+        if not hasattr(local, "sessions"):
+            local.sessions = {}
+        if role not in local.sessions:
+            local.sessions[role] = SnowflakeDatasourceConnection(
+                datasource_connection_name, role=role
+            )
+            with sessions_lock:
+                sessions.append(local.sessions[role])
+        return local.sessions[role]
+
+    def run_group(
+        item: Tuple[Tuple[str, str], List[str]]
+    ) -> List[IRemediationOutcome]:
+        (group, role), group_stmts = item
+        try:
+            snowflake_ds = get_thread_session(role)
+        except DatabaseError as e:
+            # e.g. the role isn't granted to the user, nothing in this script ran
+            return _failed_outcomes(group, group_stmts, str(e))
+        return _run_script(snowflake_ds, group, group_stmts)
+
+    outcomes: List[IRemediationOutcome] = []
+    try:
+        with ThreadPoolExecutor(
+            max_workers=max(1, min(len(groups), max_concurrency))
+        ) as executor:
+            for script_outcomes in executor.map(run_group, groups.items()):
+                outcomes.extend(script_outcomes)
+    finally:
+        for snowflake_ds in sessions:
+            snowflake_ds.close_session()
+    return outcomes
+
+
+def print_remediation_summary(outcomes: List[IRemediationOutcome]):
+    succeeded = [o for o in outcomes if o.status == "success"]
+    failed = [o for o in outcomes if o.status == "failed"]
+    if succeeded:
+        colored_print(
+            f"{len(succeeded)} remediation statement(s) executed successfully.",
+            level="success",
+        )
+    if failed:
+        colored_print(
+            f"{len(failed)} remediation statement(s) failed.", level="error"
+        )
+        for outcome in failed:
+            print(outcome.model_dump())
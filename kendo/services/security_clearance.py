@@ -1,5 +1,12 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
 from rich import print
 from kendo.datasource import SnowflakeDatasourceConnection
+from kendo.utils.sql import quote_identifier
+
+MAX_CONCURRENT_SHOW_GRANTS = 8
 
 REQUIRED_GRANTS = [
     {
@@ -17,6 +24,97 @@ REQUIRED_GRANTS = [
 ]
 
 
+class ClearanceChecker:
+    # walks the role hierarchy of the user in session, one level at a time with
+    # the SHOW GRANTS of a level run in parallel; grants are memoised per role
+    snowflake_ds: SnowflakeDatasourceConnection
+    max_concurrency: int
+    user_roles: Optional[List[str]]
+    role_grants: Dict[str, List[dict]]
+
+    def __init__(
+        self,
+        snowflake_ds: SnowflakeDatasourceConnection,
+        max_concurrency: int = MAX_CONCURRENT_SHOW_GRANTS,
+    ):
+        self.snowflake_ds = snowflake_ds
+        self.max_concurrency = max_concurrency
+        self.user_roles = None
+        self.role_grants = {}
+        self._lock = threading.Lock()
+
+    def get_user_roles(self) -> List[str]:
+        if self.user_roles is None:
+            res = self.snowflake_ds.execute(
+                f"SHOW GRANTS TO USER {self.snowflake_ds.get_session().user}"
+            )
+            self.user_roles = [grant["role"] for grant in res] if isinstance(res, list) else []
+        return self.user_roles
+
+    def get_role_grants(self, role: str) -> List[dict]:
+        with self._lock:
+            if role in self.role_grants:
+                return self.role_grants[role]
+        res = self.snowflake_ds.execute(
+            f"SHOW GRANTS TO ROLE {quote_identifier(role)}", abort_on_exception=False
+        )
+        # roles we can't inspect simply contribute no grants
+        grants = res if isinstance(res, list) else []
+        with self._lock:
+            self.role_grants[role] = grants
+        return grants
+
+    def walk_roles(self) -> Iterator[Tuple[str, List[dict]]]:
+        # breadth-first, so callers can stop as soon as they have what they need
+        level = self.get_user_roles()
+        seen = set(level)
+        while level:
+            with ThreadPoolExecutor(
+                max_workers=max(1, min(len(level), self.max_concurrency))
+            ) as executor:
+                level_grants = list(executor.map(self.get_role_grants, level))
+            next_level = []
+            for role, grants in zip(level, level_grants):
+                yield role, grants
+                for grant in grants:
+                    if grant["granted_on"] == "ROLE" and grant["privilege"] == "USAGE":
+                        if grant["name"] not in seen:
+                            seen.add(grant["name"])
+                            next_level.append(grant["name"])
+            level = next_level
+
+    def missing_grants(self, required_grants: List[dict]) -> List[dict]:
+        missing = list(required_grants)
+        for _, grants in self.walk_roles():
+            missing = [
+                required_grant
+                for required_grant in missing
+                if not any(
+                    grant["privilege"] == required_grant["privilege"]
+                    and grant["granted_on"] == required_grant["granted_on"]
+                    for grant in grants
+                )
+            ]
+            if not missing:
+                break
+        return missing
+
+    def missing_roles(self, required_roles: List[str]) -> List[str]:
+        missing = [role for role in required_roles if role not in self.get_user_roles()]
+        if not missing:
+            return missing
+        for _, grants in self.walk_roles():
+            granted = {
+                grant["name"]
+                for grant in grants
+                if grant["granted_on"] == "ROLE" and grant["privilege"] == "USAGE"
+            }
+            missing = [role for role in missing if role not in granted]
+            if not missing:
+                break
+        return missing
+
+
 def show_session_details(connection_name: str):
     snowflake_ds = SnowflakeDatasourceConnection(connection_name)
 
@@ -37,25 +135,7 @@ def show_session_details(connection_name: str):
 
 def show_missing_grants(connection_name: str):
     snowflake_ds = SnowflakeDatasourceConnection(connection_name)
-    grants_to_user = snowflake_ds.execute(
-        f"SHOW GRANTS TO USER {snowflake_ds.get_session().user}"
-    )
-    user_roles = []
-    if isinstance(grants_to_user, list) and len(grants_to_user) > 0:
-        for i, grant in enumerate(grants_to_user):
-            user_roles.append(grant["role"])
-
-    missing_grants = REQUIRED_GRANTS
-    for role in user_roles:
-        grants_to_role = snowflake_ds.execute(f"SHOW GRANTS TO ROLE {role}")
-        if isinstance(grants_to_role, list) and len(grants_to_role) > 0:
-            for i, grant in enumerate(grants_to_role):
-                for required_grant in missing_grants:
-                    if (
-                        grant["privilege"] == required_grant["privilege"]
-                        and grant["granted_on"] == required_grant["granted_on"]
-                    ):
-                        missing_grants.remove(required_grant)
+    missing_grants = ClearanceChecker(snowflake_ds).missing_grants(REQUIRED_GRANTS)
 
     if len(missing_grants) == 0:
         print("User in session has all of the required grants")
@@ -0,0 +1,152 @@
+import json
+import os
+from typing import Dict, FrozenSet, List, Optional
+
+from kendo.factory import Factory
+from kendo.schemas.common import ICaughtException
+from kendo.services.common import get_kendo_local_path
+
+TAG_CATALOG_CACHE_FILE = "tag_catalog_{connection_name}.json"
+TAG_CATALOG_VERSION_TABLE = "kendo_db.config.tags_catalog_version"
+TAG_CATALOG_BATCH_SIZE = 5000
+
+
+class TagCatalog:
+    # version of kendo_db.config.tags_catalog_version the catalog was loaded at
+    version: Optional[int]
+    tag_ids: Dict[str, int]
+    allowed_values: Dict[int, FrozenSet[str]]
+
+    def __init__(
+        self,
+        version: Optional[int],
+        tag_ids: Dict[str, int],
+        allowed_values: Dict[int, FrozenSet[str]],
+    ):
+        self.version = version
+        self.tag_ids = tag_ids
+        self.allowed_values = allowed_values
+
+    def get_tag_id(self, name: str) -> Optional[int]:
+        return self.tag_ids.get(name)
+
+    def is_value_allowed(self, tag_id: int, value: str) -> bool:
+        # tags without allowed values accept any value
+        allowed_values = self.allowed_values.get(tag_id)
+        return not allowed_values or value in allowed_values
+
+    def to_json(self) -> dict:
+        return {
+            "version": self.version,
+            "tag_ids": self.tag_ids,
+            "allowed_values": {
+                str(tag_id): sorted(values)
+                for tag_id, values in self.allowed_values.items()
+            },
+        }
+
+    @classmethod
+    def from_json(cls, doc: dict) -> "TagCatalog":
+        return cls(
+            version=doc["version"],
+            tag_ids=doc["tag_ids"],
+            allowed_values={
+                int(tag_id): frozenset(values)
+                for tag_id, values in doc["allowed_values"].items()
+            },
+        )
+
+
+# in-process copies, keyed by connection name like the persisted ones
+_tag_catalogs: Dict[str, TagCatalog] = {}
+
+
+def _get_catalog_version(factory: Factory) -> Optional[int]:
+    res = factory.backend_connection.execute(
+        factory.select(
+            table=TAG_CATALOG_VERSION_TABLE, columns=["version"]
+        ).generate_statement(),
+        abort_on_exception=False,
+    )
+    # config database set up before the version table existed, nothing can be cached
+    if isinstance(res, ICaughtException):
+        return None
+    # no tag writes recorded yet
+    if not res:
+        return 0
+    return res[0]["VERSION"]
+
+
+def _load_tag_catalog(factory: Factory, version: Optional[int]) -> TagCatalog:
+    tag_ids: Dict[str, int] = {}
+    allowed_values: Dict[int, FrozenSet[str]] = {}
+    for batch in factory.backend_connection.execute_in_batches(
+        """SELECT t.id, t.name, ARRAY_AGG(v.value) AS allowed_values
+        FROM kendo_db.config.tags t
+        LEFT JOIN kendo_db.config.tags_allowed_values v ON v.tag_id = t.id
+        GROUP BY t.id, t.name""",
+        batch_size=TAG_CATALOG_BATCH_SIZE,
+    ):
+        for tag in batch:
+            tag_ids[tag["NAME"]] = tag["ID"]
+            values: List[str] = json.loads(tag["ALLOWED_VALUES"] or "[]")
+            if values:
+                allowed_values[tag["ID"]] = frozenset(values)
+    return TagCatalog(version, tag_ids, allowed_values)
+
+
+def _read_persisted_catalog(cache_path: str) -> Optional[TagCatalog]:
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with open(cache_path) as f:
+            return TagCatalog.from_json(json.load(f))
+    except (OSError, ValueError, KeyError):
+        # a corrupt cache is simply rebuilt
+        return None
+
+
+def _persist_catalog(cache_path: str, tag_catalog: TagCatalog):
+    tmp_path = cache_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(tag_catalog.to_json(), f)
+    os.replace(tmp_path, cache_path)
+
+
+def get_tag_catalog(factory: Factory, config_doc: dict) -> TagCatalog:
+    # one cheap version lookup decides whether the in-process or persisted copy is still valid
+    version = _get_catalog_version(factory)
+    if version is None:
+        return _load_tag_catalog(factory, version)
+    connection_name = factory.backend_connection.connection_name
+    tag_catalog = _tag_catalogs.get(connection_name)
+    if tag_catalog is not None and tag_catalog.version == version:
+        return tag_catalog
+
+    persist = config_doc.get("cache", {}).get("persist_tag_catalog", True)
+    cache_path = get_kendo_local_path(
+        TAG_CATALOG_CACHE_FILE.format(connection_name=connection_name)
+    )
+    if persist:
+        persisted = _read_persisted_catalog(cache_path)
+        if persisted is not None and persisted.version == version:
+            _tag_catalogs[connection_name] = persisted
+            return persisted
+
+    tag_catalog = _load_tag_catalog(factory, version)
+    _tag_catalogs[connection_name] = tag_catalog
+    if persist:
+        _persist_catalog(cache_path, tag_catalog)
+    return tag_catalog
+
+
+def invalidate_tag_catalog(factory: Factory):
+    # called after every write to tags or tags_allowed_values
+    _tag_catalogs.pop(factory.backend_connection.connection_name, None)
+    factory.backend_connection.execute(
+        f"""MERGE INTO {TAG_CATALOG_VERSION_TABLE} t
+        USING (SELECT 1 AS one) s ON TRUE
+        WHEN MATCHED THEN UPDATE SET t.version = t.version + 1
+        WHEN NOT MATCHED THEN INSERT (version) VALUES (1);""",
+        abort_on_exception=False,
+    )
@@ -0,0 +1,203 @@
+from typing import Dict, List, Tuple
+
+from rich import print
+
+from kendo.datasource import SnowflakeDatasourceConnection
+from kendo.factory import Factory
+from kendo.schemas.enums import TagableType
+from kendo.schemas.policy import IRemediationStatement
+from kendo.services.common import get_kendo_config_or_raise_error
+from kendo.services.inventory_index import InventoryPathIndex, split_object_path
+from kendo.services.policy_actions import (
+    ACCOUNT_GROUP,
+    NATIVE_TAG_DATABASE,
+    NATIVE_TAG_SCHEMA,
+    execute_remediation,
+    native_tag_name,
+    print_remediation_summary,
+)
+from kendo.services.tag_catalog import get_tag_catalog
+from kendo.utils.rich import colored_print
+from kendo.utils.sql import quote_identifier, quote_literal
+
+TAG_SYNC_BATCH_SIZE = 50000
+
+# TAG_REFERENCES reports views under the TABLE domain
+_TAGABLE_TYPE_DOMAINS = {
+    TagableType.USER: "USER",
+    TagableType.ROLE: "ROLE",
+    TagableType.DATABASE: "DATABASE",
+    TagableType.SCHEMA: "SCHEMA",
+    TagableType.TABLE: "TABLE",
+    TagableType.VIEW: "TABLE",
+    TagableType.COLUMN: "COLUMN",
+}
+
+# (domain, resolved object path, tag name)
+TagReferenceKey = Tuple[str, Tuple[str, ...], str]
+
+
+def _get_kendo_tag_references(
+    factory: Factory,
+) -> Tuple[Dict[TagReferenceKey, str], Dict[TagReferenceKey, TagableType]]:
+    references: Dict[TagReferenceKey, str] = {}
+    types: Dict[TagReferenceKey, TagableType] = {}
+    for batch in factory.backend_connection.execute_in_batches(
+        """SELECT a.obj_type, a.obj_path, t.name AS tag_name, a.value
+        FROM kendo_db.config.tags_assignments a
+        JOIN kendo_db.config.tags t ON a.tag_id = t.id""",
+        batch_size=TAG_SYNC_BATCH_SIZE,
+    ):
+        for row in batch:
+            obj_type = TagableType(row["OBJ_TYPE"])
+            key = (
+                _TAGABLE_TYPE_DOMAINS[obj_type],
+                split_object_path(row["OBJ_PATH"]),
+                row["TAG_NAME"],
+            )
+            references[key] = row["VALUE"]
+            types[key] = obj_type
+    return references, types
+
+
+def _get_native_tag_references(
+    snowflake_ds: SnowflakeDatasourceConnection,
+) -> Dict[TagReferenceKey, str]:
+    references: Dict[TagReferenceKey, str] = {}
+    for batch in snowflake_ds.execute_in_batches(
+        """SELECT domain, object_database, object_schema, object_name, column_name, tag_name, tag_value
+        FROM snowflake.account_usage.tag_references
+        WHERE tag_database = ? AND tag_schema = ? AND object_deleted IS NULL""",
+        (NATIVE_TAG_DATABASE, NATIVE_TAG_SCHEMA),
+        batch_size=TAG_SYNC_BATCH_SIZE,
+    ):
+        for row in batch:
+            domain = row["DOMAIN"]
+            if domain == "COLUMN":
+                path = (
+                    row["OBJECT_DATABASE"],
+                    row["OBJECT_SCHEMA"],
+                    row["OBJECT_NAME"],
+                    row["COLUMN_NAME"],
+                )
+            elif domain == "TABLE":
+                path = (row["OBJECT_DATABASE"], row["OBJECT_SCHEMA"], row["OBJECT_NAME"])
+            elif domain == "SCHEMA":
+                path = (row["OBJECT_DATABASE"], row["OBJECT_NAME"])
+            elif domain in ("USER", "ROLE", "DATABASE"):
+                path = (row["OBJECT_NAME"],)
+            else:
+                # kendo doesn't manage tags on other kinds of objects
+                continue
+            references[(domain, path, row["TAG_NAME"])] = row["TAG_VALUE"]
+    return references
+
+
+def _alter_target(obj_type: TagableType, path: Tuple[str, ...]) -> str:
+    if obj_type == TagableType.COLUMN:
+        table = ".".join(quote_identifier(part) for part in path[:3])
+        return f"TABLE {table} MODIFY COLUMN {quote_identifier(path[3])}"
+    return f"{obj_type.name} {'.'.join(quote_identifier(part) for part in path)}"
+
+
+def _group_for(domain: str, path: Tuple[str, ...]) -> str:
+    # statements are batched per schema; users, roles and databases are account level
+    if domain in ("SCHEMA", "TABLE", "COLUMN"):
+        return ".".join(quote_identifier(part) for part in path[:2])
+    return ACCOUNT_GROUP
+
+
+def diff_tag_references(
+    kendo_references: Dict[TagReferenceKey, str],
+    kendo_types: Dict[TagReferenceKey, TagableType],
+    native_references: Dict[TagReferenceKey, str],
+    inventory_index: InventoryPathIndex,
+    role: str,
+) -> List[IRemediationStatement]:
+    statements = []
+    for key, value in kendo_references.items():
+        if native_references.get(key) == value:
+            continue
+        domain, path, tag = key
+        statements.append(
+            IRemediationStatement(
+                group=_group_for(domain, path),
+                role=role,
+                statement=f"ALTER {_alter_target(kendo_types[key], path)} SET TAG {native_tag_name(tag)} = {quote_literal(value)}",
+            )
+        )
+    for key in native_references.keys() - kendo_references.keys():
+        domain, path, tag = key
+        if domain == "TABLE":
+            obj_type = (
+                TagableType.VIEW
+                if inventory_index.exists(
+                    TagableType.VIEW, ".".join(quote_identifier(p) for p in path)
+                )
+                else TagableType.TABLE
+            )
+        else:
+            obj_type = TagableType[domain]
+        statements.append(
+            IRemediationStatement(
+                group=_group_for(domain, path),
+                role=role,
+                statement=f"ALTER {_alter_target(obj_type, path)} UNSET TAG {native_tag_name(tag)}",
+            )
+        )
+    return statements
+
+
+def sync_tags(role: str = "SYSADMIN", dry_run: bool = False, max_concurrency: int = 4):
+    config_doc = get_kendo_config_or_raise_error()
+    factory = Factory(config_doc, role="SYSADMIN")
+    datasource_connection_name = config_doc["datasource"]["connection_name"]
+    snowflake_ds = SnowflakeDatasourceConnection(datasource_connection_name)
+
+    colored_print("Comparing kendo tags with Snowflake tags...", level="info")
+    kendo_references, kendo_types = _get_kendo_tag_references(factory)
+    native_references = _get_native_tag_references(snowflake_ds)
+    statements = diff_tag_references(
+        kendo_references,
+        kendo_types,
+        native_references,
+        InventoryPathIndex(factory),
+        role,
+    )
+    snowflake_ds.close_session()
+    if not statements:
+        colored_print("Snowflake tags are already in sync.", level="success")
+        factory.backend_connection.close_session()
+        return
+
+    colored_print(
+        f"{len(statements)} tag statement(s) needed to sync Snowflake tags.",
+        level="info",
+    )
+    # native tags must exist before they can be set
+    tag_catalog = get_tag_catalog(factory, config_doc)
+    create_tags = [
+        f"CREATE SCHEMA IF NOT EXISTS {NATIVE_TAG_DATABASE}.{NATIVE_TAG_SCHEMA}"
+    ]
+    for tag in sorted({key[2] for key in kendo_references}):
+        create_tag = f"CREATE TAG IF NOT EXISTS {native_tag_name(tag)}"
+        tag_id = tag_catalog.get_tag_id(tag)
+        allowed_values = tag_catalog.allowed_values.get(tag_id) if tag_id else None
+        if allowed_values:
+            create_tag += f" ALLOWED_VALUES {', '.join(quote_literal(v) for v in sorted(allowed_values))}"
+        create_tags.append(create_tag)
+    if dry_run:
+        for statement in create_tags:
+            print(f"{statement};")
+    else:
+        factory.backend_connection.execute_multi_stmts(";\n".join(create_tags) + ";")
+    factory.backend_connection.close_session()
+
+    outcomes = execute_remediation(
+        datasource_connection_name,
+        statements,
+        dry_run=dry_run,
+        max_concurrency=max_concurrency,
+    )
+    if not dry_run:
+        print_remediation_summary(outcomes)
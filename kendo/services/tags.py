@@ -1,29 +1,39 @@
+import csv
 from pathlib import Path
-from typing import List, Optional
+from typing import Iterator, List, Optional
+from pydantic import ValidationError
 from rich import print, print_json
+from rich.progress import Progress, SpinnerColumn, TextColumn
 import typer
 import json
-from kendo.backends.crud import ISelect, IParameterizedInsert
+from kendo.backends.crud import IMultiRowInsert, IParameterizedInsert, ISelect
 from kendo.factory import Factory
-from kendo.schemas.enums import BackendProvider
-from kendo.schemas.tags import ITagAssignmentRequest
-from kendo.services.common import get_kendo_config_or_raise_error
+from kendo.schemas.tags import ITagAssignment, ITagAssignmentRequest
+from kendo.services.common import (
+    get_kendo_config_or_raise_error,
+    get_kendo_local_path,
+)
+from kendo.services.effective_tags import (
+    DATABASE_SCOPED_TYPES,
+    refresh_effective_tags,
+)
+from kendo.services.inventory_index import (
+    InventoryPathIndex,
+    canonical_object_path,
+    split_object_path,
+)
+from kendo.services.tag_catalog import get_tag_catalog, invalidate_tag_catalog
+from kendo.utils.constants import NUMBER_OF_ROWS_INSERTED, NUMBER_OF_ROWS_UPDATED
+from kendo.utils.rich import colored_print
 
 
 def create_tag(name: str, allowed_values: Optional[List[str]] = None):
     config_doc = get_kendo_config_or_raise_error()
-    factory = Factory(config_doc)
-    if config_doc["backend"]["provider"] == BackendProvider.snowflake:
-        factory.backend_connection.execute("USE ROLE SYSADMIN;")
+    factory = Factory(config_doc, role="SYSADMIN")
 
     # check for duplicate
-    select_stmt_constructor: ISelect = factory.select(
-        table="kendo_db.config.tags", columns=["id"], where=f"name = '{name}'"
-    )
-    duplicate_res = factory.backend_connection.execute(
-        select_stmt_constructor.generate_statement()
-    )
-    if duplicate_res:
+    tag_catalog = get_tag_catalog(factory, config_doc)
+    if tag_catalog.get_tag_id(name) is not None:
         print(f"Tag with name '{name}' already exists. Aborting...")
         raise typer.Abort()
 
@@ -36,8 +46,12 @@ def create_tag(name: str, allowed_values: Optional[List[str]] = None):
     )
 
     # fetch tag_id
+    select_stmt_constructor: ISelect = factory.select(
+        table="kendo_db.config.tags", columns=["id"], filters={"name": name}
+    )
     tag_res = factory.backend_connection.execute(
-        select_stmt_constructor.generate_statement()
+        select_stmt_constructor.generate_statement(),
+        select_stmt_constructor.generate_params(),
     )
     tag_id = None
     if tag_res and isinstance(tag_res, list):
@@ -46,138 +60,250 @@ def create_tag(name: str, allowed_values: Optional[List[str]] = None):
 
     # INSERT into tags_allowed_values table
     if allowed_values:
-        insert_stmt_constructor: IParameterizedInsert = factory.paramized_insert(
+        multi_row_insert: IMultiRowInsert = factory.multi_row_insert(
             table="kendo_db.config.tags_allowed_values", columns=["tag_id", "value"]
         )
-        factory.backend_connection.execute_many_times(
-            insert_stmt_constructor.generate_statement(),
-            [(tag_id, value) for value in allowed_values],
+        factory.backend_connection.execute_multi_row_insert(
+            multi_row_insert, [(tag_id, value) for value in allowed_values]
         )
+    invalidate_tag_catalog(factory)
 
     print(f"Tag '{name}' created successfully.")
 
     factory.backend_connection.close_session()
 
 
-def show_tags(name: Optional[str]):
-    config_doc = get_kendo_config_or_raise_error()
-    factory = Factory(config_doc)
-    if config_doc["backend"]["provider"] == BackendProvider.snowflake:
-        factory.backend_connection.execute("USE ROLE SYSADMIN;")
+SHOW_TAGS_BATCH_SIZE = 500
 
-    select_stmt_constructor: ISelect = factory.select(table="kendo_db.config.tags")
+
+def _show_tags_page(
+    factory: Factory, name: Optional[str], limit: Optional[int], offset: Optional[int]
+):
+    # filtering and pagination stay in the query, so only the requested page
+    # leaves the backend, streamed in batches
+    sql = """SELECT t.name, ARRAY_AGG(v.value) WITHIN GROUP (ORDER BY v.value) AS allowed_values
+    FROM kendo_db.config.tags t
+    LEFT JOIN kendo_db.config.tags_allowed_values v ON v.tag_id = t.id"""
+    sql_params = None
     if name:
-        select_stmt_constructor.where = f"name LIKE '%{name}%'"
-    res = factory.backend_connection.execute(
-        select_stmt_constructor.generate_statement()
-    )
+        sql += " WHERE t.name LIKE ?"
+        sql_params = (f"%{name}%",)
+    sql += " GROUP BY t.id, t.name ORDER BY t.name"
+    if limit is not None:
+        sql += f" LIMIT {int(limit)}"
+    if offset:
+        if limit is None:
+            sql += " LIMIT NULL"
+        sql += f" OFFSET {int(offset)}"
 
-    if isinstance(res, list) and len(res) > 0:
-        for i, _ in enumerate(res):
-            tag_id = res[i]["ID"]
-            select_stmt_constructor: ISelect = factory.select(
-                table="kendo_db.config.tags_allowed_values",
-                columns=["value"],
-                where=f"tag_id = {tag_id}",
-            )
-            allowed_values = factory.backend_connection.execute(
-                select_stmt_constructor.generate_statement()
-            )
-            if allowed_values and isinstance(allowed_values, list):
-                res[i]["allowed_values"] = [
-                    val["VALUE"] for val in allowed_values  # type: ignore
-                ]
-            del res[i]["ID"]
-    print_json(data=res)
-    factory.backend_connection.close_session()
+    for batch in factory.backend_connection.execute_in_batches(
+        sql, sql_params, batch_size=SHOW_TAGS_BATCH_SIZE
+    ):
+        for tag in batch:
+            allowed_values = json.loads(tag["ALLOWED_VALUES"] or "[]")
+            row = {"NAME": tag["NAME"]}
+            if allowed_values:
+                row["allowed_values"] = allowed_values
+            print_json(data=row)
 
 
-def set_tag(file_path: Path):
-    # TODO: handle effect on existing policies
+def show_tags(
+    name: Optional[str], limit: Optional[int] = None, offset: Optional[int] = None
+):
     config_doc = get_kendo_config_or_raise_error()
-    factory = Factory(config_doc)
-    if config_doc["backend"]["provider"] == BackendProvider.snowflake:
-        factory.backend_connection.execute("USE ROLE SYSADMIN;")
+    factory = Factory(config_doc, role="SYSADMIN")
 
-    if file_path.is_file():
-        tag_assignment_data = None
-        with open(file_path) as f:
-            tag_assignment_data = json.load(f)
+    if name or limit is not None or offset:
+        _show_tags_page(factory, name, limit, offset)
+        factory.backend_connection.close_session()
+        return
+
+    # the whole list is what the shared catalog already holds
+    tag_catalog = get_tag_catalog(factory, config_doc)
+    for tag_name in sorted(tag_catalog.tag_ids):
+        row = {"NAME": tag_name}
+        allowed_values = tag_catalog.allowed_values.get(tag_catalog.tag_ids[tag_name])
+        if allowed_values:
+            row["allowed_values"] = sorted(allowed_values)
+        print_json(data=row)
+    factory.backend_connection.close_session()
 
-        # validate data
-        tag_assignment_data = ITagAssignmentRequest.model_validate(tag_assignment_data)
 
-        # check if tag exists
-        select_stmt_constructor: ISelect = factory.select(
-            table="kendo_db.config.tags",
-            columns=["id"],
-            where=f"name = '{tag_assignment_data.tag}'",
-        )
-        tag_res = factory.backend_connection.execute(
-            select_stmt_constructor.generate_statement()
-        )
-        if not tag_res or not isinstance(tag_res, list):
-            print(f"Tag with name '{tag_assignment_data.tag}' not found. Aborting...")
-            raise typer.Abort()
-        tag_id = tag_res[0]["ID"]
+TAG_ASSIGNMENTS_LOAD_TABLE = "kendo_db.config.tags_assignments_load"
+TAG_PATHS_LOAD_TABLE = "kendo_db.config.tags_assignment_paths_load"
+TAG_ASSIGNMENTS_LOAD_CHUNK_SIZE = 10000
+MAX_REPORTED_ERRORS = 20
+TAG_ASSIGNMENT_ERRORS_FILE = "set_tag_errors.txt"
 
-        # check if tag value is valid
-        select_stmt_constructor: ISelect = factory.select(
-            table="kendo_db.config.tags_allowed_values",
-            columns=["value"],
-            where=f"tag_id = {tag_id}",
-        )
-        allowed_values = factory.backend_connection.execute(
-            select_stmt_constructor.generate_statement()
-        )
-        if (
-            allowed_values
-            and isinstance(allowed_values, list)
-            and len(allowed_values) > 0
-        ):
-            allowed_values = [val["VALUE"] for val in allowed_values]  # type: ignore
-            if tag_assignment_data.value not in allowed_values:
-                print(
-                    f"Tag value '{tag_assignment_data.value}' not allowed. Aborting..."
-                )
-                raise typer.Abort()
 
-        # for each object
+def _read_tag_assignments(file_path: Path) -> Iterator[ITagAssignment]:
+    # NDJSON and CSV files are streamed line by line, so their size doesn't matter
+    suffix = file_path.suffix.lower()
+    if suffix in (".ndjson", ".jsonl"):
+        with open(file_path) as f:
+            for line in f:
+                if line.strip():
+                    yield ITagAssignment.model_validate_json(line)
+    elif suffix == ".csv":
+        with open(file_path, newline="") as f:
+            for row in csv.DictReader(f):
+                yield ITagAssignment.model_validate(row)
+    else:
+        with open(file_path) as f:
+            tag_assignment_data = ITagAssignmentRequest.model_validate(json.load(f))
         for obj in tag_assignment_data.objects:
-            #  TODO: check if object exists
-
-            #  check if object has tag already
-            select_stmt_constructor: ISelect = factory.select(
-                table="kendo_db.config.tags_assignments",
-                columns=["id"],
-                where=f"tag_id = {str(tag_id)} \
-                AND value = '{tag_assignment_data.value}' \
-                AND obj_type = '{obj.type.value}' \
-                AND obj_path = '{obj.path}'",
-            )
-            tag_assignment_check = factory.backend_connection.execute(
-                select_stmt_constructor.generate_statement()
+            yield ITagAssignment(
+                tag=tag_assignment_data.tag,
+                value=tag_assignment_data.value,
+                type=obj.type,
+                path=obj.path,
             )
-            if tag_assignment_check:
-                print(
-                    f"Tag '{tag_assignment_data.tag}' with value '{tag_assignment_data.value}' already assigned to {obj.type} '{obj.path}'. Skipping..."
-                )
-                continue
-            else:
-                #  if not, insert into tag_assignments
-                insert_stmt_constructor: IParameterizedInsert = (
-                    factory.paramized_insert(
-                        table="kendo_db.config.tags_assignments",
-                        columns=["obj_type", "obj_path", "tag_id", "value"],
+
+
+def set_tag(file_path: Path):
+    # TODO: handle effect on existing policies
+    config_doc = get_kendo_config_or_raise_error()
+    factory = Factory(config_doc, role="SYSADMIN")
+
+    if not file_path.is_file():
+        print(f"File not found: {file_path}")
+        raise typer.Abort()
+
+    tag_catalog = get_tag_catalog(factory, config_doc)
+    inventory_index = InventoryPathIndex(factory)
+
+    # stage every assignment in a session-scoped table, then apply them with one MERGE
+    factory.backend_connection.execute(
+        f"CREATE OR REPLACE TEMPORARY TABLE {TAG_ASSIGNMENTS_LOAD_TABLE} \
+        (seq INT, obj_type VARCHAR(255), obj_path VARCHAR, tag_id INT, value VARCHAR(500));"
+    )
+    multi_row_insert: IMultiRowInsert = factory.multi_row_insert(
+        table=TAG_ASSIGNMENTS_LOAD_TABLE,
+        columns=["seq", "obj_type", "obj_path", "tag_id", "value"],
+    )
+    errors = []
+    chunk = []
+    total = 0
+    # scope of the effective tag refresh after the write
+    affected_databases = set()
+    affects_account = False
+    with Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+    ) as progress:
+        task = progress.add_task(description="Validating tag assignments...", total=None)
+        try:
+            for i, assignment in enumerate(_read_tag_assignments(file_path), start=1):
+                tag_id = tag_catalog.get_tag_id(assignment.tag)
+                if tag_id is None:
+                    errors.append(f"#{i}: Tag with name '{assignment.tag}' not found.")
+                    continue
+                if not tag_catalog.is_value_allowed(tag_id, assignment.value):
+                    errors.append(
+                        f"#{i}: Tag value '{assignment.value}' not allowed for tag '{assignment.tag}'."
+                    )
+                    continue
+                if not inventory_index.exists(assignment.type, assignment.path):
+                    errors.append(
+                        f"#{i}: {assignment.type.value} '{assignment.path}' not found in scanned inventory."
+                    )
+                    continue
+                if assignment.type in DATABASE_SCOPED_TYPES:
+                    affected_databases.add(split_object_path(assignment.path)[0])
+                else:
+                    affects_account = True
+                chunk.append(
+                    (
+                        i,
+                        assignment.type.value,
+                        canonical_object_path(assignment.path),
+                        tag_id,
+                        assignment.value,
                     )
                 )
-                factory.backend_connection.execute(
-                    insert_stmt_constructor.generate_statement(),
-                    (obj.type.value, obj.path, tag_id, tag_assignment_data.value),
-                )
+                total += 1
+                if len(chunk) >= TAG_ASSIGNMENTS_LOAD_CHUNK_SIZE:
+                    factory.backend_connection.execute_multi_row_insert(
+                        multi_row_insert, chunk
+                    )
+                    chunk = []
+                    progress.update(
+                        task, description=f"Validated {total} tag assignment(s)..."
+                    )
+        except (ValidationError, json.JSONDecodeError, csv.Error) as e:
+            print(f"Invalid tag assignment file: {e}")
+            raise typer.Abort()
+        if chunk:
+            factory.backend_connection.execute_multi_row_insert(
+                multi_row_insert, chunk
+            )
 
-        print(f"Tag '{tag_assignment_data.tag}' set successfully.")
-        factory.backend_connection.close_session()
-    else:
-        print(f"File not found: {file_path}")
+    if errors:
+        colored_print(f"{len(errors)} invalid tag assignment(s). Aborting...", level="error")
+        for error in errors[:MAX_REPORTED_ERRORS]:
+            print(error)
+        if len(errors) > MAX_REPORTED_ERRORS:
+            # the rest would flood the terminal, the file has every error
+            errors_path = get_kendo_local_path(TAG_ASSIGNMENT_ERRORS_FILE)
+            with open(errors_path, "w") as f:
+                f.writelines(f"{error}\n" for error in errors)
+            colored_print(
+                f"{len(errors) - MAX_REPORTED_ERRORS} more not shown, all errors were written to {errors_path}.",
+                level="error",
+            )
         raise typer.Abort()
+
+    # an object holds one value per tag, the last line of the file wins
+    merge_res = factory.backend_connection.execute(
+        f"""MERGE INTO kendo_db.config.tags_assignments t
+        USING (
+            SELECT obj_type, obj_path, tag_id, value FROM {TAG_ASSIGNMENTS_LOAD_TABLE}
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY obj_type, obj_path, tag_id ORDER BY seq DESC) = 1
+        ) s
+        ON t.obj_type = s.obj_type AND t.obj_path = s.obj_path AND t.tag_id = s.tag_id
+        WHEN MATCHED AND t.value <> s.value THEN UPDATE SET value = s.value
+        WHEN NOT MATCHED THEN INSERT (obj_type, obj_path, tag_id, value)
+        VALUES (s.obj_type, s.obj_path, s.tag_id, s.value);"""
+    )
+    inserted = 0
+    updated = 0
+    if isinstance(merge_res, list) and merge_res:
+        inserted = merge_res[0].get(NUMBER_OF_ROWS_INSERTED, 0)
+        updated = merge_res[0].get(NUMBER_OF_ROWS_UPDATED, 0)
+    print(
+        f"{inserted} tag assignment(s) set successfully, {updated} changed, {total - inserted - updated} already assigned and skipped."
+    )
+    if inserted or updated:
+        refresh_effective_tags(factory, affected_databases, affects_account)
+    factory.backend_connection.close_session()
+
+
+def canonicalize_tag_assignments(factory: Factory):
+    # assignments written before paths were stored canonically are rewritten,
+    # keeping the latest value where several of them name the same object and tag
+    paths = []
+    for batch in factory.backend_connection.execute_in_batches(
+        "SELECT id, obj_path FROM kendo_db.config.tags_assignments",
+        batch_size=TAG_ASSIGNMENTS_LOAD_CHUNK_SIZE,
+    ):
+        for row in batch:
+            path = canonical_object_path(row["OBJ_PATH"])
+            if path != row["OBJ_PATH"]:
+                paths.append((row["ID"], path))
+    factory.backend_connection.execute(
+        f"CREATE OR REPLACE TEMPORARY TABLE {TAG_PATHS_LOAD_TABLE} (id INT, obj_path VARCHAR);"
+    )
+    factory.backend_connection.execute_insert(
+        factory.multi_row_insert(table=TAG_PATHS_LOAD_TABLE, columns=["id", "obj_path"]),
+        paths,
+    )
+    factory.backend_connection.execute_multi_stmts(
+        f"""BEGIN;
+UPDATE kendo_db.config.tags_assignments t SET obj_path = s.obj_path
+FROM {TAG_PATHS_LOAD_TABLE} s WHERE t.id = s.id;
+DELETE FROM kendo_db.config.tags_assignments WHERE id IN (
+    SELECT id FROM kendo_db.config.tags_assignments
+    QUALIFY ROW_NUMBER() OVER (PARTITION BY obj_type, obj_path, tag_id ORDER BY id DESC) > 1
+);
+COMMIT;"""
+    )
@@ -1,4 +1,7 @@
-import unittest
+import sqlite3
+from collections import Counter
+from typing import Tuple
+
 import yaml
 import typer
 from rich import print
@@ -19,8 +22,14 @@ from kendo.schemas.mapped_objs import (
     TableObj,
     UserObj,
 )
-from kendo.services.common import get_kendo_config_or_raise_error
-from kendo.utils.rich import colored_print
+from kendo.schemas.test import IAssertionOutcome, IResultsDiff
+from kendo.backends.replica import InventoryReplica
+from kendo.services.common import (
+    get_inventory_replica,
+    get_kendo_config_or_raise_error,
+)
+from kendo.utils.output import MAX_LISTED_OBJS, emit_event, is_ndjson
+from kendo.utils.rich import colored_print, print_objs
 
 
 def load_yml_file(file):
@@ -41,13 +50,18 @@ def list_tests():
 def execute_tests(datasource_connection_name: str):
     config = load_yml_file("sample/kendo.yml")
     tests = config["tests"]
+    for test in tests:
+        get_test_assertion(test)
 
     snowflake_ds = SnowflakeDatasourceConnection(datasource_connection_name)
+    replica = get_inventory_replica(datasource_connection_name)
 
+    counts = Counter()
     with Progress(
         SpinnerColumn(),
         TextColumn("[progress.description]{task.description}"),
         TextColumn("([progress.percentage]{task.percentage:>3.0f}%)"),
+        disable=is_ndjson(),
     ) as progress:
         test_task = progress.add_task("[cyan]Executing Tests...", total=len(tests))
         for test in tests:
@@ -55,20 +69,37 @@ def execute_tests(datasource_connection_name: str):
             progress.refresh()
             progress.update(test_task, description=f"Running test: {test['name']}")
             try:
-                result = snowflake_ds.execute(test["sql"])
-                # Ensure result is in the expected format
-                if not isinstance(result, list):
-                    result = []  # or handle accordingly if result is not as expected
+                outcome = run_test(snowflake_ds, test, replica)
             except Exception as e:
+                counts["errors"] += 1
+                if is_ndjson():
+                    emit_event("test_error", name=test["name"], error=str(e))
+                    continue
                 colored_print("----------------------------------------------------------------")
                 colored_print(f"Test execution error: {test['name']} ", level="error")
                 colored_print(str(e), level="error")
                 colored_print("----------------------------------------------------------------")
                 continue
-            
-            # Check if result matches expected output
-            expected_result = test.get("expected", [])
-            if compare_results(result, expected_result):
+
+            counts["passed" if outcome.passed else "failed"] += 1
+            if is_ndjson():
+                emit_event(
+                    "test_outcome",
+                    name=test["name"],
+                    passed=outcome.passed,
+                    sql=test["sql"],
+                    ran_on=outcome.ran_on,
+                    expected=test.get(outcome.assertion),
+                    **_summarise_actual(outcome.actual),
+                    diff=(
+                        outcome.diff.model_dump()
+                        if outcome.diff and not outcome.diff.matched
+                        else None
+                    ),
+                )
+                continue
+
+            if outcome.passed:
                 colored_print("----------------------------------------------------------------")
                 colored_print(f"Test success: {test['name']} ", level="success")
                 colored_print("----------------------------------------------------------------")
@@ -78,31 +109,287 @@ def execute_tests(datasource_connection_name: str):
                 colored_print("----------------------------------------------------------------")
 
             print("SQL: ", test["sql"])
-            if "expected" in test:
-                print("EXPECTED: ", test["expected"])
-            print("RESULT: ", result)
+            print("RAN ON: ", outcome.ran_on)
+            if outcome.assertion in test:
+                print("EXPECTED: ", test[outcome.assertion])
+            if isinstance(outcome.actual, list):
+                print_objs("RESULT: ", outcome.actual)
+            elif outcome.actual is not None:
+                print("RESULT: ", outcome.actual)
+            if outcome.diff and not outcome.diff.matched:
+                print("DIFF: ", outcome.diff.model_dump())
         progress.update(test_task, description=f"All tests complete!")
         progress.stop()
     snowflake_ds.close_session()
+    emit_event(
+        "test_summary",
+        passed=counts["passed"],
+        failed=counts["failed"],
+        errors=counts["errors"],
+    )
     return tests
 
+
+def _summarise_actual(actual) -> dict:
+    # result sets can be large, events carry the first rows and the row count
+    if isinstance(actual, list):
+        return {"actual": actual[:MAX_LISTED_OBJS], "actual_count": len(actual)}
+    return {"actual": actual}
+
+
+MAX_DIFF_ROWS = 20
+
+
+def _freeze(value):
+    # make nested values hashable so whole rows can be counted
+    if isinstance(value, dict):
+        return tuple(
+            sorted(
+                ((str(k).lower(), _freeze(v)) for k, v in value.items()),
+                key=lambda item: item[0],
+            )
+        )
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
 def normalize_row(row):
-    return {k.lower(): v for k, v in row.items()}
+    # rows become hashable tuples of (lowercased column, value) ordered by column
+    if isinstance(row, dict):
+        return _freeze(row)
+    return (("", _freeze(row)),)
 
-def compare_results(result, expected):
+
+def _denormalize_row(row):
+    if len(row) == 1 and row[0][0] == "":
+        return {"value": row[0][1]}
+    return dict(row)
+
+
+def _iter_rows(result):
+    # accepts a list of rows or an iterable of row batches
+    if result is None:
+        return
+    if isinstance(result, list):
+        yield from result
+        return
+    for batch in result:
+        yield from batch
+
+
+def diff_results(result, expected, max_diff_rows: int = MAX_DIFF_ROWS) -> IResultsDiff:
     # Treat None and [] as equivalent
-    if (result is None and expected == []) or (expected is None and result == []):
-        return True
-    
-    if not isinstance(result, list) or not isinstance(expected, list) or len(result) != len(expected):
-        return False
-    
-    # Normalize row keys to lowercase for both actual and expected results
-    normalized_result = [normalize_row(row) for row in result]
-    normalized_expected = [normalize_row(row) for row in expected]
-
-    # Sort both lists of dictionaries for comparison
-    normalized_result.sort(key=lambda x: sorted(x.items()))
-    normalized_expected.sort(key=lambda x: sorted(x.items()))
-
-    return normalized_result == normalized_expected
+    if expected is None:
+        expected = []
+    if not isinstance(expected, list):
+        expected = [expected]
+
+    # multiset of expected rows, consumed while the result streams through
+    remaining = Counter(normalize_row(row) for row in expected)
+    diff = IResultsDiff()
+    for row in _iter_rows(result):
+        key = normalize_row(row)
+        if remaining[key] > 0:
+            remaining[key] -= 1
+            continue
+        diff.unexpected_count += 1
+        if len(diff.unexpected) < max_diff_rows:
+            diff.unexpected.append(_denormalize_row(key))
+
+    for key, count in remaining.items():
+        if count <= 0:
+            continue
+        diff.missing_count += count
+        if len(diff.missing) < max_diff_rows:
+            diff.missing.extend(
+                [_denormalize_row(key)] * min(count, max_diff_rows - len(diff.missing))
+            )
+    return diff
+
+
+def compare_results(result, expected):
+    return diff_results(result, expected, max_diff_rows=0).matched
+
+
+# assertions that are compiled into SQL and evaluated by the warehouse, so only
+# a single value or a capped diff travels back instead of the full result set
+PUSHDOWN_ASSERTIONS = [
+    "expect_empty",
+    "expect_count",
+    "expect_at_most",
+    "expect_rows",
+    "expect_hash",
+]
+
+
+def get_test_assertion(test) -> str:
+    # a test checks its result one way; silently using the first of several
+    # would hide the others from the author
+    assertions = [a for a in PUSHDOWN_ASSERTIONS if a in test]
+    if "expected" in test:
+        assertions.append("expected")
+    if len(assertions) > 1:
+        colored_print(
+            f"Test '{test.get('name')}' sets {', '.join(assertions)}, keep only one of them.",
+            level="error",
+        )
+        raise typer.Abort()
+    return assertions[0] if assertions else "expected"
+
+
+def _strip_sql(sql: str) -> str:
+    return sql.strip().rstrip(";").strip()
+
+
+def _compile_expect_rows(sql: str, expected_rows: list) -> Tuple[str, tuple]:
+    if not all(isinstance(row, dict) for row in expected_rows):
+        colored_print("expect_rows only accepts rows as mappings.", level="error")
+        raise typer.Abort()
+    columns = [str(key).lower() for key in expected_rows[0].keys()]
+    params = []
+    values = []
+    for row in expected_rows:
+        normalized = {str(k).lower(): v for k, v in row.items()}
+        if sorted(normalized.keys()) != sorted(columns):
+            colored_print(
+                "All rows in expect_rows must have the same columns.", level="error"
+            )
+            raise typer.Abort()
+        values.append(f"({', '.join(['?' for _ in columns])})")
+        params.extend(normalized[column] for column in columns)
+    column_list = ", ".join(columns)
+    # rows are numbered within their group of duplicates, so EXCEPT compares
+    # them as a multiset, like diff_results does locally
+    row_n = f"ROW_NUMBER() OVER (PARTITION BY {column_list} ORDER BY {column_list}) AS kendo_row_n"
+    compiled_sql = f"""WITH actual AS (SELECT {column_list}, {row_n} FROM ({sql})),
+expected_rows ({column_list}) AS (SELECT * FROM (VALUES {', '.join(values)})),
+expected AS (SELECT {column_list}, {row_n} FROM expected_rows),
+diff AS (
+    SELECT 'missing' AS kendo_diff_kind, {column_list} FROM (SELECT * FROM expected EXCEPT SELECT * FROM actual)
+    UNION ALL
+    SELECT 'unexpected' AS kendo_diff_kind, {column_list} FROM (SELECT * FROM actual EXCEPT SELECT * FROM expected)
+)
+SELECT kendo_diff_kind, {column_list}, kendo_diff_count FROM (
+    SELECT *, COUNT(*) OVER (PARTITION BY kendo_diff_kind) AS kendo_diff_count,
+    ROW_NUMBER() OVER (PARTITION BY kendo_diff_kind ORDER BY {column_list}) AS kendo_diff_n
+    FROM diff
+)
+WHERE kendo_diff_n <= {MAX_DIFF_ROWS}"""
+    return compiled_sql, tuple(params)
+
+
+def compile_assertion(test) -> Tuple[str, str, tuple] | None:
+    assertion = get_test_assertion(test)
+    if assertion == "expected":
+        return None
+    sql = _strip_sql(test["sql"])
+    expected = test[assertion]
+
+    if assertion == "expect_empty" or (assertion == "expect_rows" and not expected):
+        # LIMIT 1 lets the warehouse stop at the first row
+        return (
+            assertion,
+            f"SELECT COUNT(*) AS actual FROM (SELECT 1 FROM ({sql}) LIMIT 1)",
+            (),
+        )
+    if assertion == "expect_count":
+        return assertion, f"SELECT COUNT(*) AS actual FROM ({sql})", ()
+    if assertion == "expect_at_most":
+        # one row over the limit is enough to fail the test
+        return (
+            assertion,
+            f"SELECT COUNT(*) AS actual FROM (SELECT 1 FROM ({sql}) LIMIT {int(expected) + 1})",
+            (),
+        )
+    if assertion == "expect_hash":
+        return assertion, f"SELECT HASH_AGG(*) AS actual FROM ({sql})", ()
+
+    compiled_sql, params = _compile_expect_rows(sql, expected)
+    return assertion, compiled_sql, params
+
+
+def evaluate_assertion(assertion: str, expected, res) -> IAssertionOutcome:
+    if assertion == "expect_rows" and expected:
+        diff = IResultsDiff()
+        for row in res:
+            row = {k.lower(): v for k, v in row.items()}
+            kind = row.pop("kendo_diff_kind")
+            count = row.pop("kendo_diff_count")
+            if kind == "missing":
+                diff.missing.append(row)
+                diff.missing_count = count
+            else:
+                diff.unexpected.append(row)
+                diff.unexpected_count = count
+        return IAssertionOutcome(assertion=assertion, passed=diff.matched, diff=diff)
+
+    actual = res[0]["ACTUAL"] if res else None
+    if assertion in ("expect_empty", "expect_rows"):
+        expect_empty = True if assertion == "expect_rows" else bool(expected)
+        passed = (actual == 0) == expect_empty
+    elif assertion == "expect_count":
+        passed = actual == int(expected)
+    elif assertion == "expect_at_most":
+        passed = actual is not None and actual <= int(expected)
+    else:
+        passed = actual is not None and str(actual) == str(expected)
+    return IAssertionOutcome(assertion=assertion, passed=passed, actual=actual)
+
+
+def evaluate_assertion_locally(assertion: str, expected, rows) -> IAssertionOutcome:
+    # same semantics as the pushed-down assertions, for rows that are already local
+    if assertion == "expect_rows":
+        diff = diff_results(rows, expected)
+        return IAssertionOutcome(assertion=assertion, passed=diff.matched, diff=diff)
+    actual = len(rows)
+    if assertion == "expect_empty":
+        passed = (actual == 0) == bool(expected)
+    elif assertion == "expect_count":
+        passed = actual == int(expected)
+    else:
+        passed = actual <= int(expected)
+    return IAssertionOutcome(assertion=assertion, passed=passed, actual=actual)
+
+
+def _run_test_on_replica(replica: InventoryReplica, test) -> IAssertionOutcome | None:
+    assertion = get_test_assertion(test)
+    # HASH_AGG values are only comparable when computed by Snowflake
+    if assertion == "expect_hash" or not replica.can_answer(test["sql"]):
+        return None
+    try:
+        rows = replica.execute(test["sql"])
+    except sqlite3.Error:
+        # not every Snowflake dialect feature is understood locally
+        return None
+    if assertion == "expected":
+        diff = diff_results(rows, test.get("expected", []))
+        outcome = IAssertionOutcome(assertion=assertion, passed=diff.matched, diff=diff)
+    else:
+        outcome = evaluate_assertion_locally(assertion, test[assertion], rows)
+    outcome.ran_on = "replica"
+    return outcome
+
+
+def run_test(
+    snowflake_ds: SnowflakeDatasourceConnection,
+    test,
+    replica: InventoryReplica | None = None,
+) -> IAssertionOutcome:
+    if replica:
+        outcome = _run_test_on_replica(replica, test)
+        if outcome:
+            return outcome
+
+    compiled = compile_assertion(test)
+    if compiled is None:
+        # Check if result matches expected output, streaming the result in batches
+        diff = diff_results(
+            snowflake_ds.execute_in_batches(test["sql"]), test.get("expected", [])
+        )
+        return IAssertionOutcome(assertion="expected", passed=diff.matched, diff=diff)
+
+    assertion, sql, params = compiled
+    res = snowflake_ds.execute(sql, params or None)
+    assert isinstance(res, list)
+    return evaluate_assertion(assertion, test[assertion], res)
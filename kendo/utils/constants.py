@@ -1,3 +1,4 @@
 COMPLETED = "completed"
 ANONYMOUS_BLOCK = "anonymous block"
-NUMBER_OF_ROWS_INSERTED = "number of rows inserted"
\ No newline at end of file
+NUMBER_OF_ROWS_INSERTED = "number of rows inserted"
+NUMBER_OF_ROWS_UPDATED = "number of rows updated"
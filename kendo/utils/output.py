@@ -0,0 +1,41 @@
+import json
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from kendo.schemas.enums import OutputFormat
+
+# how scan and test report progress: rich text for people, NDJSON for machines
+output_format: ContextVar[OutputFormat] = ContextVar(
+    "output_format", default=OutputFormat.text
+)
+
+# listed objects beyond this are only counted
+MAX_LISTED_OBJS = 20
+
+
+def is_ndjson() -> bool:
+    return output_format.get() == OutputFormat.ndjson
+
+
+def emit_event(event: str, **fields):
+    # one compact JSON object per line; a no-op for text output
+    if not is_ndjson():
+        return
+    sys.stdout.write(json.dumps({"event": event, **fields}, default=str) + "\n")
+    sys.stdout.flush()
+
+
+@contextmanager
+def event_phase(phase: str, **fields):
+    # phase_start and phase_end events around one step, the end with its timing
+    started = time.monotonic()
+    emit_event("phase_start", phase=phase, **fields)
+    yield
+    emit_event(
+        "phase_end",
+        phase=phase,
+        seconds=round(time.monotonic() - started, 3),
+        **fields,
+    )
@@ -0,0 +1,13 @@
+from contextvars import ContextVar
+
+import typer
+
+# set for non-interactive runs (`--yes`, or commands run by `kendo serve`)
+assume_yes: ContextVar[bool] = ContextVar("assume_yes", default=False)
+
+
+def prompt_confirm(text: str, abort: bool = False) -> bool:
+    # without a prompt, changes are accepted and optional views are skipped
+    if assume_yes.get():
+        return abort
+    return typer.confirm(text, abort=abort)
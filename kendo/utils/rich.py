@@ -1,9 +1,16 @@
+from typing import Iterable
+
 from rich import print
 
+from kendo.utils.output import MAX_LISTED_OBJS, emit_event, is_ndjson
+
 
 def colored_print(
     text: str, level: None | str = "info" or "warning" or "error" or "success"
 ):
+    if is_ndjson():
+        emit_event("message", level=level, text=text)
+        return
     if not level:
         print(text)
         return
@@ -19,3 +26,16 @@ def colored_print(
         color = "green"
 
     print(f"[{color}]{text}[/{color}]")
+
+
+def print_objs(label: str, objs: Iterable):
+    # scans can list hundreds of thousands of objects, which rich takes minutes
+    # to pretty-print, so only the first few are shown
+    objs = list(objs)
+    if is_ndjson():
+        emit_event("objects", label=label, count=len(objs), sample=objs[:MAX_LISTED_OBJS])
+        return
+    colored_print(label, level="info")
+    print(objs[:MAX_LISTED_OBJS])
+    if len(objs) > MAX_LISTED_OBJS:
+        colored_print(f"... and {len(objs) - MAX_LISTED_OBJS} more", level=None)
@@ -0,0 +1,6 @@
+def quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def quote_literal(value) -> str:
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "''") + "'"
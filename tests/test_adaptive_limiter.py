@@ -0,0 +1,24 @@
+from kendo.backends.adaptive_limiter import AdaptiveLimiter
+
+
+def test_mixed_latency_workload_keeps_its_limit():
+    limiter = AdaptiveLimiter(max_limit=16)
+    start = limiter.limit
+    for _ in range(50):
+        assert not limiter.on_success(0.05, "SHOW")
+        assert not limiter.on_success(5.0, "COPY")
+        assert not limiter.on_success(3.0, "SELECT")
+
+    assert limiter.limit >= start
+    assert limiter.baseline_latency["SHOW"] < 0.1
+
+
+def test_statement_slow_for_its_class_looks_queued():
+    limiter = AdaptiveLimiter(max_limit=16)
+    limiter.on_success(5.0, "COPY")
+    limiter.on_success(0.05, "SHOW")
+    limit = limiter.limit
+
+    assert limiter.on_success(2.0, "SHOW")
+    assert not limiter.on_success(6.0, "COPY")
+    assert limiter.limit < limit
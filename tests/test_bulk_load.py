@@ -0,0 +1,35 @@
+import csv
+import gzip
+import io
+from datetime import datetime, timezone
+
+from kendo.backends.bulk_load import format_csv_row, to_csv_value
+
+
+def _load(line: str):
+    # mirrors the COPY file format: unenclosed empty fields are NULL
+    raw = line.rstrip("\n").split(",")
+    parsed = next(csv.reader(io.StringIO(line)))
+    return [None if field == "" else value for field, value in zip(raw, parsed)]
+
+
+def test_none_round_trips_as_null():
+    assert to_csv_value(None) is None
+    line = format_csv_row([None, "", "a", 7, None])
+    assert line == ',"","a",7,\n'
+    assert _load(line) == [None, "", "a", "7", None]
+
+
+def test_none_round_trips_through_gzip(tmp_path):
+    path = tmp_path / "rows.csv.gz"
+    with gzip.open(path, "wt", newline="") as f:
+        f.write(format_csv_row(["name", None]))
+    with gzip.open(path, "rt", newline="") as f:
+        assert _load(f.read()) == ["name", None]
+
+
+def test_quotes_and_typed_bindings():
+    created_on = datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    line = format_csv_row([("TIMESTAMP_LTZ", created_on), 'say "hi", ok', True])
+    assert line == '"2024-01-02T03:04:05+00:00","say ""hi"", ok",true\n'
+    assert next(csv.reader(io.StringIO(line)))[1] == 'say "hi", ok'
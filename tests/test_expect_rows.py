@@ -0,0 +1,42 @@
+import sqlite3
+
+import pytest
+
+test_service = pytest.importorskip("kendo.services.test")
+
+
+def _execute(sql, params):
+    # the compiled assertion only uses SQL both engines understand
+    cur = sqlite3.connect(":memory:").execute(sql, params)
+    columns = [description[0].upper() for description in cur.description]
+    return [dict(zip(columns, row)) for row in cur.fetchall()]
+
+
+def _outcomes(actual_rows, expected):
+    sql = " UNION ALL ".join(f"SELECT '{name}' AS name" for name in actual_rows)
+    assertion, compiled_sql, params = test_service.compile_assertion(
+        {"sql": sql, "expect_rows": expected}
+    )
+    pushed_down = test_service.evaluate_assertion(
+        assertion, expected, _execute(compiled_sql, params)
+    )
+    local = test_service.evaluate_assertion_locally(
+        assertion, expected, [{"name": name} for name in actual_rows]
+    )
+    return pushed_down, local
+
+
+def test_missing_duplicate_row_fails_both_ways():
+    pushed_down, local = _outcomes(["a"], [{"name": "a"}, {"name": "a"}])
+
+    assert not pushed_down.passed and not local.passed
+    assert pushed_down.diff.missing == local.diff.missing == [{"name": "a"}]
+    assert pushed_down.diff.missing_count == local.diff.missing_count == 1
+
+
+def test_unexpected_duplicate_row_fails_both_ways():
+    pushed_down, local = _outcomes(["a", "a", "b"], [{"name": "a"}, {"name": "b"}])
+
+    assert not pushed_down.passed and not local.passed
+    assert pushed_down.diff.unexpected == local.diff.unexpected == [{"name": "a"}]
+    assert pushed_down.diff.unexpected_count == local.diff.unexpected_count == 1
@@ -0,0 +1,35 @@
+from kendo.services.inventory_changes import changed_objs, merge_changed_objs_sql
+
+
+def _warehouse(name, owner_role_id, size="XSMALL"):
+    return {
+        "name": name,
+        "type": "STANDARD",
+        "size": size,
+        "owner_role_id": owner_role_id,
+    }
+
+
+def _kendo_row(obj):
+    return {key.upper(): value for key, value in obj.items()}
+
+
+def test_owner_change_is_a_changed_object():
+    in_kendo = {
+        "ETL": _kendo_row(_warehouse("ETL", 1)),
+        "BI": _kendo_row(_warehouse("BI", 1)),
+    }
+    in_sf = [_warehouse("ETL", 2), _warehouse("BI", 1), _warehouse("NEW", 1)]
+
+    assert changed_objs(in_sf, in_kendo, "name", "warehouse_objs") == [
+        _warehouse("ETL", 2)
+    ]
+
+
+def test_merge_updates_matched_objects_by_natural_key():
+    sql = merge_changed_objs_sql("warehouse_objs", "changed_objs_load", "name")
+
+    assert "MERGE INTO kendo_db.infrastructure.warehouse_objs t" in sql
+    assert "ON t.name = s.name" in sql
+    assert "owner_role_id = s.owner_role_id" in sql
+    assert "WHEN NOT MATCHED" not in sql
@@ -0,0 +1,10 @@
+from kendo.services.inventory_index import canonical_object_path
+
+
+def test_spellings_of_one_object_share_a_canonical_path():
+    assert canonical_object_path("sales.public.orders") == '"SALES"."PUBLIC"."ORDERS"'
+    assert canonical_object_path('SALES."PUBLIC".Orders') == '"SALES"."PUBLIC"."ORDERS"'
+
+
+def test_quoted_parts_keep_their_case_and_quotes():
+    assert canonical_object_path('sales."my ""x"".y"') == '"SALES"."my ""x"".y"'
@@ -0,0 +1,122 @@
+import sqlite3
+from datetime import datetime
+
+from kendo.backends.crud import ISelect
+from kendo.backends.replica import InventoryReplica, get_replica_tables
+from kendo.backends.snowflake.ddl import SQL
+
+INFRA = "kendo_db.infrastructure"
+
+
+class _Backend:
+    # stands in for Snowflake: an in-memory database with the same tables
+    def __init__(self):
+        self.conn = sqlite3.connect(":memory:")
+        self.statements = []
+        for table, column_types in get_replica_tables(SQL).items():
+            self.conn.execute(f"CREATE TABLE {table} ({', '.join(column_types)})")
+
+    def execute(self, sql, sql_params=None):
+        self.statements.append(sql)
+        cur = self.conn.execute(sql.replace(f"{INFRA}.", ""), sql_params or ())
+        columns = [description[0].upper() for description in cur.description]
+        return [dict(zip(columns, row)) for row in cur.fetchall()]
+
+
+class _Factory:
+    backend_DDL = SQL
+
+    def __init__(self):
+        self.backend_connection = _Backend()
+
+    def select(self, **kwargs):
+        return ISelect(**kwargs)
+
+
+def _add_database(factory, id, name):
+    factory.backend_connection.conn.execute(
+        "INSERT INTO database_objs VALUES (?, ?, ?)",
+        (id, datetime(2024, 1, 1).isoformat(), name),
+    )
+
+
+def test_refresh_fetches_only_new_rows(tmp_path):
+    factory = _Factory()
+    replica = InventoryReplica(str(tmp_path / "replica.sqlite3"))
+    _add_database(factory, 1, "SALES")
+    replica.refresh(factory)
+    _add_database(factory, 2, "HR")
+    factory.backend_connection.statements.clear()
+    replica.refresh(factory)
+
+    assert f"SELECT id, obj_created_on, name FROM {INFRA}.database_objs WHERE (id > 1);" in (
+        factory.backend_connection.statements
+    )
+    assert replica.execute(f"SELECT name FROM {INFRA}.database_objs ORDER BY id") == [
+        {"NAME": "SALES"},
+        {"NAME": "HR"},
+    ]
+
+
+def test_refresh_reloads_a_table_the_backend_lost_rows_of(tmp_path):
+    factory = _Factory()
+    replica = InventoryReplica(str(tmp_path / "replica.sqlite3"))
+    _add_database(factory, 1, "SALES")
+    _add_database(factory, 2, "HR")
+    replica.refresh(factory)
+    factory.backend_connection.conn.execute("DELETE FROM database_objs WHERE id = 2")
+    replica.refresh(factory)
+
+    assert replica.execute(f"SELECT name FROM {INFRA}.database_objs") == [
+        {"NAME": "SALES"}
+    ]
+
+
+def test_refresh_reloads_tables_scans_update_in_place(tmp_path):
+    factory = _Factory()
+    replica = InventoryReplica(str(tmp_path / "replica.sqlite3"))
+    factory.backend_connection.conn.execute(
+        "INSERT INTO warehouse_objs (id, name, owner_role_id) VALUES (1, 'ETL', 1)"
+    )
+    replica.refresh(factory)
+    factory.backend_connection.conn.execute(
+        "UPDATE warehouse_objs SET owner_role_id = 2 WHERE id = 1"
+    )
+    replica.refresh(factory)
+
+    assert replica.execute(f"SELECT owner_role_id FROM {INFRA}.warehouse_objs") == [
+        {"OWNER_ROLE_ID": 2}
+    ]
+
+
+def test_routes_only_constructs_both_engines_agree_on(tmp_path):
+    factory = _Factory()
+    replica = InventoryReplica(str(tmp_path / "replica.sqlite3"))
+    replica.refresh(factory)
+
+    assert replica.can_answer(
+        f"""SELECT d.name, COUNT(*) AS n FROM {INFRA}.database_objs d
+        JOIN {INFRA}.schema_objs s ON s.database_id = d.id
+        WHERE d.name = 'SALES' GROUP BY d.name"""
+    )
+    assert replica.can_answer(
+        f"WITH t AS (SELECT name FROM {INFRA}.table_objs) SELECT name FROM t"
+    )
+    # case-insensitive LIKE in SQLite
+    assert not replica.can_answer(
+        f"SELECT name FROM {INFRA}.database_objs WHERE name LIKE 'sales%'"
+    )
+    # timestamps come back as text
+    assert not replica.can_answer(
+        f"SELECT obj_created_on FROM {INFRA}.database_objs"
+    )
+    assert not replica.can_answer(f"SELECT * FROM {INFRA}.database_objs")
+    # integer division
+    assert not replica.can_answer(f"SELECT id / 2 AS half FROM {INFRA}.database_objs")
+    assert not replica.can_answer(
+        f"SELECT UPPER(name) AS name FROM {INFRA}.database_objs"
+    )
+    assert not replica.can_answer(
+        f"SELECT name FROM {INFRA}.database_objs WHERE id::VARCHAR = '1'"
+    )
+    assert not replica.can_answer("SELECT name FROM kendo_db.config.tags")